@@ -0,0 +1,84 @@
+import sys
+import time
+import argparse
+import resource
+import configparser
+import multiprocessing
+
+from headless import HeadlessIngest, run_synthetic, STAGES
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024.0 / 1024.0 if sys.platform == "darwin" else rss / 1024.0
+
+def run_scenario(config_path, count, rate, duration):
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    ingest = HeadlessIngest(config, record_timings=True)
+
+    start = time.perf_counter()
+    run_synthetic(ingest, count, rate, duration)
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "count": count,
+        "rate": rate,
+        "messages": ingest.messages,
+        "elapsed": elapsed,
+        "rss": peak_rss(),
+    }
+
+    for stage in STAGES:
+        result[stage] = [percentile(ingest.stage_times[stage], fraction) * 1000.0 for fraction in (0.5, 0.95, 0.99)]
+
+    return result
+
+def run_isolated(config_path, count, rate, duration):
+    # Each scenario gets a fresh process so peak RSS is its own
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(run_scenario, (config_path, count, rate, duration))
+
+def parse_list(text, convert):
+    return [convert(value) for value in text.split(",")]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the headless telemetry path with synthetic fleets")
+    parser.add_argument("--config", default="config.ini", help="configuration file")
+    parser.add_argument("--fleet", default="1,10,50,200", help="comma separated fleet sizes")
+    parser.add_argument("--rate", default="1,10", help="comma separated telemetry rates per balloon in Hz")
+    parser.add_argument("--duration", type=float, default=300.0, help="simulated flight time per scenario in seconds")
+    arguments = parser.parse_args()
+
+    header = "{:>6} {:>6} {:>9} {:>10}".format("fleet", "hz", "messages", "msg/s")
+
+    for stage in STAGES:
+        header += " {:>22}".format(stage + " p50/p95/p99 ms")
+
+    header += " {:>9}".format("rss MB")
+    print(header)
+
+    for count in parse_list(arguments.fleet, int):
+        for rate in parse_list(arguments.rate, float):
+            result = run_isolated(arguments.config, count, rate, arguments.duration)
+
+            line = "{:>6} {:>6g} {:>9} {:>10.0f}".format(
+                result["count"],
+                result["rate"],
+                result["messages"],
+                result["messages"] / result["elapsed"]
+            )
+
+            for stage in STAGES:
+                line += " {:>22}".format("/".join("{:.3f}".format(value) for value in result[stage]))
+
+            line += " {:>9.1f}".format(result["rss"])
+            print(line)
@@ -0,0 +1,189 @@
+import matplotlib
+matplotlib.use('Qt5Agg')
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+
+from PyQt5 import QtCore
+from PyQt5.QtWidgets import QWidget, QGridLayout, QComboBox, QLabel
+
+from decimation import MinMaxDecimator
+
+# (Icarus field, axis label)
+CHART_SERIES = (
+    ("altitude", "Altitude (m)"),
+    ("velocity_vertical", "Vertical Speed (m/s)"),
+    ("temperature", "Temperature (C)"),
+    ("pressure", "Pressure (hPa)"),
+    ("humidity", "Humidity (%)"),
+)
+
+class ChartPanel(QWidget):
+    # Live charts of the selected device. New samples are read from the
+    # device history on a fixed rate timer and folded into min/max decimators
+    # sized to the canvas width, then the lines are blitted over a cached
+    # background. A full redraw only happens when an axis has to grow.
+    def __init__(self, fleet, refresh_rate=2.0, parent=None):
+        super(ChartPanel, self).__init__(parent)
+
+        self._fleet = fleet
+        self._device_id = None
+        self._seen = 0
+        self._decimators = {}
+        self._background = None
+        self._time_origin = None
+        self._scaled = set()
+
+        self.layout_chart_interface = QGridLayout()
+        self.setLayout(self.layout_chart_interface)
+
+        self.label_chart_device = QLabel(self)
+        self.label_chart_device.setText("Device:")
+
+        self.combo_chart_device = QComboBox(self)
+        self.combo_chart_device.currentTextChanged.connect(self.device_select)
+
+        self.figure = Figure(figsize=(4, 8), dpi=100)
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+        self.axes = {}
+        self.lines = {}
+
+        for index, (field, label) in enumerate(CHART_SERIES):
+            axes = self.figure.add_subplot(len(CHART_SERIES), 1, index + 1, sharex=self.axes.get("altitude"))
+            axes.set_ylabel(label, fontsize=8)
+            axes.tick_params(labelsize=7)
+
+            line, = axes.plot([], [], linewidth=1, animated=True)
+
+            self.axes[field] = axes
+            self.lines[field] = line
+
+        self.axes[CHART_SERIES[-1][0]].set_xlabel("Time (s)", fontsize=8)
+        self.figure.tight_layout()
+
+        self.layout_chart_interface.addWidget(self.label_chart_device, 0, 0)
+        self.layout_chart_interface.addWidget(self.combo_chart_device, 0, 1)
+        self.layout_chart_interface.addWidget(self.canvas, 1, 0, 1, 2)
+
+        self.timer_chart_refresh = QtCore.QTimer(self)
+        self.timer_chart_refresh.timeout.connect(self.refresh)
+        self.timer_chart_refresh.start(int(1000 / refresh_rate))
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_lines()
+
+    def resizeEvent(self, event):
+        super(ChartPanel, self).resizeEvent(event)
+
+        # Decimation follows the canvas width, rebuild at the new size
+        self._reset_decimators()
+
+    def device_select(self, id):
+        if not id or id == self._device_id:
+            return
+
+        self._device_id = id
+        self._reset_decimators()
+
+    def _reset_decimators(self):
+        # Each bucket draws at most two points, aim for about one point per pixel
+        target = max(self.canvas.width() // 4, 16)
+
+        self._decimators = {field: MinMaxDecimator(target) for field, label in CHART_SERIES}
+        self._seen = 0
+        self._time_origin = None
+        self._scaled = set()
+
+    def _update_devices(self):
+        known = set(self.combo_chart_device.itemText(index) for index in range(self.combo_chart_device.count()))
+
+        for device in self._fleet:
+            if device.id not in known:
+                self.combo_chart_device.addItem(device.id)
+
+    def refresh(self):
+        self._update_devices()
+
+        device = self._fleet.get(self._device_id) if self._device_id is not None else None
+
+        if device is None:
+            return
+
+        history = device.history
+        new = min(history.appended - self._seen, len(history))
+
+        if new <= 0:
+            return
+
+        self._seen = history.appended
+
+        timestamps = history.last_timestamps(new)
+
+        if self._time_origin is None:
+            self._time_origin = timestamps[0]
+
+        times = [timestamp - self._time_origin for timestamp in timestamps]
+
+        for field, label in CHART_SERIES:
+            self._decimators[field].extend(times, history.last(field, new))
+
+        if self._rescale() or self._background is None:
+            # Axis limits changed, this redraws everything and recaptures the background
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self._background)
+            self._draw_lines()
+            self.canvas.blit(self.figure.bbox)
+
+    def _draw_lines(self):
+        for field, label in CHART_SERIES:
+            decimator = self._decimators.get(field)
+
+            if decimator is None:
+                continue
+
+            xs, ys = decimator.points()
+            self.lines[field].set_data(xs, ys)
+            self.axes[field].draw_artist(self.lines[field])
+
+    def _rescale(self):
+        # Grows the axes with some headroom so most refreshes can just blit
+        rescaled = False
+
+        for field, label in CHART_SERIES:
+            xs, ys = self._decimators[field].points()
+
+            if not xs:
+                continue
+
+            axes = self.axes[field]
+            x_low, x_high = axes.get_xlim()
+            y_low, y_high = axes.get_ylim()
+            y_min = min(ys)
+            y_max = max(ys)
+            margin = max((y_max - y_min) * 0.25, 1.0)
+
+            if field not in self._scaled:
+                self._scaled.add(field)
+                x_low, x_high = xs[0], float("-inf")
+                y_low, y_high = y_min - margin, y_max + margin
+                rescaled = True
+
+            if xs[-1] > x_high:
+                axes.set_xlim(x_low, xs[-1] + max(60.0, (xs[-1] - x_low) * 0.25))
+                rescaled = True
+
+            if y_min < y_low:
+                y_low = y_min - margin
+                rescaled = True
+
+            if y_max > y_high:
+                y_high = y_max + margin
+                rescaled = True
+
+            axes.set_ylim(y_low, y_high)
+
+        return rescaled
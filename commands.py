@@ -0,0 +1,303 @@
+import time
+import heapq
+import itertools
+from concurrent.futures import Future
+
+from protocol import encode_commands, COMMAND_HEADER_STRUCT, COMMAND_STRUCT, COMMANDS_PER_FRAME, FRAME_HEADER_SIZE, FRAME_CRC_SIZE
+
+COMMAND_CUTDOWN = 0x01
+COMMAND_BEACON_RATE = 0x02
+COMMAND_PING = 0x03
+
+# Lower goes first
+PRIORITY_CRITICAL = 0
+PRIORITY_HIGH = 1
+PRIORITY_ROUTINE = 2
+
+# Command name -> (code, priority)
+COMMANDS = {
+    "cutdown": (COMMAND_CUTDOWN, PRIORITY_CRITICAL),
+    "beacon_rate": (COMMAND_BEACON_RATE, PRIORITY_HIGH),
+    "ping": (COMMAND_PING, PRIORITY_ROUTINE),
+}
+
+# Ack statuses sent by the device
+ACK_OK = 0
+ACK_REJECTED = 1
+
+# Command outcomes, the result of a command's future
+STATUS_ACKED = "acked"
+STATUS_REJECTED = "rejected"
+STATUS_TIMEOUT = "timeout"
+
+def addressable(device):
+    # Command frames carry the device id as an unsigned 32 bit number, ids
+    # that are not one (e.g. names used over MQTT) cannot be commanded
+    try:
+        return 0 <= int(device) <= 0xFFFFFFFF
+    except ValueError:
+        return False
+
+def frame_size(count):
+    # Bytes on the wire for a frame holding count commands
+    return FRAME_HEADER_SIZE + COMMAND_HEADER_STRUCT.size + count * COMMAND_STRUCT.size + FRAME_CRC_SIZE
+
+class TokenBucket():
+    # Allows rate bytes per second on average and bursts of up to burst bytes
+    __slots__ = ("_rate", "_burst", "_tokens", "_updated")
+
+    def __init__(self, rate, burst, now=None):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic() if now is None else now
+
+    @property
+    def tokens(self):
+        return self._tokens
+
+    @property
+    def burst(self):
+        return self._burst
+
+    def _refill(self, now):
+        self._tokens = min(self._burst, self._tokens + max(now - self._updated, 0.0) * self._rate)
+        self._updated = now
+
+    def consume(self, amount, now, force=False):
+        # With force the bucket goes into debt instead of refusing, later
+        # sends wait until it has paid that back
+        self._refill(now)
+
+        if self._tokens < amount and not force:
+            return False
+
+        self._tokens -= amount
+        return True
+
+class Command():
+    __slots__ = ("id", "device", "code", "argument", "priority", "order", "created", "future", "links")
+
+    def __init__(self, id, device, code, argument, priority, order, created):
+        self.id = id
+        self.device = device
+        self.code = code
+        self.argument = argument
+        self.priority = priority
+        self.order = order
+        self.created = created
+        self.future = Future()
+        # Links still trying to deliver this command
+        self.links = 0
+
+class UplinkQueue():
+    # Outgoing commands of one link. Commands wait in a priority queue and
+    # leave in frames, batched per device, as fast as the link's token
+    # bucket allows. Critical commands are never held back by the bucket,
+    # and as the queue is ordered by priority they never wait behind
+    # routine traffic either. Sent commands are resent on the ack timeout
+    # until the retries run out. Commands that could not be sent within
+    # expiry are dropped, a cutdown must not go out minutes after it was
+    # asked for just because the link came back.
+    #
+    # send(device, payload) puts a command payload on the link and returns
+    # False if the link is down, in which case the commands stay queued.
+    def __init__(self, send, rate, burst, timeout=5.0, retries=3, expiry=60.0, gave_up=None):
+        self._send = send
+        self._bucket = TokenBucket(rate, burst)
+        self._timeout = timeout
+        self._retries = retries
+        self._expiry = expiry
+        self._gave_up = gave_up
+
+        # A frame never holds more than the bucket can ever allow at once
+        self._max_batch = min(max(int((burst - frame_size(0)) // COMMAND_STRUCT.size), 1), COMMANDS_PER_FRAME)
+
+        self._queue = []
+        # Command id -> [command, attempts, deadline]
+        self._in_flight = {}
+
+        self.frames = 0
+        self.bytes = 0
+        self.resent = 0
+
+    def depth(self):
+        return len(self._queue)
+
+    def in_flight(self):
+        return len(self._in_flight)
+
+    def submit(self, command):
+        heapq.heappush(self._queue, (command.priority, command.order, command))
+
+    def acknowledge(self, command_id):
+        return self._in_flight.pop(command_id, None) is not None
+
+    def tick(self, now=None):
+        if now is None:
+            now = time.monotonic()
+
+        self._expire(now)
+
+        while self._queue:
+            priority, order, command = self._queue[0]
+
+            if command.future.done():
+                # Completed over another link
+                heapq.heappop(self._queue)
+                continue
+
+            batch = self._batch(command.device, priority == PRIORITY_CRITICAL)
+            size = frame_size(len(batch))
+
+            if not self._bucket.consume(size, now, priority == PRIORITY_CRITICAL):
+                break
+
+            payload = encode_commands(command.device, [(entry.id, entry.code, entry.argument) for entry in batch])
+
+            if not self._send(command.device, payload):
+                # Link down, give the tokens back by leaving everything queued
+                self._bucket.consume(-size, now, True)
+                break
+
+            for entry in batch:
+                self._remove(entry)
+
+                flight = self._in_flight.get(entry.id)
+
+                if flight is None:
+                    self._in_flight[entry.id] = [entry, 1, now + self._timeout]
+                else:
+                    flight[1] += 1
+                    flight[2] = now + self._timeout
+
+            self.frames += 1
+            self.bytes += size
+
+    def _batch(self, device, critical):
+        # Queued commands for device in priority order, as many as fit a
+        # frame. Critical frames skip the bucket, so nothing else rides along.
+        batch = []
+
+        for priority, order, command in sorted(self._queue):
+            if critical and priority != PRIORITY_CRITICAL:
+                break
+
+            if command.device == device and not command.future.done():
+                batch.append(command)
+
+                if len(batch) == self._max_batch:
+                    break
+
+        return batch
+
+    def _remove(self, command):
+        for index, (priority, order, queued) in enumerate(self._queue):
+            if queued is command:
+                self._queue[index] = self._queue[-1]
+                self._queue.pop()
+
+                if index < len(self._queue):
+                    heapq.heapify(self._queue)
+
+                return
+
+    def _expire(self, now):
+        # A queued command expires whether it is waiting for its first send
+        # or for a resend, the in flight entry only counts its attempts
+        for priority, order, command in list(self._queue):
+            if command.created + self._expiry <= now:
+                self._remove(command)
+                self._in_flight.pop(command.id, None)
+
+                if self._gave_up is not None and not command.future.done():
+                    self._gave_up(command)
+
+        for command_id, (command, attempts, deadline) in list(self._in_flight.items()):
+            if command.future.done():
+                del self._in_flight[command_id]
+            elif deadline <= now:
+                if attempts > self._retries or command.created + self._expiry <= now:
+                    del self._in_flight[command_id]
+
+                    if self._gave_up is not None:
+                        self._gave_up(command)
+                else:
+                    # Back in the queue with its original place, the in flight
+                    # entry stays to count the attempts
+                    flight = self._in_flight[command_id]
+                    flight[2] = float("inf")
+                    self.resent += 1
+                    self.submit(command)
+
+class CommandUplink():
+    # Sends commands over every registered link at once and completes each
+    # command's future with the first ack from any link, or a timeout once
+    # every link has given up on it
+    def __init__(self, timeout=5.0, retries=3, expiry=60.0):
+        self._timeout = timeout
+        self._retries = retries
+        self._expiry = expiry
+        self._links = {}
+        self._commands = {}
+        self._ids = itertools.count(1)
+        self._order = itertools.count()
+
+    def add_link(self, link, send, rate, burst):
+        self._links[link] = UplinkQueue(send, rate, burst, self._timeout, self._retries, self._expiry, self._gave_up)
+
+    def queue(self, link):
+        return self._links[link]
+
+    def pending(self):
+        return len(self._commands)
+
+    def send(self, device, name, argument=0.0, links=None, now=None):
+        if now is None:
+            now = time.monotonic()
+
+        code, priority = COMMANDS[name]
+
+        if not addressable(device):
+            future = Future()
+            future.set_exception(ValueError("Device id cannot be addressed by command frames: " + str(device)))
+            return future
+
+        command_id = next(self._ids) & 0xFFFF
+
+        command = Command(command_id, device, code, float(argument), priority, next(self._order), now)
+        self._commands[command_id] = command
+
+        for link in (self._links if links is None else links):
+            command.links += 1
+            self._links[link].submit(command)
+
+        return command.future
+
+    def acknowledge(self, device, command_id, status):
+        command = self._commands.get(command_id)
+
+        if command is None or command.device != device:
+            return False
+
+        for queue in self._links.values():
+            queue.acknowledge(command_id)
+
+        self._complete(command, STATUS_ACKED if status == ACK_OK else STATUS_REJECTED)
+        return True
+
+    def tick(self, now=None):
+        for queue in self._links.values():
+            queue.tick(now)
+
+    def _gave_up(self, command):
+        command.links -= 1
+
+        if command.links <= 0:
+            self._complete(command, STATUS_TIMEOUT)
+
+    def _complete(self, command, status):
+        self._commands.pop(command.id, None)
+
+        if not command.future.done():
+            command.future.set_result(status)
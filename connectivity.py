@@ -0,0 +1,91 @@
+import time
+import socket
+import threading
+import collections
+
+from PyQt5 import QtCore
+
+def parse_targets(text):
+    # "host:port, host:port" as found in config.ini
+    targets = []
+
+    for target in text.split(","):
+        host, port = target.strip().rsplit(":", 1)
+        targets.append((host, int(port)))
+
+    return targets
+
+class ConnectivityMonitor(QtCore.QThread):
+    # Probes a list of targets with TCP connects on its own thread, one probe
+    # round at a time. While offline the interval backs off so attempts never
+    # pile up on a dead link.
+    status_changed = QtCore.pyqtSignal(bool)
+    statistics_updated = QtCore.pyqtSignal(dict)
+
+    def __init__(self, targets, interval=5.0, timeout=1.5, window=20, max_interval=30.0, parent=None):
+        super(ConnectivityMonitor, self).__init__(parent)
+
+        self._targets = targets
+        self._interval = interval
+        self._timeout = timeout
+        self._max_interval = max_interval
+
+        # Round trip time of each probe round, None for a lost round
+        self._samples = collections.deque(maxlen=window)
+
+        self._connected = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._stop.clear()
+        super(ConnectivityMonitor, self).start()
+
+    def stop(self):
+        self._stop.set()
+        self.wait()
+
+    def probe(self):
+        for host, port in self._targets:
+            start = time.monotonic()
+
+            try:
+                with socket.create_connection((host, port), self._timeout):
+                    return time.monotonic() - start
+            except OSError:
+                pass
+
+        return None
+
+    def statistics(self):
+        rtts = [rtt for rtt in self._samples if rtt is not None]
+
+        return {
+            "connected": bool(self._connected),
+            "rtt_last": self._samples[-1] if self._samples else None,
+            "rtt_average": sum(rtts) / len(rtts) if rtts else None,
+            "rtt_minimum": min(rtts) if rtts else None,
+            "rtt_maximum": max(rtts) if rtts else None,
+            "loss": 1.0 - len(rtts) / len(self._samples) if self._samples else 0.0,
+        }
+
+    def run(self):
+        interval = self._interval
+
+        while not self._stop.is_set():
+            rtt = self.probe()
+            connected = rtt is not None
+
+            self._samples.append(rtt)
+
+            if connected != self._connected:
+                self._connected = connected
+                self.status_changed.emit(connected)
+
+            self.statistics_updated.emit(self.statistics())
+
+            if connected:
+                interval = self._interval
+            else:
+                interval = min(interval * 2, self._max_interval)
+
+            self._stop.wait(interval)
@@ -0,0 +1,101 @@
+class MinMaxDecimator():
+    # Streaming min/max decimation of a series that grows at the end. Samples
+    # are folded into fixed width x buckets that keep their lowest and highest
+    # point. Whenever there are more than 2 * target buckets, neighbouring
+    # buckets are merged and the width doubles, so appends are O(1) amortised
+    # and the output never grows past about 4 * target points however long
+    # the series gets.
+    __slots__ = ("_target", "_width", "_origin", "_buckets")
+
+    def __init__(self, target=250, width=1.0):
+        self._target = max(int(target), 1)
+        self._width = width
+        self._origin = None
+
+        # Each bucket is [x of minimum, minimum, x of maximum, maximum] or None for a gap
+        self._buckets = []
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def clear(self):
+        self._origin = None
+        self._buckets = []
+
+    def append(self, x, y):
+        if self._origin is None:
+            self._origin = x
+
+        # Late samples go into the last bucket rather than reshuffling history
+        index = max(int((x - self._origin) / self._width), len(self._buckets) - 1, 0)
+        buckets = self._buckets
+
+        if index >= len(buckets):
+            buckets.extend([None] * (index + 1 - len(buckets)))
+
+        bucket = buckets[index]
+
+        if bucket is None:
+            buckets[index] = [x, y, x, y]
+        else:
+            if y < bucket[1]:
+                bucket[0] = x
+                bucket[1] = y
+
+            if y > bucket[3]:
+                bucket[2] = x
+                bucket[3] = y
+
+        while len(buckets) > 2 * self._target:
+            self._merge()
+            buckets = self._buckets
+
+    def extend(self, xs, ys):
+        for x, y in zip(xs, ys):
+            self.append(x, y)
+
+    def _merge(self):
+        buckets = self._buckets
+        merged = []
+
+        for index in range(0, len(buckets), 2):
+            first = buckets[index]
+            second = buckets[index + 1] if index + 1 < len(buckets) else None
+
+            if first is None or second is None:
+                merged.append(first if second is None else list(second))
+                continue
+
+            merged.append([
+                first[0] if first[1] <= second[1] else second[0],
+                min(first[1], second[1]),
+                first[2] if first[3] >= second[3] else second[2],
+                max(first[3], second[3]),
+            ])
+
+        self._buckets = merged
+        self._width *= 2
+
+    def points(self):
+        xs = []
+        ys = []
+
+        for bucket in self._buckets:
+            if bucket is None:
+                continue
+
+            if bucket[0] <= bucket[2]:
+                xs.append(bucket[0])
+                ys.append(bucket[1])
+
+                # Both ends, unless it is one sample
+                if bucket[2] != bucket[0] or bucket[3] != bucket[1]:
+                    xs.append(bucket[2])
+                    ys.append(bucket[3])
+            else:
+                xs.append(bucket[2])
+                ys.append(bucket[3])
+                xs.append(bucket[0])
+                ys.append(bucket[1])
+
+        return xs, ys
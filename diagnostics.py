@@ -0,0 +1,113 @@
+import os
+import time
+
+from PyQt5 import QtCore
+from PyQt5.QtWidgets import QWidget, QGridLayout, QTableWidget, QTableWidgetItem, QPushButton, QHeaderView, QFileDialog
+
+from instrumentation import STAGES, STAGE_DESCRIPTIONS
+
+STAGE_COLUMNS = ("Count", "p50 (ms)", "p90 (ms)", "p99 (ms)", "p99.9 (ms)", "Max (ms)")
+STAGE_KEYS = ("count", "p50", "p90", "p99", "p999", "max")
+
+GAUGE_COLUMNS = ("Last", "Max")
+
+def format_milliseconds(seconds):
+    return "-" if seconds is None else "{:.2f}".format(seconds * 1000)
+
+class DiagnosticsPanel(QWidget):
+    # Shows the hot path latency percentiles and queue depths of an
+    # Instrumentation, refreshed on a timer while the panel is visible
+    def __init__(self, instrumentation, refresh_rate=1.0, export_directory="", parent=None):
+        super(DiagnosticsPanel, self).__init__(parent)
+
+        self._instrumentation = instrumentation
+        self._export_directory = export_directory
+
+        self.setWindowTitle("Icarus GCS Diagnostics")
+
+        self.layout_diagnostics_interface = QGridLayout()
+        self.setLayout(self.layout_diagnostics_interface)
+
+        self.table_diagnostics_stages = QTableWidget(len(STAGES), len(STAGE_COLUMNS), self)
+        self.table_diagnostics_stages.setHorizontalHeaderLabels(STAGE_COLUMNS)
+        self.table_diagnostics_stages.setVerticalHeaderLabels(STAGES)
+        self.table_diagnostics_stages.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table_diagnostics_stages.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        for row, stage in enumerate(STAGES):
+            self.table_diagnostics_stages.verticalHeaderItem(row).setToolTip(STAGE_DESCRIPTIONS[stage])
+
+        self.table_diagnostics_gauges = QTableWidget(0, len(GAUGE_COLUMNS), self)
+        self.table_diagnostics_gauges.setHorizontalHeaderLabels(GAUGE_COLUMNS)
+        self.table_diagnostics_gauges.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table_diagnostics_gauges.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        self.button_diagnostics_reset = QPushButton(self)
+        self.button_diagnostics_reset.setText("Reset")
+        self.button_diagnostics_reset.clicked.connect(self.button_diagnostics_reset_clicked)
+
+        self.button_diagnostics_export = QPushButton(self)
+        self.button_diagnostics_export.setText("Export")
+        self.button_diagnostics_export.clicked.connect(self.button_diagnostics_export_clicked)
+
+        self.layout_diagnostics_interface.addWidget(self.table_diagnostics_stages, 0, 0, 1, 2)
+        self.layout_diagnostics_interface.addWidget(self.table_diagnostics_gauges, 1, 0, 1, 2)
+        self.layout_diagnostics_interface.addWidget(self.button_diagnostics_reset, 2, 0)
+        self.layout_diagnostics_interface.addWidget(self.button_diagnostics_export, 2, 1)
+
+        self.resize(640, 420)
+
+        self.timer_diagnostics_refresh = QtCore.QTimer(self)
+        self.timer_diagnostics_refresh.timeout.connect(self.refresh)
+        self.timer_diagnostics_refresh.setInterval(int(1000 / refresh_rate))
+
+    def showEvent(self, event):
+        super(DiagnosticsPanel, self).showEvent(event)
+
+        self.refresh()
+        self.timer_diagnostics_refresh.start()
+
+    def hideEvent(self, event):
+        super(DiagnosticsPanel, self).hideEvent(event)
+
+        self.timer_diagnostics_refresh.stop()
+
+    def refresh(self):
+        snapshot = self._instrumentation.snapshot()
+
+        for row, stage in enumerate(STAGES):
+            statistics = snapshot["stages"][stage]
+
+            for column, key in enumerate(STAGE_KEYS):
+                text = str(statistics[key]) if key == "count" else format_milliseconds(statistics[key])
+                self.table_diagnostics_stages.setItem(row, column, QTableWidgetItem(text))
+
+        gauges = sorted(snapshot["gauges"].items())
+        self.table_diagnostics_gauges.setRowCount(len(gauges))
+        self.table_diagnostics_gauges.setVerticalHeaderLabels([name for name, gauge in gauges])
+
+        for row, (name, gauge) in enumerate(gauges):
+            self.table_diagnostics_gauges.setItem(row, 0, QTableWidgetItem(str(gauge["last"])))
+            self.table_diagnostics_gauges.setItem(row, 1, QTableWidgetItem(str(gauge["max"])))
+
+    def button_diagnostics_reset_clicked(self):
+        self._instrumentation.reset()
+        self.refresh()
+
+    def button_diagnostics_export_clicked(self):
+        path, selected_filter = QFileDialog.getSaveFileName(
+            self,
+            "Export Diagnostics",
+            os.path.join(self._export_directory, time.strftime("diagnostics_%Y%m%d_%H%M%S.json")),
+            "JSON (*.json)"
+        )
+
+        if not path:
+            return
+
+        try:
+            self._instrumentation.export(path)
+            print("Exported diagnostics to: " + path)
+        except OSError as e:
+            print("Failed to export diagnostics to: " + path)
+            print(e)
@@ -0,0 +1,302 @@
+import json
+import math
+
+EVENT_LAUNCH = "launch"
+EVENT_BURST = "burst"
+EVENT_APOGEE = "apogee"
+EVENT_LANDING = "landing"
+EVENT_FIX_LOST = "fix_lost"
+EVENT_FIX_REGAINED = "fix_regained"
+EVENT_GEOFENCE_ENTER = "geofence_enter"
+EVENT_GEOFENCE_EXIT = "geofence_exit"
+
+EVENT_LABELS = {
+    EVENT_LAUNCH: "Launch",
+    EVENT_BURST: "Burst",
+    EVENT_APOGEE: "Apogee",
+    EVENT_LANDING: "Landing",
+    EVENT_FIX_LOST: "Fix lost",
+    EVENT_FIX_REGAINED: "Fix regained",
+    EVENT_GEOFENCE_ENTER: "Geofence entered",
+    EVENT_GEOFENCE_EXIT: "Geofence exited",
+}
+
+PHASE_GROUND = 0
+PHASE_ASCENT = 1
+PHASE_DESCENT = 2
+PHASE_LANDED = 3
+
+def point_in_ring(latitude, longitude, ring):
+    # Even-odd ray cast, ring is a list of [longitude, latitude] as in GeoJSON
+    inside = False
+    count = len(ring)
+    j = count - 1
+
+    for i in range(count):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+
+        if (yi > latitude) != (yj > latitude) and longitude < (xj - xi) * (latitude - yi) / (yj - yi) + xi:
+            inside = not inside
+
+        j = i
+
+    return inside
+
+class GeofenceIndex():
+    # Geofence polygons in a uniform grid of cell_size degree cells. Each
+    # polygon is listed in every cell its bounding box touches, so a lookup
+    # only tests the few polygons near the point however many there are.
+    def __init__(self, cell_size=0.1):
+        self._cell_size = cell_size
+        self._fences = []
+        self._cells = {}
+
+    def __len__(self):
+        return len(self._fences)
+
+    def _cell(self, latitude, longitude):
+        return (math.floor(longitude / self._cell_size), math.floor(latitude / self._cell_size))
+
+    def add(self, name, rings):
+        # rings are GeoJSON polygon rings, the outer ring followed by any holes
+        longitudes = [point[0] for point in rings[0]]
+        latitudes = [point[1] for point in rings[0]]
+        bounds = (min(latitudes), min(longitudes), max(latitudes), max(longitudes))
+
+        index = len(self._fences)
+        self._fences.append((name, bounds, rings))
+
+        x_min, y_min = self._cell(bounds[0], bounds[1])
+        x_max, y_max = self._cell(bounds[2], bounds[3])
+
+        for x in range(x_min, x_max + 1):
+            for y in range(y_min, y_max + 1):
+                self._cells.setdefault((x, y), []).append(index)
+
+    def containing(self, latitude, longitude):
+        # Names of every geofence the point is inside
+        names = set()
+
+        for index in self._cells.get(self._cell(latitude, longitude), ()):
+            name, bounds, rings = self._fences[index]
+
+            if not (bounds[0] <= latitude <= bounds[2] and bounds[1] <= longitude <= bounds[3]):
+                continue
+
+            if point_in_ring(latitude, longitude, rings[0]) and not any(point_in_ring(latitude, longitude, hole) for hole in rings[1:]):
+                names.add(name)
+
+        return names
+
+def load_geofences(path, cell_size=0.1):
+    # Polygons and multipolygons of a GeoJSON feature collection, named by
+    # their "name" property. A missing file is no geofences.
+    index = GeofenceIndex(cell_size)
+
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            collection = json.load(file)
+    except FileNotFoundError:
+        return index
+
+    for number, feature in enumerate(collection.get("features", [])):
+        geometry = feature.get("geometry") or {}
+        name = (feature.get("properties") or {}).get("name", "Geofence " + str(number + 1))
+
+        if geometry.get("type") == "Polygon":
+            index.add(name, geometry["coordinates"])
+        elif geometry.get("type") == "MultiPolygon":
+            for polygon in geometry["coordinates"]:
+                index.add(name, polygon)
+
+    return index
+
+class _FlightState():
+    __slots__ = ("phase", "ground", "rising", "apogee", "still", "fix", "fences", "timestamp")
+
+    def __init__(self):
+        self.phase = None
+        # Lowest altitude seen before launch
+        self.ground = None
+        # Last time the device was climbing
+        self.rising = None
+        # (timestamp, latitude, longitude, altitude) of the highest point so far
+        self.apogee = None
+        # Since when the device has been holding still during descent
+        self.still = None
+        # None until a sample reports the fix
+        self.fix = None
+        self.fences = None
+        self.timestamp = None
+
+class EventEngine():
+    # Detects flight events as samples arrive. Every rule is a small state
+    # machine per device that only looks at the newest sample, so the work per
+    # sample does not grow with the flight. update() returns the events the
+    # sample raised as dicts ready for the map and the session store. Devices
+    # that do not report a fix are taken to have one.
+    def __init__(
+        self,
+        geofences=None,
+        launch_altitude=50.0,
+        rising_rate=2.0,
+        burst_rate=5.0,
+        burst_window=30.0,
+        apogee_drop=100.0,
+        landing_rate=1.0,
+        landing_time=30.0,
+        max_hdop=5.0
+    ):
+        self._geofences = GeofenceIndex() if geofences is None else geofences
+        self._launch_altitude = launch_altitude
+        self._rising_rate = rising_rate
+        self._burst_rate = burst_rate
+        self._burst_window = burst_window
+        self._apogee_drop = apogee_drop
+        self._landing_rate = landing_rate
+        self._landing_time = landing_time
+        self._max_hdop = max_hdop
+        self._devices = {}
+
+    def remove(self, id):
+        self._devices.pop(id, None)
+
+    def _state(self, id):
+        state = self._devices.get(id)
+
+        if state is None:
+            state = self._devices[id] = _FlightState()
+
+        return state
+
+    def restore(self, event):
+        # Takes a stored event so a restored flight does not raise it again
+        state = self._state(event["id"])
+        type = event["type"]
+
+        if type == EVENT_LAUNCH:
+            state.phase = PHASE_ASCENT
+        elif type in (EVENT_BURST, EVENT_APOGEE):
+            state.phase = PHASE_DESCENT
+        elif type == EVENT_LANDING:
+            state.phase = PHASE_LANDED
+
+    def update(self, device, timestamp, fix_reported=True):
+        # fix_reported says whether this sample carried fix and hdop, without
+        # them the telemetry only holds the model defaults
+        state = self._state(device.id)
+        telemetry = device.telemetry
+        events = []
+
+        # Out of order samples would only confuse the flight phases
+        if state.timestamp is not None and timestamp < state.timestamp:
+            return events
+
+        state.timestamp = timestamp
+
+        if fix_reported:
+            self._update_fix(device, state, timestamp, events)
+
+        if state.fix is not False:
+            self._update_flight(device, state, timestamp, events)
+
+            if len(self._geofences) and (telemetry["latitude"] or telemetry["longitude"]):
+                self._update_geofences(device, state, timestamp, events)
+
+        return events
+
+    def _event(self, device, type, timestamp, detail="", location=None):
+        telemetry = device.telemetry
+
+        if location is None:
+            location = (telemetry["latitude"], telemetry["longitude"], telemetry["altitude"])
+
+        return {
+            "id": device.id,
+            "type": type,
+            "timestamp": timestamp,
+            "latitude": location[0],
+            "longitude": location[1],
+            "altitude": location[2],
+            "detail": detail,
+        }
+
+    def _update_fix(self, device, state, timestamp, events):
+        telemetry = device.telemetry
+        fix = telemetry["fix"] > 0 and telemetry["hdop"] <= self._max_hdop
+
+        # The first sample only sets the baseline
+        if state.fix is not None and fix != state.fix:
+            detail = "HDOP " + str(round(telemetry["hdop"], 1)) + ", fix " + str(int(telemetry["fix"]))
+            events.append(self._event(device, EVENT_FIX_REGAINED if fix else EVENT_FIX_LOST, timestamp, detail))
+
+        state.fix = fix
+
+    def _update_flight(self, device, state, timestamp, events):
+        telemetry = device.telemetry
+        altitude = telemetry["altitude"]
+        vertical = telemetry["velocity_vertical"]
+
+        if vertical >= self._rising_rate:
+            state.rising = timestamp
+
+        if state.phase is None:
+            # A device first heard in flight joins in its current phase. One
+            # already climbing raises its launch late rather than never, the
+            # events of a descent it missed are not made up.
+            if vertical >= self._rising_rate:
+                state.phase = PHASE_ASCENT
+                events.append(self._event(device, EVENT_LAUNCH, timestamp, "in flight when first heard"))
+            elif vertical <= -self._rising_rate:
+                state.phase = PHASE_DESCENT
+            else:
+                state.phase = PHASE_GROUND
+
+        if state.phase == PHASE_GROUND:
+            if state.ground is None or altitude < state.ground:
+                state.ground = altitude
+
+            if altitude - state.ground >= self._launch_altitude and vertical > 0:
+                state.phase = PHASE_ASCENT
+                events.append(self._event(device, EVENT_LAUNCH, timestamp))
+
+        if state.phase == PHASE_ASCENT:
+            if state.apogee is None or altitude > state.apogee[3]:
+                state.apogee = (timestamp, telemetry["latitude"], telemetry["longitude"], altitude)
+
+            # Burst is climbing one moment and falling fast the next, a float
+            # that slowly loses height only shows up as an apogee
+            burst = vertical <= -self._burst_rate and state.rising is not None and timestamp - state.rising <= self._burst_window
+
+            if burst or altitude <= state.apogee[3] - self._apogee_drop:
+                apogee_timestamp, latitude, longitude, apogee_altitude = state.apogee
+                events.append(self._event(device, EVENT_APOGEE, apogee_timestamp, str(round(apogee_altitude)) + " m", (latitude, longitude, apogee_altitude)))
+
+                if burst:
+                    events.append(self._event(device, EVENT_BURST, timestamp, str(round(vertical, 1)) + " m/s"))
+
+                state.phase = PHASE_DESCENT
+                state.still = None
+        elif state.phase == PHASE_DESCENT:
+            if abs(vertical) <= self._landing_rate:
+                if state.still is None:
+                    state.still = timestamp
+                elif timestamp - state.still >= self._landing_time:
+                    state.phase = PHASE_LANDED
+                    events.append(self._event(device, EVENT_LANDING, timestamp))
+            else:
+                state.still = None
+
+    def _update_geofences(self, device, state, timestamp, events):
+        telemetry = device.telemetry
+        fences = self._geofences.containing(telemetry["latitude"], telemetry["longitude"])
+
+        if state.fences is not None:
+            for name in sorted(fences - state.fences):
+                events.append(self._event(device, EVENT_GEOFENCE_ENTER, timestamp, name))
+
+            for name in sorted(state.fences - fences):
+                events.append(self._event(device, EVENT_GEOFENCE_EXIT, timestamp, name))
+
+        state.fences = fences
@@ -0,0 +1,226 @@
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+from xml.sax.saxutils import escape
+
+from icarus import Icarus
+from session_store import SessionStore
+
+# One row per stored sample, built from the Icarus accessors
+COLUMNS = (
+    "timestamp",
+    "latitude",
+    "longitude",
+    "altitude",
+    "altitude_elipsoid",
+    "altitude_relative",
+    "altitude_barometric",
+    "hdop",
+    "fix",
+    "roll",
+    "pitch",
+    "yaw",
+    "heading",
+    "velocity_horizontal",
+    "velocity_vertical",
+    "course",
+    "temperature",
+    "pressure",
+    "humidity",
+)
+
+# Rows between progress reports and cancellation checks
+PROGRESS_INTERVAL = 5000
+
+class ExportCancelled(Exception):
+    pass
+
+def device_rows(samples, id):
+    # Loads stored samples into a scratch Icarus one at a time and reads
+    # them back out through its accessors. Stored samples are complete, so
+    # they go straight into the telemetry, the history is not needed.
+    device = Icarus(id, history_capacity=1)
+
+    for timestamp, sample in samples:
+        device.telemetry.update(sample)
+
+        yield (
+            timestamp,
+            *device.location_detailed(),
+            *device.location_status(),
+            *device.orientation(),
+            *device.movement(),
+            *device.environment()
+        )
+
+def located(rows):
+    # Only rows with a position, for the track formats
+    for row in rows:
+        if row[1] or row[2]:
+            yield row
+
+def iso_time(timestamp):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp)) + ".{:03d}Z".format(int(timestamp % 1 * 1000))
+
+def write_csv(file, ids, rows):
+    writer = csv.writer(file)
+    writer.writerow(("id",) + COLUMNS)
+
+    for id in ids:
+        for row in rows(id):
+            writer.writerow((id,) + row)
+
+def write_geojson(file, ids, rows):
+    # A LineString feature per device, the sample times go in a property
+    # from a second pass so neither list is ever held in memory
+    file.write('{"type": "FeatureCollection", "features": [\n')
+
+    for index, id in enumerate(ids):
+        if index:
+            file.write(",\n")
+
+        file.write('{"type": "Feature", "geometry": {"type": "LineString", "coordinates": [')
+
+        for count, row in enumerate(located(rows(id))):
+            file.write(("," if count else "") + json.dumps([row[2], row[1], row[3]]))
+
+        file.write(']}, "properties": {"id": ' + json.dumps(id) + ', "times": [')
+
+        for count, row in enumerate(located(rows(id))):
+            file.write(("," if count else "") + '"' + iso_time(row[0]) + '"')
+
+        file.write("]}}")
+
+    file.write("\n]}\n")
+
+def write_gpx(file, ids, rows):
+    file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    file.write('<gpx version="1.1" creator="icarus_gcs" xmlns="http://www.topografix.com/GPX/1/1">\n')
+
+    for id in ids:
+        file.write("<trk><name>" + escape(id) + "</name><trkseg>\n")
+
+        for row in located(rows(id)):
+            file.write(
+                '<trkpt lat="{:.7f}" lon="{:.7f}"><ele>{:.2f}</ele><time>{}</time></trkpt>\n'.format(row[1], row[2], row[3], iso_time(row[0]))
+            )
+
+        file.write("</trkseg></trk>\n")
+
+    file.write("</gpx>\n")
+
+def write_kml(file, ids, rows):
+    # A gx:Track per device, which wants every <when> before the first
+    # <gx:coord>, so each device is read twice
+    file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    file.write('<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">\n<Document>\n')
+
+    for id in ids:
+        file.write("<Placemark><name>" + escape(id) + "</name><gx:Track><altitudeMode>absolute</altitudeMode>\n")
+
+        for row in located(rows(id)):
+            file.write("<when>" + iso_time(row[0]) + "</when>\n")
+
+        for row in located(rows(id)):
+            file.write("<gx:coord>{:.7f} {:.7f} {:.2f}</gx:coord>\n".format(row[2], row[1], row[3]))
+
+        file.write("</gx:Track></Placemark>\n")
+
+    file.write("</Document>\n</kml>\n")
+
+# Format -> (file extension, writer, passes over each device)
+FORMATS = {
+    "csv": (".csv", write_csv, 1),
+    "geojson": (".geojson", write_geojson, 2),
+    "gpx": (".gpx", write_gpx, 1),
+    "kml": (".kml", write_kml, 2),
+}
+
+def format_for_path(path):
+    extension = os.path.splitext(path)[1].lower()
+
+    for name, (format_extension, writer, passes) in FORMATS.items():
+        if extension == format_extension:
+            return name
+
+    return None
+
+def export(store, ids, path, format, progress=None, cancelled=None):
+    # Streams the stored samples of the given devices to path. Rows go
+    # straight from the database cursor to the file, so memory use does not
+    # depend on the session length. progress(done, total) is called every
+    # PROGRESS_INTERVAL rows, cancelled() is checked as often and aborts the
+    # export. The file only appears under its name once it is complete.
+    # Samples stored after the export started are left out, so every pass
+    # over a device reads the same rows while recording goes on.
+    extension, writer, passes = FORMATS[format]
+
+    end_row = store.last_row()
+    total = sum(store.sample_counts(ids, end_row).values()) * passes
+    state = {"done": 0}
+
+    def rows(id):
+        for row in device_rows(store.samples(id, end_row=end_row), id):
+            state["done"] += 1
+
+            if state["done"] % PROGRESS_INTERVAL == 0:
+                if cancelled is not None and cancelled():
+                    raise ExportCancelled()
+
+                if progress is not None:
+                    progress(state["done"], total)
+
+            yield row
+
+    partial = path + ".part"
+
+    try:
+        with open(partial, "w", newline="", encoding="utf-8") as file:
+            writer(file, ids, rows)
+
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+        raise
+
+    if progress is not None:
+        progress(total, total)
+
+    return state["done"] // passes
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export recorded Icarus telemetry")
+    parser.add_argument("output", help="output file, the format follows the extension unless --format is given")
+    parser.add_argument("--session", default="session.sqlite", help="session database")
+    parser.add_argument("--format", choices=sorted(FORMATS), help="output format")
+    parser.add_argument("--device", action="append", metavar="ID", help="device to export, repeat for several, all devices by default")
+    arguments = parser.parse_args()
+
+    format = arguments.format or format_for_path(arguments.output)
+
+    if format is None:
+        parser.error("unknown output format, use --format")
+
+    if not os.path.exists(arguments.session):
+        parser.error("no session database at: " + arguments.session)
+
+    store = SessionStore(arguments.session)
+
+    ids = arguments.device or list(store.sample_counts())
+
+    def progress(done, total):
+        print("\rExported " + str(done) + " / " + str(total), end="", flush=True)
+
+    start = time.perf_counter()
+    count = export(store, ids, arguments.output, format, progress)
+    store.close()
+
+    print()
+    print("Exported " + str(count) + " samples of " + str(len(ids)) + " devices to: " + arguments.output + " in " + str(round(time.perf_counter() - start, 3)) + " s")
+
+    sys.exit(0)
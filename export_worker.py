@@ -0,0 +1,52 @@
+import os
+import threading
+
+from PyQt5 import QtCore
+
+from export import export, ExportCancelled
+
+class ExportWorker(QtCore.QThread):
+    # Runs one export on its own thread so tracking carries on meanwhile.
+    # Progress is reported as (rows done, rows total).
+    progress = QtCore.pyqtSignal(int, int)
+    # Emitted with the output path and the number of samples exported
+    completed = QtCore.pyqtSignal(str, int)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, store, ids, path, format, parent=None):
+        super(ExportWorker, self).__init__(parent)
+
+        self._store = store
+        self._ids = ids
+        self._path = path
+        self._format = format
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+        self.wait()
+
+    def remove_partial(self):
+        # export() already cleans up after itself, this covers a failure in the cleanup
+        try:
+            os.remove(self._path + ".part")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print("Failed to remove: " + self._path + ".part")
+            print(e)
+
+    def run(self):
+        try:
+            count = export(self._store, self._ids, self._path, self._format, self.progress.emit, self._cancel.is_set)
+        except ExportCancelled:
+            self.remove_partial()
+            self.failed.emit("Cancelled")
+            return
+        except Exception as e:
+            # Anything escaping here would end the thread without a word to the UI
+            self.remove_partial()
+            self.failed.emit(type(e).__name__ + ": " + str(e))
+            return
+
+        self.completed.emit(self._path, count)
@@ -0,0 +1,92 @@
+import time
+import heapq
+
+from icarus import Icarus
+
+class Fleet():
+    # Registry of every device we have heard from, keyed by id. Silent devices
+    # are found with a heap of contact deadlines. Each device has at most one
+    # heap entry, when it comes due and the device has been heard from since,
+    # it is pushed back with its real deadline instead of being evicted.
+    def __init__(self, history_capacity=36000, timeout=3600):
+        self._devices = {}
+        self._deadlines = []
+        self._scheduled = set()
+        self._history_capacity = history_capacity
+        self._timeout = timeout
+
+    def __len__(self):
+        return len(self._devices)
+
+    def __contains__(self, id):
+        return id in self._devices
+
+    def __iter__(self):
+        return iter(self._devices.values())
+
+    def get(self, id):
+        return self._devices.get(id)
+
+    def update(self, record, now=None):
+        if now is None:
+            now = time.time()
+
+        device = self._devices.get(record["id"])
+
+        if device is None:
+            device = Icarus(record["id"], self._history_capacity)
+            self._devices[record["id"]] = device
+
+            if record["id"] not in self._scheduled:
+                self._scheduled.add(record["id"])
+                heapq.heappush(self._deadlines, (now + self._timeout, record["id"]))
+
+        device.update(record, record.get("timestamp"), now)
+
+        return device
+
+    def restore(self, id, timestamps, columns, received):
+        # Loads stored samples into a device, creating it as last heard from at received
+        device = self._devices.get(id)
+
+        if device is None:
+            device = Icarus(id, self._history_capacity)
+            self._devices[id] = device
+
+            if id not in self._scheduled:
+                self._scheduled.add(id)
+                heapq.heappush(self._deadlines, (received + self._timeout, id))
+
+        device.restore(timestamps, columns, received)
+
+        return device
+
+    def remove(self, id):
+        # The heap entry is dropped lazily when it comes due
+        return self._devices.pop(id, None)
+
+    def expire(self, now=None):
+        if now is None:
+            now = time.time()
+
+        expired = []
+        deadlines = self._deadlines
+
+        while deadlines and deadlines[0][0] <= now:
+            deadline, id = heapq.heappop(deadlines)
+            device = self._devices.get(id)
+
+            if device is None:
+                self._scheduled.discard(id)
+                continue
+
+            deadline = device.tolc + self._timeout
+
+            if deadline <= now:
+                del self._devices[id]
+                self._scheduled.discard(id)
+                expired.append(id)
+            else:
+                heapq.heappush(deadlines, (deadline, id))
+
+        return expired
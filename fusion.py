@@ -0,0 +1,246 @@
+import time
+import heapq
+import itertools
+import collections
+
+from link_log import LINK_SERIAL, LINK_MQTT
+
+LINK_NAMES = {
+    LINK_SERIAL: "radio",
+    LINK_MQTT: "cellular",
+}
+
+SEQUENCE_MODULO = 1 << 16
+SEQUENCE_HALF = SEQUENCE_MODULO >> 1
+
+# Weight of the newest sample in the per link moving averages
+AVERAGE_WEIGHT = 0.1
+
+class LinkStatistics():
+    __slots__ = ("received", "first", "duplicates", "lost", "delay", "latency", "last_received", "_last_sequence")
+
+    def __init__(self):
+        self.received = 0
+        # Packets this link delivered before any other link did
+        self.first = 0
+        self.duplicates = 0
+        # Sequence gaps in what this link delivered
+        self.lost = 0
+        # Average lag behind the link that delivered a duplicate first, seconds
+        self.delay = None
+        # Average age of packets on arrival by their own timestamp, seconds
+        self.latency = None
+        self.last_received = None
+        self._last_sequence = {}
+
+    def as_dict(self):
+        return {
+            "received": self.received,
+            "first": self.first,
+            "duplicates": self.duplicates,
+            "lost": self.lost,
+            "loss": self.lost / (self.received + self.lost) if self.received + self.lost else 0.0,
+            "delay": self.delay,
+            "latency": self.latency,
+            "last_received": self.last_received,
+        }
+
+class _DeviceSequence():
+    # Sequence numbers seen for one device, as a bitset over the last window
+    # sequence numbers. Bit k of seen is set if highest - k arrived. Sequence
+    # numbers are 16 bit and wrap, highest is unwrapped so it keeps counting.
+    __slots__ = ("highest", "timestamp", "seen", "released", "held", "arrivals", "arrival_order")
+
+    def __init__(self):
+        self.highest = None
+        # Device timestamp of the highest packet, None if it did not report one
+        self.timestamp = None
+        self.seen = 0
+        self.released = None
+        self.held = []
+        # Unwrapped sequence -> (first arrival time, link) of recent packets,
+        # and the same sequences in arrival order to forget the oldest cheaply
+        self.arrivals = {}
+        self.arrival_order = collections.deque()
+
+class TelemetryFusion():
+    # Merges telemetry arriving over several links. Packets are deduplicated
+    # by device id and sequence number over a bitset window, and released in
+    # sequence order: a packet waits at most reorder_delay for the ones before
+    # it, after that the gap is given up on and anything older that still
+    # turns up is dropped rather than moving the device backwards. Whichever
+    # link delivers a packet first is the one the model sees, so the display
+    # always follows the fresher link. Records without a sequence number pass
+    # straight through.
+    def __init__(self, window=1024, reorder_delay=0.5):
+        self._window = window
+        self._mask = (1 << window) - 1
+        self._reorder_delay = reorder_delay
+        self._devices = {}
+        self._links = {}
+        self._counter = itertools.count()
+
+        self.duplicates = 0
+        self.late = 0
+
+    def link(self, link):
+        statistics = self._links.get(link)
+
+        if statistics is None:
+            statistics = self._links[link] = LinkStatistics()
+
+        return statistics
+
+    def statistics(self):
+        return {LINK_NAMES.get(link, str(link)): statistics.as_dict() for link, statistics in self._links.items()}
+
+    def held(self):
+        return sum(len(device.held) for device in self._devices.values())
+
+    def remove(self, id):
+        self._devices.pop(id, None)
+
+        for statistics in self._links.values():
+            statistics._last_sequence.pop(id, None)
+
+    def submit(self, link, records, now=None):
+        # Takes a batch from one link and returns the records ready for the model
+        if now is None:
+            now = time.perf_counter()
+
+        wall = time.time()
+        statistics = self.link(link)
+        released = []
+
+        for record in records:
+            statistics.received += 1
+            statistics.last_received = wall
+
+            age = wall - record.get("timestamp", wall)
+            statistics.latency = age if statistics.latency is None else statistics.latency + AVERAGE_WEIGHT * (age - statistics.latency)
+
+            sequence = record.get("sequence")
+
+            if sequence is None:
+                statistics.first += 1
+                released.append(record)
+                continue
+
+            self._accept(link, statistics, record, sequence, record.get("received", now))
+
+        return released + self.release(now)
+
+    def _accept(self, link, statistics, record, sequence, arrived):
+        id = record["id"]
+        device = self._devices.get(id)
+
+        if device is None:
+            device = self._devices[id] = _DeviceSequence()
+
+        duplicate = False
+
+        # Only the device's own clock can tell a restart from a late packet
+        timestamp = None if record.get("timestamp_estimated") else record.get("timestamp")
+
+        if device.highest is None:
+            device.highest = sequence
+            device.timestamp = timestamp
+            device.seen = 1
+            unwrapped = sequence
+        else:
+            offset = (sequence - device.highest) % SEQUENCE_MODULO
+
+            if offset >= SEQUENCE_HALF:
+                offset -= SEQUENCE_MODULO
+
+            # A packet behind the highest one but sent after it means the
+            # device restarted its count, as does one too far behind to be late
+            restarted = offset <= -self._window or (
+                offset < 0 and timestamp is not None and device.timestamp is not None and timestamp > device.timestamp
+            )
+
+            if restarted:
+                offset = 0
+                device.highest += (sequence - device.highest) % SEQUENCE_MODULO
+                device.timestamp = timestamp
+                device.seen = 1
+                device.released = device.highest - 1
+                device.arrivals.clear()
+                device.arrival_order.clear()
+
+                for link_statistics in self._links.values():
+                    link_statistics._last_sequence.pop(id, None)
+            elif offset > 0:
+                device.seen = ((device.seen << offset) | 1) & self._mask
+                device.highest += offset
+                device.timestamp = timestamp
+                offset = 0
+            else:
+                bit = 1 << -offset
+                duplicate = bool(device.seen & bit)
+                device.seen |= bit
+
+            unwrapped = device.highest + offset
+
+        # Gaps in what each link delivered, duplicates included
+        last = statistics._last_sequence.get(id)
+
+        if last is None or last < unwrapped:
+            if last is not None:
+                statistics.lost += min(unwrapped - last - 1, self._window)
+
+            statistics._last_sequence[id] = unwrapped
+
+        if duplicate:
+            self.duplicates += 1
+            statistics.duplicates += 1
+
+            first = device.arrivals.get(unwrapped)
+
+            if first is not None and first[1] != link:
+                delay = max(arrived - first[0], 0.0)
+                statistics.delay = delay if statistics.delay is None else statistics.delay + AVERAGE_WEIGHT * (delay - statistics.delay)
+
+            return
+
+        statistics.first += 1
+        device.arrivals[unwrapped] = (arrived, link)
+        device.arrival_order.append(unwrapped)
+
+        # Forget arrivals that fell out of the window
+        arrival_order = device.arrival_order
+        oldest = device.highest - self._window
+
+        while arrival_order and arrival_order[0] <= oldest:
+            device.arrivals.pop(arrival_order.popleft(), None)
+
+        heapq.heappush(device.held, (unwrapped, arrived, next(self._counter), record))
+
+    def release(self, now=None):
+        # Records that are next in sequence, or have waited out the reorder delay
+        if now is None:
+            now = time.perf_counter()
+
+        released = []
+        deadline = now - self._reorder_delay
+
+        for device in self._devices.values():
+            held = device.held
+
+            while held:
+                unwrapped, arrived, order, record = held[0]
+
+                if device.released is not None and unwrapped <= device.released:
+                    # Arrived after a later packet was already released
+                    heapq.heappop(held)
+                    self.late += 1
+                    continue
+
+                if device.released is not None and unwrapped != device.released + 1 and arrived > deadline:
+                    break
+
+                heapq.heappop(held)
+                device.released = unwrapped
+                released.append(record)
+
+        return released
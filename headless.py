@@ -0,0 +1,204 @@
+import sys
+import time
+import argparse
+import threading
+import configparser
+
+from protocol import FrameDecoder, decode_payload
+from mqtt_ingest import MqttIngest, decode_json_telemetry, decode_frame_telemetry, coalesce
+from fleet import Fleet
+from map_payload import MapPayload
+from pipeline import TelemetryPipeline
+from map_transport import encode_call, call_size
+from fusion import TelemetryFusion
+from events import EventEngine, load_geofences
+from link_log import LinkLog, LINK_SERIAL, LINK_MQTT, replay
+from synthetic import SyntheticFleet, serial_frame, mqtt_message
+
+STAGES = ("decode", "ingest", "model", "payload")
+
+class HeadlessIngest():
+    # The telemetry path of MainWindow without Qt: serial frame decoding, MQTT
+    # ingest, fleet and model updates and map payload generation. Map calls
+    # are serialised exactly as MapWrapper would send them and then dropped.
+    def __init__(self, config, record_timings=False):
+        self.decoder = FrameDecoder()
+
+        self.mqtt_ingest = MqttIngest(
+            int(config["MQTT"]["Queue Size"]),
+            config["MQTT"]["Drop Policy"],
+            coalesce=False
+        )
+        self.mqtt_ingest.add_route("icarus/+/telemetry", decode_json_telemetry)
+        self.mqtt_ingest.add_route("icarus/+/frame", decode_frame_telemetry)
+
+        self.fleet = Fleet(
+            int(config["Telemetry"]["History Capacity"]),
+            float(config["Telemetry"]["Device Timeout"])
+        )
+        self.fusion = TelemetryFusion(
+            int(config["Fusion"]["Window"]),
+            float(config["Fusion"]["Reorder Delay"])
+        )
+        self.events = EventEngine(
+            load_geofences(config["Events"]["Geofences"], float(config["Events"]["Geofence Cell Size"])),
+            float(config["Events"]["Launch Altitude"]),
+            float(config["Events"]["Rising Rate"]),
+            float(config["Events"]["Burst Rate"]),
+            float(config["Events"]["Burst Window"]),
+            float(config["Events"]["Apogee Drop"]),
+            float(config["Events"]["Landing Rate"]),
+            float(config["Events"]["Landing Time"]),
+            float(config["Events"]["Max HDOP"])
+        )
+        self.map_payload = MapPayload(int(config["Map"]["Zoom Level"]), int(config["Telemetry"]["History Capacity"]))
+        self.pipeline = TelemetryPipeline(self.fleet, self.map_payload, events=self.events, event_raised=self.event_raised)
+
+        self._serial_records = []
+        self._flush_interval = 1.0 / float(config["Map"]["Max Update Rate"])
+        self._flush_last = 0.0
+
+        self.messages = 0
+        self.payload_bytes = 0
+        self.event_counts = {}
+
+        self._record_timings = record_timings
+        self.stage_times = {stage: [] for stage in STAGES}
+
+    def event_raised(self, event):
+        self.event_counts[event["type"]] = self.event_counts.get(event["type"], 0) + 1
+
+    def feed_serial(self, data):
+        start = time.perf_counter()
+
+        for payload in self.decoder.feed(data):
+            record = decode_payload(payload)
+
+            if record is not None:
+                self._serial_records.append(record)
+
+        if self._record_timings:
+            self.stage_times["decode"].append(time.perf_counter() - start)
+
+    def submit_mqtt(self, topic, payload):
+        self.mqtt_ingest.submit(topic, payload)
+
+    def tick(self, force_flush=False):
+        # One GUI tick: drain both links, update the model and flush the map
+        # if a frame is due
+        start = time.perf_counter()
+
+        records = self.fusion.submit(LINK_SERIAL, self._serial_records) + coalesce(self.fusion.submit(LINK_MQTT, self.mqtt_ingest.drain()))
+        self._serial_records = []
+
+        ingested = time.perf_counter()
+
+        if records:
+            self.pipeline.update(records)
+            self.messages += len(records)
+
+        updated = time.perf_counter()
+
+        if force_flush or updated - self._flush_last >= self._flush_interval:
+            self._flush_last = updated
+
+            for function, payload in self.map_payload.flush():
+                self.payload_bytes += call_size(encode_call(function, payload)[1])
+
+        flushed = time.perf_counter()
+
+        if self._record_timings:
+            self.stage_times["ingest"].append(ingested - start)
+            self.stage_times["model"].append(updated - ingested)
+            self.stage_times["payload"].append(flushed - updated)
+
+def run_synthetic(ingest, count, rate, duration, tick_interval=0.1):
+    # Feeds a synthetic fleet, half over serial and half over MQTT, one tick
+    # of simulated time at a time and as fast as possible. Every tick is a map
+    # frame, as it would be with the tick interval at the map update rate.
+    fleet = SyntheticFleet(count, rate)
+    tick_end = tick_interval
+    serial_data = bytearray()
+
+    for record in fleet.records(duration):
+        if record["timestamp"] >= tick_end:
+            ingest.feed_serial(bytes(serial_data))
+            serial_data.clear()
+            ingest.tick(True)
+            tick_end += tick_interval
+
+        if int(record["id"]) % 2:
+            serial_data += serial_frame(record)
+        else:
+            ingest.submit_mqtt(*mqtt_message(record))
+
+    ingest.feed_serial(bytes(serial_data))
+    ingest.tick(True)
+
+def run_replay(ingest, path, speed, tick_interval=0.1):
+    # Replays a link log, ticking from a second thread like the GUI timers would
+    stop = threading.Event()
+    lock = threading.Lock()
+
+    def serial_sink(data):
+        with lock:
+            ingest.feed_serial(bytes(data))
+
+    def mqtt_sink(topic, payload):
+        # Waits for the ticker instead of overrunning the MQTT queue
+        ingest.mqtt_ingest.wait_for_room()
+        ingest.submit_mqtt(topic, payload)
+
+    def ticker():
+        while not stop.wait(tick_interval):
+            with lock:
+                ingest.tick()
+
+    thread = threading.Thread(target=ticker, daemon=True)
+    thread.start()
+
+    log = LinkLog(path)
+    replay(log, serial_sink, mqtt_sink, speed)
+    log.close()
+
+    stop.set()
+    thread.join()
+
+    with lock:
+        ingest.tick(True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the Icarus telemetry path without a GUI")
+    parser.add_argument("--config", default="config.ini", help="configuration file")
+    parser.add_argument("--replay", metavar="PATH", help="replay a link recording")
+    parser.add_argument("--replay-speed", type=float, default=0.0, help="replay speed multiplier, 0 replays as fast as possible")
+    parser.add_argument("--synthetic", type=int, metavar="COUNT", help="simulate a fleet of COUNT balloons")
+    parser.add_argument("--rate", type=float, default=1.0, help="synthetic telemetry rate per balloon in Hz")
+    parser.add_argument("--duration", type=float, default=3600.0, help="synthetic flight time in seconds")
+    arguments = parser.parse_args()
+
+    if arguments.replay is None and arguments.synthetic is None:
+        parser.error("one of --replay or --synthetic is required")
+
+    config = configparser.ConfigParser()
+    config.read(arguments.config)
+
+    ingest = HeadlessIngest(config)
+    start = time.perf_counter()
+
+    if arguments.replay is not None:
+        run_replay(ingest, arguments.replay, arguments.replay_speed)
+    else:
+        run_synthetic(ingest, arguments.synthetic, arguments.rate, arguments.duration)
+
+    elapsed = time.perf_counter() - start
+
+    print("Messages: " + str(ingest.messages))
+    print("Devices: " + str(len(ingest.fleet)))
+    print("Elapsed: " + str(round(elapsed, 3)) + " s")
+    print("Rate: " + str(round(ingest.messages / elapsed)) + " messages/s")
+    print("Map payload: " + str(ingest.payload_bytes) + " bytes")
+    print("Events: " + ", ".join(type + " " + str(count) for type, count in sorted(ingest.event_counts.items())))
+    print("Dropped: " + str(ingest.mqtt_ingest.dropped) + " MQTT, " + str(ingest.decoder.crc_errors) + " CRC errors")
+
+    sys.exit(0)
@@ -1,6 +1,31 @@
 import time
 
+from telemetry_history import TelemetryHistory
+
 class Icarus():
+	__slots__ = ("_state", "_id", "_tolc", "_telemetry", "_history")
+
+	FIELDS = (
+		"latitude",
+		"longitude",
+		"altitude",
+		"altitude_elipsoid",
+		"altitude_relative",
+		"altitude_barometric",
+		"velocity_horizontal",
+		"velocity_vertical",
+		"roll",
+		"pitch",
+		"yaw",
+		"heading",
+		"course",
+		"temperature",
+		"pressure",
+		"humidity",
+		"hdop",
+		"fix",
+	)
+
 	@property
 	def id(self):
 		return self._id
@@ -8,8 +33,16 @@ class Icarus():
 	@property
 	def telemetry(self):
 		return self._telemetry
+
+	@property
+	def history(self):
+		return self._history
+
+	@property
+	def tolc(self):
+		return self._tolc
 	
-	def __init__(self, id):
+	def __init__(self, id, history_capacity=36000):
 		super().__init__()
 
 		self._state = {
@@ -43,8 +76,36 @@ class Icarus():
 			"fix": 0,
 		}
 
+		self._history = TelemetryHistory(self.FIELDS, history_capacity)
+
+	def update(self, telemetry, timestamp=None, received=None):
+		if received is None:
+			received = time.time()
+
+		if timestamp is None:
+			timestamp = received
+
+		self._tolc = received
+
+		for field in self.FIELDS:
+			if field in telemetry:
+				self._telemetry[field] = telemetry[field]
+
+		self._history.append(timestamp, self._telemetry)
+
+	def restore(self, timestamps, columns, received):
+		# Bulk load of stored samples, oldest first, when restoring a session
+		if not timestamps:
+			return
+
+		self._tolc = received
+		self._history.extend(timestamps, columns)
+
+		for field in self.FIELDS:
+			self._telemetry[field] = columns[field][-1]
+
 	def tslc(self):
-		return round(time.time()) - self.tolc
+		return round(time.time() - self._tolc)
 
 	def location(self):
 		return [
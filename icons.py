@@ -0,0 +1,36 @@
+from PyQt5.QtCore import QSize
+from PyQt5.QtGui import QIcon
+
+class IconCache():
+    # Icons are registered by name and only loaded the first time they are
+    # used. prerender() rasterises them ahead of time, replacing the SVG icon
+    # with pixmaps so later state changes never parse or render an SVG.
+    def __init__(self, base_path):
+        self._base_path = base_path
+        self._paths = {}
+        self._icons = {}
+
+    def __contains__(self, name):
+        return name in self._paths
+
+    def __getitem__(self, name):
+        icon = self._icons.get(name)
+
+        if icon is None:
+            icon = self._icons[name] = QIcon(self._base_path + "/" + self._paths[name])
+
+        return icon
+
+    def register(self, name, path):
+        self._paths[name] = path
+        self._icons.pop(name, None)
+
+    def prerender(self, sizes, names=None):
+        for name in (self._paths if names is None else names):
+            icon = self[name]
+            rendered = QIcon()
+
+            for size in sizes:
+                rendered.addPixmap(icon.pixmap(QSize(size, size)))
+
+            self._icons[name] = rendered
@@ -0,0 +1,276 @@
+import time
+import threading
+import multiprocessing
+
+import serial
+import paho.mqtt.client as mqtt
+
+from protocol import FrameDecoder, MESSAGE_ACK, decode_payload, decode_ack
+from serial_buffer import SerialReadBuffer
+from mqtt_ingest import topic_matches
+from link_log import LinkRecorder, LINK_SERIAL, LINK_MQTT
+from shared_ring import SharedRecordRing
+
+class IngestProcess():
+    # Runs the serial and MQTT links in a separate process. Decoded telemetry
+    # comes back through a SharedRecordRing, everything else (link status,
+    # acks, commands for the links) goes over a pipe as tuples. The process
+    # records the links itself and keeps doing so for orphan_timeout seconds
+    # if the GUI goes away, so a GUI crash does not lose the stream. Without a
+    # recording configured it starts one at orphan_path once orphaned.
+    def __init__(self, settings, capacity=65536):
+        self.ring = SharedRecordRing(capacity=capacity)
+
+        context = multiprocessing.get_context("spawn")
+        self._connection, child_connection = context.Pipe()
+        self._process = context.Process(
+            target=ingest_main,
+            args=(self.ring.name, child_connection, settings),
+            name="icarus-ingest"
+        )
+
+    def start(self):
+        self._process.start()
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def send(self, *message):
+        try:
+            self._connection.send(message)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def events(self):
+        events = []
+
+        try:
+            while self._connection.poll():
+                events.append(self._connection.recv())
+        except (EOFError, OSError):
+            events.append(("exited",))
+
+        return events
+
+    def read(self, max_count=None):
+        return self.ring.read(max_count)
+
+    def stop(self, timeout=2.0):
+        self.send("stop")
+        self._process.join(timeout)
+
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+
+        self._connection.close()
+        self.ring.close()
+
+def ingest_main(ring_name, connection, settings):
+    ring = SharedRecordRing(ring_name)
+    ring_lock = threading.Lock()
+    connection_lock = threading.Lock()
+
+    # Without a recording configured one only starts once the GUI is gone, see orphan()
+    state = {"orphaned": None, "recorder": None}
+
+    if settings["recorder_path"] is not None:
+        state["recorder"] = LinkRecorder(settings["recorder_path"])
+
+    serial_client = serial.Serial()
+    serial_client.timeout = settings["batch_interval"]
+    decoder = FrameDecoder()
+    read_buffer = SerialReadBuffer()
+
+    mqtt_client = mqtt.Client()
+    routes = settings["routes"]
+    ack_topic = settings["ack_topic"]
+
+    rejected = set()
+
+    def orphan():
+        # Nobody reads the ring any more, the link log is all that is left
+        if state["orphaned"] is not None:
+            return
+
+        state["orphaned"] = time.monotonic()
+
+        if state["recorder"] is None and settings["orphan_path"] is not None:
+            try:
+                state["recorder"] = LinkRecorder(settings["orphan_path"])
+            except OSError:
+                pass
+
+    def send_event(*event):
+        if state["orphaned"] is not None:
+            return
+
+        try:
+            with connection_lock:
+                connection.send(event)
+        except (OSError, ValueError):
+            orphan()
+
+    def mqtt_on_connect(client, userdata, flags, return_code):
+        if return_code == 0:
+            for subscription, route_decoder in routes:
+                client.subscribe(subscription)
+
+            client.subscribe(ack_topic)
+
+        send_event("mqtt_connected", return_code)
+
+    def mqtt_on_disconnect(client, userdata, return_code):
+        send_event("mqtt_disconnected", return_code)
+
+    def mqtt_on_message(client, userdata, message):
+        received = time.perf_counter()
+
+        recorder = state["recorder"]
+
+        if recorder is not None:
+            recorder.record_mqtt(message.topic, message.payload)
+
+        if topic_matches(ack_topic, message.topic):
+            ack = decode_ack(message.payload)
+
+            if ack is not None:
+                send_event("acks", [ack])
+
+            return
+
+        for subscription, route_decoder in routes:
+            if topic_matches(subscription, message.topic):
+                try:
+                    record = route_decoder(message.topic, message.payload)
+                except ValueError:
+                    record = None
+
+                if record is not None:
+                    record["received"] = received
+
+                    with ring_lock:
+                        written = ring.write(LINK_MQTT, record)
+
+                    # Only serial ids are known to fit the ring, say so once per topic
+                    if not written and message.topic not in rejected:
+                        rejected.add(message.topic)
+                        send_event("error", "Device id too long, dropping telemetry from: " + message.topic)
+
+                return
+
+    mqtt_client.on_connect = mqtt_on_connect
+    mqtt_client.on_disconnect = mqtt_on_disconnect
+    mqtt_client.on_message = mqtt_on_message
+
+    def handle(message):
+        command = message[0]
+
+        if command == "stop":
+            return False
+
+        if command == "serial_open":
+            try:
+                serial_client.port = message[1]
+                serial_client.baudrate = message[2]
+                serial_client.open()
+                decoder.reset()
+                send_event("serial_opened", message[1])
+            except serial.SerialException as e:
+                send_event("serial_error", str(e))
+        elif command == "serial_close":
+            serial_client.close()
+            send_event("serial_closed")
+        elif command == "serial_write":
+            if serial_client.is_open:
+                serial_client.write(message[1])
+        elif command == "mqtt_connect":
+            try:
+                mqtt_client.username_pw_set(message[3], message[4])
+                mqtt_client.connect(message[1], message[2], 30)
+                mqtt_client.loop_start()
+            except (OSError, ValueError) as e:
+                send_event("mqtt_error", str(e))
+        elif command == "mqtt_disconnect":
+            mqtt_client.loop_stop()
+            mqtt_client.disconnect()
+        elif command == "mqtt_publish":
+            mqtt_client.publish(message[1], message[2], qos=message[3])
+
+        return True
+
+    parent = multiprocessing.parent_process()
+    parent_checked = time.monotonic()
+    running = True
+
+    while running:
+        # Wait on the pipe only while there is no port to block on instead
+        try:
+            while state["orphaned"] is None and connection.poll(0 if serial_client.is_open else settings["batch_interval"]):
+                if not handle(connection.recv()):
+                    running = False
+                    break
+        except (EOFError, OSError):
+            orphan()
+
+        if not running:
+            break
+
+        if serial_client.is_open:
+            try:
+                data = read_buffer.read(serial_client)
+            except (serial.SerialException, OSError) as e:
+                serial_client.close()
+                send_event("serial_error", str(e))
+                data = b""
+
+            if data:
+                received = time.perf_counter()
+                acks = []
+
+                if state["recorder"] is not None:
+                    state["recorder"].record_serial(data)
+
+                for payload in decoder.feed(data):
+                    if payload and payload[0] == MESSAGE_ACK:
+                        ack = decode_ack(payload)
+
+                        if ack is not None:
+                            acks.append(ack)
+
+                        continue
+
+                    record = decode_payload(payload)
+
+                    if record is not None:
+                        record["received"] = received
+
+                        with ring_lock:
+                            ring.write(LINK_SERIAL, record)
+
+                if acks:
+                    send_event("acks", acks)
+        elif state["orphaned"] is not None:
+            time.sleep(settings["batch_interval"])
+
+        now = time.monotonic()
+
+        if now - parent_checked >= 1.0:
+            parent_checked = now
+
+            if state["orphaned"] is None and parent is not None and not parent.is_alive():
+                orphan()
+
+            # Without a GUI the links are only recorded, until the timeout
+            if state["orphaned"] is not None and now - state["orphaned"] >= settings["orphan_timeout"]:
+                running = False
+
+    mqtt_client.loop_stop()
+    mqtt_client.disconnect()
+    serial_client.close()
+
+    if state["recorder"] is not None:
+        state["recorder"].close()
+
+    ring.close()
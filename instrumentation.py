@@ -0,0 +1,207 @@
+import json
+import time
+import threading
+
+# Hot path stages, each measured from the moment the sample was received on a link
+STAGES = ("decode", "queue", "model", "dispatch", "apply")
+
+STAGE_DESCRIPTIONS = {
+    "decode": "Link receive to decoded record",
+    "queue": "Link receive to model update start",
+    "model": "Link receive to model updated",
+    "dispatch": "Link receive to map call sent",
+    "apply": "Link receive to map call applied in the page",
+}
+
+# Log-linear buckets: values below 2 ** SUB_BUCKET_BITS are exact, above that
+# every power of two is split into 2 ** (SUB_BUCKET_BITS - 1) linear buckets,
+# so a bucket is at most 1/128 (0.8%) of the values in it wide
+SUB_BUCKET_BITS = 8
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+SUB_BUCKETS_HALF = SUB_BUCKETS >> 1
+
+# Values are microseconds, anything over an hour is counted as an hour
+HIGHEST_VALUE = 3600 * 1000000
+
+def bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value
+
+    exponent = value.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKETS + (exponent - 1) * SUB_BUCKETS_HALF + (value >> exponent) - SUB_BUCKETS_HALF
+
+def bucket_highest(index):
+    # Largest value that lands in a bucket
+    if index < SUB_BUCKETS:
+        return index
+
+    exponent, mantissa = divmod(index - SUB_BUCKETS, SUB_BUCKETS_HALF)
+    exponent += 1
+
+    return ((mantissa + SUB_BUCKETS_HALF + 1) << exponent) - 1
+
+class LatencyHistogram():
+    # HDR style latency histogram. Recording is a bucket lookup and an
+    # increment, percentiles are read back within 1% from 1 us up to an hour
+    # in a fixed ~26 KB of counts.
+    __slots__ = ("_counts", "_count", "_total", "_min", "_max")
+
+    def __init__(self):
+        self._counts = [0] * (bucket_index(HIGHEST_VALUE) + 1)
+        self.reset()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def min(self):
+        return self._min / 1000000 if self._count else None
+
+    @property
+    def max(self):
+        return self._max / 1000000 if self._count else None
+
+    @property
+    def mean(self):
+        return self._total / self._count / 1000000 if self._count else None
+
+    def reset(self):
+        for index in range(len(self._counts)):
+            self._counts[index] = 0
+
+        self._count = 0
+        self._total = 0
+        self._min = 0
+        self._max = 0
+
+    def record(self, seconds):
+        value = min(max(int(seconds * 1000000), 0), HIGHEST_VALUE)
+
+        self._counts[bucket_index(value)] += 1
+        self._total += value
+
+        if not self._count or value < self._min:
+            self._min = value
+
+        if value > self._max:
+            self._max = value
+
+        self._count += 1
+
+    def percentile(self, percent):
+        # Seconds below which percent of the recorded values fall
+        if not self._count:
+            return None
+
+        threshold = max(1, -(-self._count * percent // 100))
+        seen = 0
+
+        for index, count in enumerate(self._counts):
+            seen += count
+
+            if seen >= threshold:
+                return min(bucket_highest(index), self._max) / 1000000
+
+        return self._max / 1000000
+
+    def buckets(self):
+        # (highest value in seconds, count) of every bucket that was hit
+        return [(bucket_highest(index) / 1000000, count) for index, count in enumerate(self._counts) if count]
+
+class Instrumentation():
+    # Latency histograms of the telemetry hot path and queue depth gauges.
+    #
+    # Every record carries the time.perf_counter() of its link receive under
+    # "received", each stage records how long after that it finished. Map
+    # frames coalesce many samples, so dispatch and apply are measured from
+    # the oldest sample waiting for the next frame. Recording happens on the
+    # link threads as well as the GUI thread, so it is done under a lock.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {stage: LatencyHistogram() for stage in STAGES}
+        self._gauges = {}
+        self._pending = None
+        self._started = time.time()
+
+    def histogram(self, stage):
+        return self._histograms[stage]
+
+    def record(self, stage, latency):
+        with self._lock:
+            self._histograms[stage].record(latency)
+
+    def record_since(self, stage, received, now=None):
+        if now is None:
+            now = time.perf_counter()
+
+        self.record(stage, now - received)
+
+    def gauge(self, name, value):
+        # Keeps the latest and the highest value of a queue depth
+        with self._lock:
+            gauge = self._gauges.get(name)
+
+            if gauge is None:
+                self._gauges[name] = [value, value]
+            else:
+                gauge[0] = value
+
+                if value > gauge[1]:
+                    gauge[1] = value
+
+    def gauges(self):
+        with self._lock:
+            return {name: tuple(gauge) for name, gauge in self._gauges.items()}
+
+    def pending(self, received):
+        # Notes that samples received at received are waiting for a map frame
+        if self._pending is None or received < self._pending:
+            self._pending = received
+
+    def take_pending(self):
+        # Receive time of the oldest sample in the frame being sent, if any
+        received = self._pending
+        self._pending = None
+        return received
+
+    def reset(self):
+        with self._lock:
+            for histogram in self._histograms.values():
+                histogram.reset()
+
+            self._gauges.clear()
+            self._pending = None
+            self._started = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            stages = {}
+
+            for stage, histogram in self._histograms.items():
+                stages[stage] = {
+                    "description": STAGE_DESCRIPTIONS[stage],
+                    "count": histogram.count,
+                    "min": histogram.min,
+                    "mean": histogram.mean,
+                    "p50": histogram.percentile(50),
+                    "p90": histogram.percentile(90),
+                    "p99": histogram.percentile(99),
+                    "p999": histogram.percentile(99.9),
+                    "max": histogram.max,
+                    "buckets": histogram.buckets(),
+                }
+
+            return {
+                "started": self._started,
+                "captured": time.time(),
+                "stages": stages,
+                "gauges": {name: {"last": gauge[0], "max": gauge[1]} for name, gauge in self._gauges.items()},
+            }
+
+    def export(self, path):
+        with open(path, "w") as file:
+            json.dump(self.snapshot(), file, indent=2)
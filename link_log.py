@@ -0,0 +1,146 @@
+import os
+import mmap
+import time
+import struct
+import threading
+
+# Log file layout: magic, then records of
+#   timestamp (double) | link (uint8) | topic length (uint16) | payload length (uint32) | topic | payload
+LOG_MAGIC = b"ICRSLOG1"
+RECORD_STRUCT = struct.Struct("<dBHI")
+
+LINK_SERIAL = 1
+LINK_MQTT = 2
+
+class LinkRecorder():
+    # Append-only log of everything received on the serial and MQTT links.
+    # Called from the serial reader and paho threads, so writes are locked.
+    def __init__(self, path, flush_interval=1.0):
+        directory = os.path.dirname(path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._path = path
+        self._file = open(path, "ab")
+        self._lock = threading.Lock()
+        self._flush_interval = flush_interval
+        self._flush_last = time.monotonic()
+
+        if self._file.tell() == 0:
+            self._file.write(LOG_MAGIC)
+
+    @property
+    def path(self):
+        return self._path
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def record(self, link, payload, topic=b"", timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+
+        if isinstance(topic, str):
+            topic = topic.encode()
+
+        with self._lock:
+            if self._file.closed:
+                return
+
+            self._file.write(RECORD_STRUCT.pack(timestamp, link, len(topic), len(payload)))
+            self._file.write(topic)
+            self._file.write(payload)
+
+            now = time.monotonic()
+
+            if now - self._flush_last >= self._flush_interval:
+                self._file.flush()
+                self._flush_last = now
+
+    def record_serial(self, data, timestamp=None):
+        self.record(LINK_SERIAL, data, b"", timestamp)
+
+    def record_mqtt(self, topic, payload, timestamp=None):
+        self.record(LINK_MQTT, payload, topic, timestamp)
+
+class LinkLog():
+    # Read side of a link log, memory mapped so opening is instant however
+    # long the recording is. Payloads are handed out as memoryview slices of
+    # the mapping, copy them if they need to outlive the iteration step.
+    def __init__(self, path):
+        self._file = open(path, "rb")
+
+        if os.fstat(self._file.fileno()).st_size < len(LOG_MAGIC):
+            self._file.close()
+            raise ValueError("Not a link log: " + path)
+
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+        if self._view[:len(LOG_MAGIC)] != LOG_MAGIC:
+            self.close()
+            raise ValueError("Not a link log: " + path)
+
+    def close(self):
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def __iter__(self):
+        # Yields (timestamp, link, topic, payload), stopping at a truncated tail record
+        view = self._view
+        position = len(LOG_MAGIC)
+        end = len(view)
+        header_size = RECORD_STRUCT.size
+
+        while position + header_size <= end:
+            timestamp, link, topic_length, payload_length = RECORD_STRUCT.unpack_from(view, position)
+            position += header_size
+
+            if position + topic_length + payload_length > end:
+                break
+
+            topic = bytes(view[position:position + topic_length]).decode()
+            position += topic_length
+
+            yield timestamp, link, topic, view[position:position + payload_length]
+            position += payload_length
+
+def replay(log, serial_sink, mqtt_sink, speed=1.0, stop=None, idle=None):
+    # Feeds a log back through the ingest sinks. A speed of 0 replays as fast
+    # as possible, otherwise the recorded timing is kept, scaled by speed and
+    # idle is called before each wait. Returns the number of records replayed.
+    start_wall = time.monotonic()
+    start_log = None
+    count = 0
+
+    for timestamp, link, topic, payload in log:
+        if stop is not None and stop.is_set():
+            break
+
+        if speed > 0:
+            if start_log is None:
+                start_log = timestamp
+
+            delay = (timestamp - start_log) / speed - (time.monotonic() - start_wall)
+
+            if delay > 0:
+                if idle is not None:
+                    idle()
+
+                if stop is not None:
+                    if stop.wait(delay):
+                        break
+                else:
+                    time.sleep(delay)
+
+        if link == LINK_SERIAL:
+            serial_sink(payload)
+        elif link == LINK_MQTT:
+            mqtt_sink(topic, bytes(payload))
+
+        count += 1
+
+    return count
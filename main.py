@@ -1,4 +1,6 @@
-import sys, io, os, time, json, configparser, socket
+import sys, io, os, time, json, configparser, threading, argparse
+
+startup_started = time.perf_counter()
 
 from PyQt5 import Qt, QtCore
 from PyQt5.QtCore import Qt, QTimer, QDateTime, QSize
@@ -8,18 +10,46 @@ from PyQt5.QtWebEngineWidgets import QWebEngineView
 from PyQt5.QtWebChannel import QWebChannel
 
 import serial
-import serial.tools.list_ports
 import paho.mqtt.client as mqtt
-import matplotlib
-matplotlib.use('Qt5Agg')
 
 from map_wrapper import MapWrapper
 from icarus import Icarus
+from fleet import Fleet
+from pipeline import TelemetryPipeline
+from connectivity import ConnectivityMonitor, parse_targets
+from port_watcher import SerialPortWatcher
+from tile_cache import TileCache
+from link_log import LinkRecorder, LINK_SERIAL, LINK_MQTT
+from icons import IconCache
+from profiling import StartupProfiler
+from instrumentation import Instrumentation
+from diagnostics import DiagnosticsPanel
+from fusion import TelemetryFusion
+from commands import CommandUplink, COMMANDS, addressable
+from protocol import encode_frame, decode_ack
+from tile_scheme import TileSchemeHandler, register_tile_scheme, TILE_SCHEME, TILE_URL
+from serial_reader import SerialReader
+from ingest_process import IngestProcess
+from session_store import SessionStore
+from export import FORMATS as EXPORT_FORMATS, format_for_path
+from export_worker import ExportWorker
+from events import EventEngine, EVENT_LABELS, load_geofences
+from mqtt_ingest import MqttIngest, topic_matches, decode_json_telemetry, decode_frame_telemetry, coalesce
 
 class MainWindow(QWidget):
-    def __init__(self):
+    # Carries finished landing predictions from the process pool back to the GUI thread
+    prediction_ready = QtCore.pyqtSignal(str, object)
+    # Carries command acks from the MQTT network thread to the GUI thread
+    ack_received = QtCore.pyqtSignal(list)
+
+    # Topic devices publish command acks on
+    MQTT_ACK_TOPIC = "icarus/+/ack"
+
+    def __init__(self, replay_path=None, replay_speed=1.0, profiler=None, new_session=False):
         super().__init__()
 
+        self.profiler = StartupProfiler(enabled=False) if profiler is None else profiler
+
         # Init a state dict
         self.state = {
             "internet": {
@@ -30,6 +60,12 @@ class MainWindow(QWidget):
                 "connected": False,
                 "device": "",
                 "baud": 0,
+                # What the port is known as across replugs, see port_watcher.py
+                "identity": None,
+                # Waiting for an open from the ingest process
+                "opening": False,
+                # Waiting for a lost port to come back
+                "reconnecting": False,
             },
             "mqtt": {
                 "client": mqtt.Client(),
@@ -37,13 +73,61 @@ class MainWindow(QWidget):
                 "hostname": "",
                 "port": "",
                 "username": "",
-            }
+            },
         }
 
         # Grab config
         self.config = configparser.ConfigParser()
         self.config.read('config.ini')
 
+        # Hot path latency instrumentation, left out entirely when disabled
+        self.instrumentation = None
+
+        if self.config.getboolean("Diagnostics", "Enabled"):
+            self.instrumentation = Instrumentation()
+
+        # Every device we have heard from, silent ones are evicted after a timeout
+        self.fleet = Fleet(
+            int(self.config["Telemetry"]["History Capacity"]),
+            float(self.config["Telemetry"]["Device Timeout"])
+        )
+
+        # Every model update is persisted so the session survives a restart, replays are not stored
+        self.session_store = None
+
+        if replay_path is None and self.config.getboolean("Session", "Enabled"):
+            self.session_store = SessionStore(
+                self.config["Session"]["Path"],
+                int(self.config["Session"]["Batch Size"]),
+                float(self.config["Session"]["Flush Interval"]),
+                int(self.config["Session"]["Max Pending"])
+            )
+
+            if new_session:
+                self.session_store.clear()
+
+        # The same packet often arrives over radio and cellular, fusion keeps the first copy in sequence order
+        self.telemetry_fusion = TelemetryFusion(
+            int(self.config["Fusion"]["Window"]),
+            float(self.config["Fusion"]["Reorder Delay"])
+        )
+
+        # Flight events are checked on every sample as it is applied
+        events = self.config["Events"]
+
+        self.event_engine = EventEngine(
+            load_geofences(events["Geofences"], float(events["Geofence Cell Size"])),
+            float(events["Launch Altitude"]),
+            float(events["Rising Rate"]),
+            float(events["Burst Rate"]),
+            float(events["Burst Window"]),
+            float(events["Apogee Drop"]),
+            float(events["Landing Rate"]),
+            float(events["Landing Time"]),
+            float(events["Max HDOP"])
+        )
+        self.event_notify = set(type.strip() for type in events["Notify"].split(",") if type.strip())
+
         # Setup MQTT Callbacks
         self.state["mqtt"]["client"].on_connect = self.mqtt_on_connect
         self.state["mqtt"]["client"].on_disconnect = self.mqtt_on_disconnect
@@ -53,8 +137,79 @@ class MainWindow(QWidget):
         self.state["mqtt"]["client"].on_message = self.mqtt_on_message
         self.state["mqtt"]["client"].on_log = self.mqtt_on_log
 
+        # Setup MQTT ingest, messages are decoded on the network thread and drained on a timer.
+        # Fusion sees every record, only the newest per device of what it releases reaches the model.
+        self.mqtt_ingest = MqttIngest(
+            int(self.config["MQTT"]["Queue Size"]),
+            self.config["MQTT"]["Drop Policy"],
+            instrumentation=self.instrumentation,
+            coalesce=False
+        )
+        self.mqtt_ingest.add_route("icarus/+/telemetry", decode_json_telemetry)
+        self.mqtt_ingest.add_route("icarus/+/frame", decode_frame_telemetry)
+
+        # Record everything received on the links, unless we are replaying a recording
+        self.link_recorder = None
+        link_recorder_path = None
+
+        if replay_path is None and self.config.getboolean("Recorder", "Enabled"):
+            link_recorder_path = os.path.join(
+                self.config["Recorder"]["Directory"],
+                time.strftime("flight_%Y%m%d_%H%M%S.icarus")
+            )
+
+        # In process mode the links, decoding and recording live in their own
+        # process and records come back through shared memory
+        self.ingest_process = None
+
+        if replay_path is None and self.config["Ingest"]["Mode"] == "process":
+            self.ingest_process = IngestProcess(
+                {
+                    "recorder_path": link_recorder_path,
+                    "orphan_path": os.path.join(
+                        self.config["Recorder"]["Directory"],
+                        time.strftime("orphan_%Y%m%d_%H%M%S.icarus")
+                    ),
+                    "batch_interval": 0.05,
+                    "routes": self.mqtt_ingest.routes,
+                    "ack_topic": self.MQTT_ACK_TOPIC,
+                    "orphan_timeout": float(self.config["Ingest"]["Orphan Timeout"]),
+                },
+                int(self.config["Ingest"]["Ring Capacity"])
+            )
+            self.ingest_process.start()
+        elif link_recorder_path is not None:
+            self.link_recorder = LinkRecorder(link_recorder_path)
+
+        # Setup serial reader thread, batches arrive on the GUI thread via a queued signal
+        self.serial_reader = SerialReader(self.state["serial"]["client"], recorder=self.link_recorder, instrumentation=self.instrumentation)
+        self.serial_reader.telemetry_received.connect(self.serial_telemetry_update, QtCore.Qt.QueuedConnection)
+        self.serial_reader.error_occurred.connect(self.serial_reader_error, QtCore.Qt.QueuedConnection)
+        self.serial_reader.ack_received.connect(self.on_ack_received, QtCore.Qt.QueuedConnection)
+
+        # Uplink commands go out over both links, each rate limited to what the link can carry
+        self.command_uplink = CommandUplink(
+            float(self.config["Uplink"]["Ack Timeout"]),
+            int(self.config["Uplink"]["Retries"]),
+            float(self.config["Uplink"]["Expiry"])
+        )
+        self.command_uplink.add_link(
+            LINK_SERIAL,
+            self.serial_command_send,
+            float(self.config["Uplink"]["Radio Rate"]),
+            float(self.config["Uplink"]["Radio Burst"])
+        )
+        self.command_uplink.add_link(
+            LINK_MQTT,
+            self.mqtt_command_send,
+            float(self.config["Uplink"]["Cellular Rate"]),
+            float(self.config["Uplink"]["Cellular Burst"])
+        )
+        self.ack_received.connect(self.on_ack_received, QtCore.Qt.QueuedConnection)
+
         # Setup support things
-        self.create_icons()
+        with self.profiler.step("create_icons"):
+            self.create_icons()
 
         # Setup main window
         self.layout_main_window = QGridLayout()
@@ -62,28 +217,139 @@ class MainWindow(QWidget):
         self.setWindowTitle("Icarus GCS")
         self.setWindowIcon(QIcon('assets/balloon_map_icon.png'))
 
-        self.create_toolbar_interface()
-        self.create_map_interface()
-        self.create_serial_interface()
-        self.create_mqtt_interface()
+        # The map goes first so QtWebEngine loads the page while we build the rest
+        with self.profiler.step("create_map_interface"):
+            self.create_map_interface()
+
+        with self.profiler.step("create_toolbar_interface"):
+            self.create_toolbar_interface()
+
+        with self.profiler.step("create_serial_interface"):
+            self.create_serial_interface()
+
+        with self.profiler.step("create_mqtt_interface"):
+            self.create_mqtt_interface()
+
+        with self.profiler.step("create_command_interface"):
+            self.create_command_interface()
+
+        self.groupbox_export_interface = None
+
+        if self.session_store is not None:
+            with self.profiler.step("create_export_interface"):
+                self.create_export_interface()
+
+        # Charts are created once the window is up, see on_first_frame
+        self.chart_panel = None
+
+        self.telemetry_pipeline = TelemetryPipeline(
+            self.fleet,
+            self.map_wrapper,
+            self.instrumentation,
+            self.session_store,
+            self.event_engine,
+            self.on_event_raised
+        )
+
+        if self.session_store is not None and self.config.getboolean("Session", "Restore"):
+            with self.profiler.step("restore_session"):
+                self.telemetry_pipeline.restore(
+                    self.session_store,
+                    time.time() - float(self.config["Telemetry"]["Device Timeout"]),
+                    int(self.config["Telemetry"]["History Capacity"])
+                )
+
+        self.diagnostics_panel = None
+
+        if self.instrumentation is not None:
+            self.diagnostics_panel = DiagnosticsPanel(
+                self.instrumentation,
+                float(self.config["Diagnostics"]["Refresh Rate"]),
+                self.config["Diagnostics"]["Export Directory"]
+            )
 
         self.layout_main_window.addWidget(self.toolbar_status, 0, 1, 1, -1)
-        self.layout_main_window.addWidget(self.webengine_map, 1, 1, -1, -1)
+        self.layout_main_window.addWidget(self.webengine_map, 1, 1, -1, 1)
         self.layout_main_window.addWidget(self.groupbox_serial_interface, 0, 0, 2, 1)
         self.layout_main_window.addWidget(self.groupbox_mqtt_interface, 2, 0)
+        self.layout_main_window.addWidget(self.groupbox_command_interface, 3, 0)
+
+        if self.groupbox_export_interface is not None:
+            self.layout_main_window.addWidget(self.groupbox_export_interface, 4, 0)
+
+        # Keep room for the charts so the window does not reflow when they appear
+        if self.config.getboolean("Charts", "Enabled"):
+            self.layout_main_window.setColumnMinimumWidth(2, 400)
 
         self.setLayout(self.layout_main_window)
 
+        # Setup connectivity monitor, probes run on their own thread
+        self.connectivity_monitor = ConnectivityMonitor(
+            parse_targets(self.config["Internet"]["Targets"]),
+            float(self.config["Internet"]["Interval"]),
+            float(self.config["Internet"]["Timeout"])
+        )
+        self.connectivity_monitor.status_changed.connect(self.on_internet_status_changed, QtCore.Qt.QueuedConnection)
+        self.connectivity_monitor.statistics_updated.connect(self.on_internet_statistics_updated, QtCore.Qt.QueuedConnection)
+        self.connectivity_monitor.start()
+
+        # Serial ports are enumerated on their own thread and fill the port list as they are found
+        self.serial_port_watcher = SerialPortWatcher(
+            float(self.config["Serial"]["Scan Interval"]),
+            float(self.config["Serial"]["Reconnect Interval"])
+        )
+        self.serial_port_watcher.ports_added.connect(self.on_serial_ports_added, QtCore.Qt.QueuedConnection)
+        self.serial_port_watcher.ports_removed.connect(self.on_serial_ports_removed, QtCore.Qt.QueuedConnection)
+        self.serial_port_watcher.start()
+
+        self.timer_serial_reconnect=QTimer(self)
+        self.timer_serial_reconnect.timeout.connect(self.on_timer_serial_reconnect)
+
         # Setup timers for events
-        self.timer_internet_status=QTimer(self)
-        self.timer_internet_status.timeout.connect(self.on_timer_internet_status)
-        self.timer_internet_status.start(5 * 1000)
+        self.timer_mqtt_ingest=QTimer(self)
+        self.timer_mqtt_ingest.timeout.connect(self.on_timer_mqtt_ingest)
+        self.timer_mqtt_ingest.start(int(self.config["MQTT"]["Ingest Interval"]))
+
+        self.timer_command_uplink=QTimer(self)
+        self.timer_command_uplink.timeout.connect(self.on_timer_command_uplink)
+        self.timer_command_uplink.start(int(self.config["Uplink"]["Interval"]))
+
+        self.timer_fusion_release=QTimer(self)
+        self.timer_fusion_release.timeout.connect(self.on_timer_fusion_release)
+        self.timer_fusion_release.start(100)
+
+        self.timer_fleet_expire=QTimer(self)
+        self.timer_fleet_expire.timeout.connect(self.on_timer_fleet_expire)
+        self.timer_fleet_expire.start(1000)
 
-        # Check timed events once at the start
-        # self.on_timer_internet_status()
+        # Landing predictions run on a process pool, at most one in flight per
+        # device. The predictor pulls in numpy, so it is only created once
+        # there is something to predict.
+        self.landing_predictor = None
+        self.prediction_ground_altitude = float(self.config["Prediction"]["Ground Altitude"])
+        self.predictions_pending = set()
+        self.prediction_ready.connect(self.on_prediction_ready, QtCore.Qt.QueuedConnection)
+
+        self.timer_prediction=QTimer(self)
+        self.timer_prediction.timeout.connect(self.on_timer_prediction)
+        self.timer_prediction.start(int(float(self.config["Prediction"]["Interval"]) * 1000))
+
+        # Replay a recording through the same ingest path as the live links
+        self.replay_reader = None
+
+        if replay_path is not None:
+            from replay_reader import ReplayReader
+
+            self.replay_reader = ReplayReader(replay_path, self.mqtt_ingest, replay_speed, instrumentation=self.instrumentation)
+            self.replay_reader.telemetry_received.connect(self.serial_telemetry_update, QtCore.Qt.QueuedConnection)
+            self.replay_reader.start()
 
         # Let's do this!
         self.show()
+        self.profiler.mark("window shown")
+
+        # Runs once the event loop has painted the window
+        QTimer.singleShot(0, self.on_first_frame)
 
     def create_toolbar_interface(self):
         self.toolbar_status = QToolBar()
@@ -107,33 +373,76 @@ class MainWindow(QWidget):
         self.toolbutton_cellular_status.setIcon(self.icons["sim-card-line"])
         self.toolbutton_cellular_status.setEnabled(False)
 
+        # Shows whether the session is being written, see update_session_status
+        self.toolbutton_session_status = QToolButton()
+        self.toolbutton_session_status.setIcon(self.icons["database" if self.session_store is not None else "database-line"])
+        self.toolbutton_session_status.setEnabled(self.session_store is not None)
+
+        # Pulses on every telemetry batch, opens the diagnostics panel when instrumented
         self.toolbutton_heartbeat_status = QToolButton()
         self.toolbutton_heartbeat_status.setIcon(self.icons["heart-line"])
-        self.toolbutton_heartbeat_status.setEnabled(False)
+        self.toolbutton_heartbeat_status.setEnabled(self.instrumentation is not None)
+        self.toolbutton_heartbeat_status.setToolTip("Diagnostics")
+        self.toolbutton_heartbeat_status.clicked.connect(self.toolbutton_heartbeat_status_clicked)
+
+        self.timer_heartbeat=QTimer(self)
+        self.timer_heartbeat.setSingleShot(True)
+        self.timer_heartbeat.timeout.connect(self.on_timer_heartbeat)
 
         self.toolbar_status.addWidget(self.toolbutton_internet_status)
         self.toolbar_status.addWidget(self.toolbutton_mqtt_status)
         self.toolbar_status.addWidget(self.toolbutton_radio_status)
         self.toolbar_status.addWidget(self.toolbutton_cellular_status)
+        self.toolbar_status.addWidget(self.toolbutton_session_status)
         self.toolbar_status.addWidget(self.toolbutton_heartbeat_status)
 
     def create_map_interface(self):
         self.webengine_map = QWebEngineView()
 
+        # Tiles are served from the local cache through a custom URL scheme
+        self.tile_cache = TileCache(
+            self.config["Tiles"]["Cache Path"],
+            self.config["Tiles"]["Upstream URL"],
+            int(self.config["Tiles"]["Cache Size"]) * 1024 * 1024
+        )
+        self.tile_scheme_handler = TileSchemeHandler(self.tile_cache)
+        self.webengine_map.page().profile().installUrlSchemeHandler(TILE_SCHEME, self.tile_scheme_handler)
+
+        # Leaflet asks for 512px tiles one zoom level below the map zoom
+        self.tile_prefetch_stop = threading.Event()
+        self.tile_prefetch_thread = threading.Thread(
+            target=self.tile_cache.prefetch,
+            args=(
+                float(self.config["Map"]["Home Latitude"]),
+                float(self.config["Map"]["Home Longitude"]),
+                float(self.config["Tiles"]["Prefetch Radius"]),
+                max(int(self.config["Map"]["Min Zoom Level"]) - 1, 0),
+                max(int(self.config["Map"]["Max Zoom Level"]) - 1, 0),
+                self.tile_prefetch_stop,
+            ),
+            daemon=True
+        )
+        self.tile_prefetch_thread.start()
+
         self.map_wrapper = MapWrapper(
             self.webengine_map,
             {
                 "home_latitude": self.config["Map"]["Home Latitude"],
                 "home_longitude": self.config["Map"]["Home Longitude"],
-                "home_zoom": self.config["Map"]["Zoom Level"],
+                "home_zoom": self.config["Map"]["Zoom Level"] if self.session_store is None else self.session_store.get_state("map_zoom", self.config["Map"]["Zoom Level"]),
                 "max_zoom": self.config["Map"]["Max Zoom Level"],
                 "min_zoom": self.config["Map"]["Min Zoom Level"],
-            }
+                "tile_url": TILE_URL,
+                "trail_capacity": self.config["Telemetry"]["History Capacity"],
+            },
+            float(self.config["Map"]["Max Update Rate"]),
+            self.instrumentation
         )
 
         self.map_view_webchannel = QWebChannel()
         self.map_view_webchannel.registerObject("python_link", self.map_wrapper)
         self.webengine_map.page().setWebChannel(self.map_view_webchannel)
+        self.webengine_map.loadFinished.connect(self.on_map_load_finished)
         self.webengine_map.load(QtCore.QUrl.fromLocalFile(QtCore.QDir.current().filePath("static/map.html")))
         self.webengine_map.setMinimumWidth(1024)
         self.webengine_map.setMinimumHeight(768)
@@ -150,16 +459,14 @@ class MainWindow(QWidget):
         self.label_serial_port.setMinimumWidth(100)
         self.label_serial_port.setMaximumWidth(100)
 
+        # Filled in by the port watcher, item data is the device name
         self.combo_serial_port = QComboBox(self)
-        devices = self.serial_list_ports()
-        for device in devices:
-            self.combo_serial_port.addItem(device)
 
         self.label_serial_baud_rate = QLabel(self)
         self.label_serial_baud_rate.setText("Baud Rate:")
 
         self.line_edit_serial_baud_rate = QLineEdit(self)
-        self.line_edit_serial_baud_rate.setText("115200")
+        self.line_edit_serial_baud_rate.setText(self.config["Serial"]["Baud Rate"])
 
         self.button_serial_connect = QPushButton(self)
         self.button_serial_connect.setText("Connect")
@@ -172,59 +479,241 @@ class MainWindow(QWidget):
         self.layout_serial_interface.addWidget(self.button_serial_connect, 2, 0, 1, 2)
 
     def lock_serial_interface(self):
-        self.combo_serial_port.setReadOnly(True)
+        self.combo_serial_port.setEnabled(False)
         self.line_edit_serial_baud_rate.setReadOnly(True)
 
         self.button_serial_connect.setText("Disconnect")
 
     def unlock_serial_interface(self):
-        self.combo_serial_port.setReadOnly(False)
+        self.combo_serial_port.setEnabled(True)
         self.line_edit_serial_baud_rate.setReadOnly(False)
 
         self.button_serial_connect.setText("Connect")
 
-    def serial_list_ports(self):
-        ports = list(serial.tools.list_ports.comports(False))
-        devices = []
-
+    def on_serial_ports_added(self, ports):
         for port in ports:
-            devices.append(str(port.description) + " (" + port.device + ")")
+            index = self.combo_serial_port.findData(port["device"])
+
+            if index < 0:
+                self.combo_serial_port.addItem(port["label"], port["device"])
+            else:
+                self.combo_serial_port.setItemText(index, port["label"])
+
+        # A radio we lost is back, no need to wait for the next reconnect tick
+        if self.state["serial"]["reconnecting"]:
+            self.on_timer_serial_reconnect()
 
-        return devices
+    def on_serial_ports_removed(self, devices):
+        for device in devices:
+            index = self.combo_serial_port.findData(device)
+
+            if index >= 0:
+                self.combo_serial_port.removeItem(index)
 
     def button_serial_connect_clicked(self):
+        if self.state["serial"]["reconnecting"]:
+            print("Stopped waiting for: " + self.state["serial"]["device"])
+
+            if self.state["serial"]["opening"]:
+                self.state["serial"]["opening"] = False
+                self.ingest_process.send("serial_close")
+
+            self.serial_reconnect_stop()
+            self.serial_state_clear()
+            return
+
         if not self.state["serial"]["connected"]:
-            selected_serial_port = self.combo_serial_port.currentText().split("(")[1].replace(")", "")
+            selected_serial_port = self.combo_serial_port.currentData()
+
+            if selected_serial_port is None:
+                return
 
             try:
-                self.state["serial"]["client"].port = selected_serial_port
-                self.state["serial"]["client"].baudrate = int(self.line_edit_serial_baud_rate.text())
-                self.state["serial"]["client"].open()
+                baud = int(self.line_edit_serial_baud_rate.text())
+            except ValueError:
+                print("Invalid baud rate: " + self.line_edit_serial_baud_rate.text())
+                return
 
-                self.state["serial"]["connected"] = True
-                self.state["serial"]["device"] = selected_serial_port
-                self.state["serial"]["baud"] = self.line_edit_serial_baud_rate.text()
+            self.state["serial"]["identity"] = self.serial_port_watcher.identity(selected_serial_port)
+            self.serial_open(selected_serial_port, baud)
+        else:
+            self.serial_close()
 
-                self.lock_serial_interface()
+    def serial_open(self, device, baud):
+        self.state["serial"]["device"] = device
+        self.state["serial"]["baud"] = baud
 
-                print("Connected to: " + self.combo_serial_port.currentText())
-            except serial.SerialException as e:
-                print("Failed to connect to Serial Port: " + self.combo_serial_port.currentText())
-                print(e)
+        # The ingest process opens the port and answers with an event
+        if self.ingest_process is not None:
+            self.state["serial"]["opening"] = True
+            self.ingest_process.send("serial_open", device, baud)
+            return
+
+        try:
+            self.state["serial"]["client"].port = device
+            self.state["serial"]["client"].baudrate = baud
+            self.state["serial"]["client"].open()
+            self.serial_reader.start()
+        except serial.SerialException as e:
+            self.serial_open_failed(str(e))
+            return
+
+        self.serial_opened(device)
+
+    def serial_opened(self, device):
+        self.state["serial"]["connected"] = True
+
+        if self.state["serial"]["reconnecting"]:
+            self.serial_reconnect_stop()
+            print("Reconnected to: " + device)
         else:
-            try:
-                self.serial_port.close()
+            print("Connected to: " + device)
 
-                self.state["serial"]["connected"] = False
-                self.state["serial"]["device"] = ""
-                self.state["serial"]["baud"] = 0
+        self.lock_serial_interface()
 
-                self.unlock_serial_interface()
+    def serial_open_failed(self, error):
+        # While reconnecting a port that is not ready yet is tried again on the next tick
+        if self.state["serial"]["reconnecting"]:
+            return
 
-                print("Disconnected from: " + self.state["serial"]["device"])
+        print("Failed to connect to Serial Port: " + self.state["serial"]["device"])
+        print(error)
+
+        self.serial_state_clear()
+
+    def serial_close(self):
+        if self.ingest_process is not None:
+            self.ingest_process.send("serial_close")
+        else:
+            try:
+                self.serial_reader.stop()
+                self.state["serial"]["client"].close()
             except serial.SerialException as e:
                 print("Failed to disconnect from: " + self.state["serial"]["device"])
                 print(e)
+                return
+
+        print("Disconnected from: " + self.state["serial"]["device"])
+
+        self.serial_state_clear()
+
+    def serial_state_clear(self):
+        self.state["serial"]["connected"] = False
+        self.state["serial"]["device"] = ""
+        self.state["serial"]["baud"] = 0
+        self.state["serial"]["identity"] = None
+
+        self.unlock_serial_interface()
+
+    def on_ingest_event(self, event):
+        if event[0] == "serial_opened":
+            # An open that was cancelled meanwhile is followed by its close
+            if self.state["serial"]["opening"]:
+                self.state["serial"]["opening"] = False
+                self.serial_opened(event[1])
+        elif event[0] == "serial_error":
+            if self.state["serial"]["opening"]:
+                self.state["serial"]["opening"] = False
+                self.serial_open_failed(event[1])
+            else:
+                self.serial_reader_error(event[1])
+        elif event[0] == "mqtt_connected":
+            self.mqtt_connection_update(event[1])
+        elif event[0] == "mqtt_disconnected":
+            self.mqtt_on_disconnect(None, None, event[1])
+        elif event[0] == "mqtt_error":
+            print("Failed to connect to MQTT broker at: " + self.line_edit_mqtt_hostname.text())
+            print(event[1])
+        elif event[0] == "acks":
+            self.on_ack_received(event[1])
+        elif event[0] == "error":
+            print(event[1])
+        elif event[0] == "exited":
+            print("Ingest process exited")
+
+            self.ingest_process.stop()
+            self.ingest_process = None
+            self.serial_reader_error("Ingest process exited")
+            self.mqtt_on_disconnect(None, None, 1)
+
+    def serial_reader_error(self, error):
+        print("Lost connection to: " + self.state["serial"]["device"])
+        print(error)
+
+        if self.serial_reader.isRunning():
+            self.serial_reader.stop()
+
+        try:
+            self.state["serial"]["client"].close()
+        except serial.SerialException:
+            pass
+
+        self.state["serial"]["connected"] = False
+        self.state["serial"]["opening"] = False
+
+        # An unplugged radio is reopened as soon as it shows up again
+        if self.config.getboolean("Serial", "Reconnect") and self.state["serial"]["identity"] is not None:
+            print("Waiting for: " + self.state["serial"]["device"] + " to come back")
+
+            self.state["serial"]["reconnecting"] = True
+            self.button_serial_connect.setText("Cancel")
+            self.serial_port_watcher.set_fast(True)
+            self.timer_serial_reconnect.start(int(float(self.config["Serial"]["Reconnect Interval"]) * 1000))
+            return
+
+        self.serial_state_clear()
+
+    def serial_reconnect_stop(self):
+        self.state["serial"]["reconnecting"] = False
+        self.timer_serial_reconnect.stop()
+        self.serial_port_watcher.set_fast(False)
+
+    def on_timer_serial_reconnect(self):
+        if self.state["serial"]["opening"]:
+            return
+
+        port = self.serial_port_watcher.find(self.state["serial"]["identity"])
+
+        if port is not None:
+            self.serial_open(port["device"], self.state["serial"]["baud"])
+
+    def serial_telemetry_update(self, records):
+        self.telemetry_update(self.telemetry_fusion.submit(LINK_SERIAL, records))
+
+    def telemetry_update(self, records):
+        if not records:
+            return
+
+        self.telemetry_pipeline.update(records)
+
+        if not self.timer_heartbeat.isActive():
+            self.toolbutton_heartbeat_status.setIcon(self.icons["heart-pulse"])
+            self.timer_heartbeat.start(250)
+
+    def on_event_raised(self, event):
+        label = EVENT_LABELS.get(event["type"], event["type"])
+        text = label + ": device " + event["id"] + " at " + str(round(event["altitude"])) + " m" + (" (" + event["detail"] + ")" if event["detail"] else "")
+
+        print(text)
+
+        # Burst and landing need the operator now, without stopping tracking
+        if event["type"] in self.event_notify:
+            QApplication.alert(self)
+
+            message_box = QMessageBox(QMessageBox.Information, label, text, QMessageBox.Ok, self)
+            message_box.setAttribute(Qt.WA_DeleteOnClose)
+            message_box.setModal(False)
+            message_box.show()
+
+    def on_timer_heartbeat(self):
+        self.toolbutton_heartbeat_status.setIcon(self.icons["heart"])
+
+    def toolbutton_heartbeat_status_clicked(self):
+        if self.diagnostics_panel.isVisible():
+            self.diagnostics_panel.hide()
+        else:
+            self.diagnostics_panel.show()
+            self.diagnostics_panel.raise_()
 
     def create_mqtt_interface(self):
         self.groupbox_mqtt_interface = QGroupBox("MQTT")
@@ -321,6 +810,20 @@ class MainWindow(QWidget):
         self.button_mqtt_connect.setText("Connect")
 
     def button_mqtt_connect_clicked(self):
+        if self.ingest_process is not None:
+            if not self.state["mqtt"]["connected"]:
+                self.ingest_process.send(
+                    "mqtt_connect",
+                    self.line_edit_mqtt_hostname.text(),
+                    int(self.line_edit_mqtt_port.text()),
+                    self.line_edit_mqtt_username.text(),
+                    self.line_edit_mqtt_password.text()
+                )
+            else:
+                self.ingest_process.send("mqtt_disconnect")
+
+            return
+
         if not self.state["mqtt"]["connected"]:
             self.state["mqtt"]["client"].username_pw_set(self.line_edit_mqtt_username.text(), self.line_edit_mqtt_password.text())
             self.state["mqtt"]["client"].connect(self.line_edit_mqtt_hostname.text(), int(self.line_edit_mqtt_port.text()), 30)
@@ -329,33 +832,211 @@ class MainWindow(QWidget):
             self.state["mqtt"]["client"].loop_stop()
             self.state["mqtt"]["client"].disconnect()
 
+    def on_first_frame(self):
+        self.profiler.mark("first frame")
+
+        # Rasterise the SVG icons now that the window is up
+        self.icons.prerender([self.toolbar_status.iconSize().width()])
+
+        if self.config.getboolean("Charts", "Enabled"):
+            with self.profiler.step("create_chart_interface"):
+                self.create_chart_interface()
+
+            self.layout_main_window.addWidget(self.chart_panel, 1, 2, -1, 1)
+
+    def on_map_load_finished(self, ok):
+        self.profiler.mark("map loaded")
+
+        if self.profiler.enabled:
+            print(self.profiler.report())
+
     def create_chart_interface(self):
-        fig = Figure(figsize=(100, 100), dpi=100)
-        self.axes = fig.add_subplot(111)
-        fig.axes.plot([0,1,2,3,4], [10,1,20,3,40])
+        # matplotlib is slow to import and only needed once charts are shown
+        from charts import ChartPanel
 
-        self.wid
-        self.layout_chart_interface = QGridLayout()
+        self.chart_panel = ChartPanel(self.fleet, float(self.config["Charts"]["Refresh Rate"]))
+        self.chart_panel.setMinimumWidth(400)
+        self.chart_panel.setMaximumWidth(400)
 
+    def on_internet_status_changed(self, connected):
+        self.state["internet"]["connected"] = connected
 
-    def on_timer_internet_status(self):
-        try:
-            socket.create_connection(("1.1.1.1", 53))
-            self.state["internet"]["connected"] = True
+        if connected:
             self.line_edit_internet_status.setText("Connected")
             self.toolbutton_internet_status.setIcon(self.icons["cloud"])
-            return True
-        except OSError:
-            pass
+        else:
+            self.line_edit_internet_status.setText("Disconnected")
+            self.toolbutton_internet_status.setIcon(self.icons["cloud-line"])
 
-        self.state["internet"]["connected"] = False
-        self.line_edit_internet_status.setText("Disconnected")
-        self.toolbutton_internet_status.setIcon(self.icons["cloud-line"])
-        return False
+    def on_internet_statistics_updated(self, statistics):
+        if statistics["rtt_average"] is None:
+            rtt = "n/a"
+        else:
+            rtt = str(round(statistics["rtt_average"] * 1000)) + " ms"
+
+        self.toolbutton_internet_status.setToolTip(
+            "RTT: " + rtt + ", Loss: " + str(round(statistics["loss"] * 100)) + "%"
+        )
+
+    def on_timer_fusion_release(self):
+        # Packets held back for reordering whose wait is over
+        self.telemetry_update(self.telemetry_fusion.release())
+
+    def on_timer_fleet_expire(self):
+        for id in self.telemetry_pipeline.expire():
+            self.telemetry_fusion.remove(id)
+
+        self.update_link_status()
+        self.update_session_status()
+        self.update_command_devices()
+
+    def update_session_status(self):
+        if self.session_store is None:
+            return
+
+        error = self.session_store.error
+        dropped = self.session_store.dropped
+
+        self.toolbutton_session_status.setIcon(self.icons["database" if error is None else "database-off"])
+        self.toolbutton_session_status.setToolTip(
+            "Session: " + ("recording" if error is None else "write failed, " + error) +
+            ", Written: " + str(self.session_store.written) +
+            ", Dropped: " + str(dropped)
+        )
+
+        if self.instrumentation is not None:
+            self.instrumentation.gauge("session_dropped", dropped)
+
+    def update_link_status(self):
+        # A link shows as up while it delivered something within the link timeout
+        statistics = self.telemetry_fusion.statistics()
+        timeout = float(self.config["Fusion"]["Link Timeout"])
+        now = time.time()
+
+        for name, toolbutton, icon in (
+            ("radio", self.toolbutton_radio_status, "wifi"),
+            ("cellular", self.toolbutton_cellular_status, "sim-card"),
+        ):
+            link = statistics.get(name)
+
+            if link is None:
+                continue
+
+            up = link["last_received"] is not None and now - link["last_received"] < timeout
+
+            toolbutton.setEnabled(up)
+            toolbutton.setIcon(self.icons[icon if up else icon + "-line"])
+            toolbutton.setToolTip(
+                "Received: " + str(link["received"]) +
+                ", First: " + str(link["first"]) +
+                ", Loss: " + str(round(link["loss"] * 100)) + "%" +
+                ", Delay: " + ("n/a" if link["delay"] is None else str(round(link["delay"] * 1000)) + " ms")
+            )
+
+            if self.instrumentation is not None:
+                self.instrumentation.gauge(name + "_lost", link["lost"])
+
+    def landing_predictor_get(self):
+        if self.landing_predictor is None:
+            from prediction import LandingPredictor
+
+            self.landing_predictor = LandingPredictor(
+                int(self.config["Prediction"]["Samples"]),
+                int(self.config["Prediction"]["Workers"]),
+                float(self.config["Prediction"]["Burst Altitude"]),
+                float(self.config["Prediction"]["Burst Altitude Sigma"]),
+                float(self.config["Prediction"]["Drag Sigma"]),
+                self.prediction_ground_altitude
+            )
+
+        return self.landing_predictor
+
+    def on_timer_prediction(self):
+        for device in self.fleet:
+            # Nothing to predict on the ground or before the first fix
+            if device.id in self.predictions_pending or len(device.history) < 2:
+                continue
+
+            if device.telemetry["altitude"] <= self.prediction_ground_altitude:
+                continue
+
+            if device.telemetry["velocity_vertical"] == 0.0 or not device.telemetry["fix"]:
+                continue
+
+            self.predictions_pending.add(device.id)
+            future = self.landing_predictor_get().predict(device)
+            future.add_done_callback(lambda future, id=device.id: self.prediction_ready.emit(id, future))
+
+    def on_prediction_ready(self, id, future):
+        self.predictions_pending.discard(id)
+
+        if future.cancelled():
+            return
+
+        if future.exception() is not None:
+            print("Landing prediction failed for: " + id)
+            print(future.exception())
+            return
+
+        if id in self.fleet:
+            self.map_wrapper.prediction_update(id, future.result())
+
+    def on_timer_mqtt_ingest(self):
+        if self.ingest_process is not None:
+            self.on_timer_process_ingest()
+            return
+
+        if self.instrumentation is not None:
+            self.instrumentation.gauge("mqtt_queue", self.mqtt_ingest.depth())
+            self.instrumentation.gauge("mqtt_dropped", self.mqtt_ingest.dropped)
+            self.instrumentation.gauge("serial_crc_errors", self.serial_reader.decoder.crc_errors)
+
+        self.telemetry_update(coalesce(self.telemetry_fusion.submit(LINK_MQTT, self.mqtt_ingest.drain())))
+
+        if self.instrumentation is not None:
+            self.instrumentation.gauge("fusion_held", self.telemetry_fusion.held())
+            self.instrumentation.gauge("fusion_duplicates", self.telemetry_fusion.duplicates)
+
+    def on_timer_process_ingest(self):
+        # Everything the ingest process decoded since the last tick, straight from shared memory
+        for event in self.ingest_process.events():
+            self.on_ingest_event(event)
+
+            if self.ingest_process is None:
+                return
+
+        serial_records = []
+        mqtt_records = []
+
+        for link, record in self.ingest_process.read():
+            if link == LINK_SERIAL:
+                serial_records.append(record)
+            else:
+                mqtt_records.append(record)
+
+        self.telemetry_update(
+            self.telemetry_fusion.submit(LINK_SERIAL, serial_records) +
+            coalesce(self.telemetry_fusion.submit(LINK_MQTT, mqtt_records))
+        )
+
+        if self.instrumentation is not None:
+            self.instrumentation.gauge("ingest_ring_lost", self.ingest_process.ring.lost)
+            self.instrumentation.gauge("fusion_held", self.telemetry_fusion.held())
+            self.instrumentation.gauge("fusion_duplicates", self.telemetry_fusion.duplicates)
 
     def mqtt_on_connect(self, client, userdata, flags, return_code):
+        if return_code == 0:
+            for subscription in self.mqtt_ingest.subscriptions:
+                client.subscribe(subscription)
+
+            client.subscribe(self.MQTT_ACK_TOPIC)
+
+        self.mqtt_connection_update(return_code)
+
+    def mqtt_connection_update(self, return_code):
         if return_code == 0:
             print("Connected to MQTT broker at: " + self.line_edit_mqtt_hostname.text())
+
             self.state["mqtt"]["connected"] = True
             self.state["mqtt"]["hostname"] = self.line_edit_mqtt_hostname.text()
             self.state["mqtt"]["port"] = self.line_edit_mqtt_port.text()
@@ -388,37 +1069,311 @@ class MainWindow(QWidget):
         print("test")
 
     def mqtt_on_message(self, client, userdata, message):
-        print("test")
+        if self.link_recorder is not None:
+            self.link_recorder.record_mqtt(message.topic, message.payload)
+
+        if topic_matches(self.MQTT_ACK_TOPIC, message.topic):
+            ack = decode_ack(message.payload)
+
+            if ack is not None:
+                self.ack_received.emit([ack])
+
+            return
+
+        self.mqtt_ingest.submit(message.topic, message.payload)
+
+    def create_command_interface(self):
+        self.groupbox_command_interface = QGroupBox("Commands")
+        self.groupbox_command_interface.setMinimumWidth(320)
+        self.groupbox_command_interface.setMaximumWidth(320)
+        self.layout_command_interface = QGridLayout()
+        self.groupbox_command_interface.setLayout(self.layout_command_interface)
+
+        self.label_command_device = QLabel(self)
+        self.label_command_device.setText("Device:")
+        self.label_command_device.setMinimumWidth(100)
+        self.label_command_device.setMaximumWidth(100)
+
+        self.combo_command_device = QComboBox(self)
+
+        self.label_command = QLabel(self)
+        self.label_command.setText("Command:")
+
+        self.combo_command = QComboBox(self)
+
+        for name in COMMANDS:
+            self.combo_command.addItem(name.replace("_", " ").title(), name)
+
+        self.label_command_argument = QLabel(self)
+        self.label_command_argument.setText("Argument:")
+
+        self.line_edit_command_argument = QLineEdit(self)
+        self.line_edit_command_argument.setText("0")
+
+        self.button_command_send = QPushButton(self)
+        self.button_command_send.setText("Send")
+        self.button_command_send.clicked.connect(self.button_command_send_clicked)
+
+        self.line_edit_command_status = QLineEdit(self)
+        self.line_edit_command_status.setReadOnly(True)
+
+        self.layout_command_interface.addWidget(self.label_command_device, 0, 0)
+        self.layout_command_interface.addWidget(self.combo_command_device, 0, 1)
+        self.layout_command_interface.addWidget(self.label_command, 1, 0)
+        self.layout_command_interface.addWidget(self.combo_command, 1, 1)
+        self.layout_command_interface.addWidget(self.label_command_argument, 2, 0)
+        self.layout_command_interface.addWidget(self.line_edit_command_argument, 2, 1)
+        self.layout_command_interface.addWidget(self.button_command_send, 3, 0, 1, 2)
+        self.layout_command_interface.addWidget(self.line_edit_command_status, 4, 0, 1, 2)
+
+    def update_command_devices(self):
+        known = set(self.combo_command_device.itemText(index) for index in range(self.combo_command_device.count()))
+
+        for device in self.fleet:
+            # Commands can only reach devices with a numeric id, see commands.addressable
+            if device.id not in known and addressable(device.id):
+                self.combo_command_device.addItem(device.id)
+
+        if self.groupbox_export_interface is None:
+            return
+
+        known = set(self.combo_export_device.itemText(index) for index in range(self.combo_export_device.count()))
+
+        for device in self.fleet:
+            if device.id not in known:
+                self.combo_export_device.addItem(device.id, [device.id])
+
+    def button_command_send_clicked(self):
+        device = self.combo_command_device.currentText()
+        name = self.combo_command.currentData()
+        label = self.combo_command.currentText()
+
+        if not device:
+            return
+
+        try:
+            argument = float(self.line_edit_command_argument.text())
+        except ValueError:
+            self.line_edit_command_status.setText("Invalid argument")
+            return
+
+        if name == "cutdown":
+            confirm = QMessageBox.question(self, "Cutdown", "Cut down device " + device + "?", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+
+            if confirm != QMessageBox.Yes:
+                return
+
+        future = self.command_uplink.send(device, name, argument)
+        self.line_edit_command_status.setText(label + " to " + device + ": sending")
+
+        # Futures complete on the GUI thread, from an ack or the uplink timer
+        future.add_done_callback(lambda future: self.command_done(label + " to " + device, future))
+
+    def create_export_interface(self):
+        self.groupbox_export_interface = QGroupBox("Export")
+        self.groupbox_export_interface.setMinimumWidth(320)
+        self.groupbox_export_interface.setMaximumWidth(320)
+        self.layout_export_interface = QGridLayout()
+        self.groupbox_export_interface.setLayout(self.layout_export_interface)
+
+        self.label_export_device = QLabel(self)
+        self.label_export_device.setText("Device:")
+        self.label_export_device.setMinimumWidth(100)
+        self.label_export_device.setMaximumWidth(100)
+
+        # Item data is the list of ids to export, None for every stored device
+        self.combo_export_device = QComboBox(self)
+        self.combo_export_device.addItem("All", None)
+
+        self.button_export = QPushButton(self)
+        self.button_export.setText("Export")
+        self.button_export.clicked.connect(self.button_export_clicked)
+
+        self.progress_bar_export = QProgressBar(self)
+        self.progress_bar_export.setRange(0, 1)
+        self.progress_bar_export.setValue(0)
+        self.progress_bar_export.setFormat("")
+
+        self.export_worker = None
+
+        self.layout_export_interface.addWidget(self.label_export_device, 0, 0)
+        self.layout_export_interface.addWidget(self.combo_export_device, 0, 1)
+        self.layout_export_interface.addWidget(self.button_export, 1, 0, 1, 2)
+        self.layout_export_interface.addWidget(self.progress_bar_export, 2, 0, 1, 2)
+
+    def button_export_clicked(self):
+        if self.export_worker is not None:
+            self.export_worker.cancel()
+            return
+
+        filters = {name: name.upper() + " (*" + extension + ")" for name, (extension, writer, passes) in EXPORT_FORMATS.items()}
+
+        path, selected_filter = QFileDialog.getSaveFileName(
+            self,
+            "Export Telemetry",
+            os.path.join(self.config["Session"]["Export Directory"], time.strftime("telemetry_%Y%m%d_%H%M%S.kml")),
+            ";;".join(filters.values())
+        )
+
+        if not path:
+            return
+
+        format = format_for_path(path)
+
+        if format is None:
+            format = next((name for name, label in filters.items() if label == selected_filter), "csv")
+            path += EXPORT_FORMATS[format][0]
+
+        ids = self.combo_export_device.currentData()
+
+        if ids is None:
+            ids = list(self.session_store.sample_counts())
+
+        self.export_worker = ExportWorker(self.session_store, ids, path, format)
+        self.export_worker.progress.connect(self.on_export_progress)
+        self.export_worker.completed.connect(self.on_export_completed)
+        self.export_worker.failed.connect(self.on_export_failed)
+        self.export_worker.start()
+
+        self.button_export.setText("Cancel")
+        self.progress_bar_export.setFormat("%p%")
+
+    def on_export_progress(self, done, total):
+        self.progress_bar_export.setRange(0, max(total, 1))
+        self.progress_bar_export.setValue(done)
+
+    def on_export_completed(self, path, count):
+        print("Exported " + str(count) + " samples to: " + path)
+        self.export_finished("Exported " + str(count))
+
+    def on_export_failed(self, error):
+        print("Export failed: " + error)
+        self.export_finished(error)
+
+    def export_finished(self, status):
+        self.export_worker.wait()
+        self.export_worker = None
+
+        self.button_export.setText("Export")
+        self.progress_bar_export.setFormat(status)
+
+    def command_done(self, description, future):
+        error = future.exception()
+
+        if error is not None:
+            print("Failed to send " + description)
+            print(error)
+
+            self.line_edit_command_status.setText(description + ": failed")
+            return
+
+        self.line_edit_command_status.setText(description + ": " + future.result())
+
+    def serial_command_send(self, device, payload):
+        if self.ingest_process is not None:
+            return self.state["serial"]["connected"] and self.ingest_process.send("serial_write", encode_frame(payload))
+
+        return self.serial_reader.write(encode_frame(payload))
+
+    def mqtt_command_send(self, device, payload):
+        if not self.state["mqtt"]["connected"]:
+            return False
+
+        if self.ingest_process is not None:
+            return self.ingest_process.send("mqtt_publish", "icarus/" + device + "/command", payload, 1)
+
+        info = self.state["mqtt"]["client"].publish("icarus/" + device + "/command", payload, qos=1)
+        return info.rc == mqtt.MQTT_ERR_SUCCESS
+
+    def on_ack_received(self, acks):
+        for ack in acks:
+            self.command_uplink.acknowledge(ack["id"], ack["command"], ack["status"])
+
+    def on_timer_command_uplink(self):
+        self.command_uplink.tick()
+
+        if self.instrumentation is not None:
+            self.instrumentation.gauge("uplink_radio_queue", self.command_uplink.queue(LINK_SERIAL).depth())
+            self.instrumentation.gauge("uplink_cellular_queue", self.command_uplink.queue(LINK_MQTT).depth())
+            self.instrumentation.gauge("uplink_pending", self.command_uplink.pending())
 
     def mqtt_on_log(self, client, userdata, level, string):
         print(level + ", " + string)
 
+    def closeEvent(self, event):
+        self.connectivity_monitor.stop()
+        self.serial_port_watcher.stop()
+        self.tile_prefetch_stop.set()
+        self.tile_scheme_handler.shutdown()
+        self.tile_cache.flush()
+
+        if self.landing_predictor is not None:
+            self.landing_predictor.shutdown()
+
+        if self.replay_reader is not None:
+            self.replay_reader.stop()
+
+        if self.serial_reader.isRunning():
+            self.serial_reader.stop()
+
+        if self.ingest_process is not None:
+            self.ingest_process.stop()
+
+        if self.link_recorder is not None:
+            self.link_recorder.close()
+
+        if self.session_store is not None:
+            if self.export_worker is not None:
+                self.export_worker.cancel()
+
+            self.session_store.set_state("map_zoom", self.map_wrapper.zoom)
+            self.session_store.close()
+
+        if self.diagnostics_panel is not None:
+            self.diagnostics_panel.close()
+
+        super().closeEvent(event)
+
     def create_icons(self):
-        self.icons = {}
-
-        icon_path = "assets/remix/icons"
-
-        self.icons["cloud"] = QIcon(icon_path + "/Business/cloud-fill.svg")
-        self.icons["cloud-line"] = QIcon(icon_path + "/Business/cloud-line.svg")
-        self.icons["cloud-off"] = QIcon(icon_path + "/Business/cloud-off-fill.svg")
-        self.icons["wifi"] = QIcon(icon_path + "/Device/signal-wifi-fill.svg")
-        self.icons["wifi-line"] = QIcon(icon_path + "/Device/signal-wifi-line.svg")
-        self.icons["server"] = QIcon(icon_path + "/Device/server-fill.svg")
-        self.icons["server-line"] = QIcon(icon_path + "/Device/server-line.svg")
-        self.icons["wifi-off"] = QIcon(icon_path + "/Device/signal-wifi-off-fill.svg")
-        self.icons["radio"] = QIcon(icon_path + "/Device/wifi-fill.svg")
-        self.icons["radio-off"] = QIcon(icon_path + "/Device/wifi-off-fill.svg")
-        self.icons["sim-card"] = QIcon(icon_path + "/Device/sim-card-2-fill.svg")
-        self.icons["sim-card-line"] = QIcon(icon_path + "/Device/sim-card-2-line.svg")
-        self.icons["takeoff"] = QIcon(icon_path + "/Map/flight-takeoff-fill.svg")
-        self.icons["land"] = QIcon(icon_path + "/Map/flight-land-fill.svg")
-        self.icons["heart"] = QIcon(icon_path + "/Health/heart-3-fill.svg")
-        self.icons["heart-line"] = QIcon(icon_path + "/Health/heart-3-line.svg")
-        self.icons["heart-off"] = QIcon(icon_path + "/Health/dislike-fill.svg")
-        self.icons["heart-pulse"] = QIcon(icon_path + "/Health/heart-pulse-fill.svg")
+        # Icons load on first use, see on_first_frame for prerendering
+        self.icons = IconCache("assets/remix/icons")
+
+        self.icons.register("cloud", "Business/cloud-fill.svg")
+        self.icons.register("cloud-line", "Business/cloud-line.svg")
+        self.icons.register("cloud-off", "Business/cloud-off-fill.svg")
+        self.icons.register("wifi", "Device/signal-wifi-fill.svg")
+        self.icons.register("wifi-line", "Device/signal-wifi-line.svg")
+        self.icons.register("server", "Device/server-fill.svg")
+        self.icons.register("server-line", "Device/server-line.svg")
+        self.icons.register("wifi-off", "Device/signal-wifi-off-fill.svg")
+        self.icons.register("radio", "Device/wifi-fill.svg")
+        self.icons.register("radio-off", "Device/wifi-off-fill.svg")
+        self.icons.register("sim-card", "Device/sim-card-2-fill.svg")
+        self.icons.register("sim-card-line", "Device/sim-card-2-line.svg")
+        self.icons.register("takeoff", "Map/flight-takeoff-fill.svg")
+        self.icons.register("land", "Map/flight-land-fill.svg")
+        self.icons.register("heart", "Health/heart-3-fill.svg")
+        self.icons.register("heart-line", "Health/heart-3-line.svg")
+        self.icons.register("heart-off", "Health/dislike-fill.svg")
+        self.icons.register("heart-pulse", "Health/heart-pulse-fill.svg")
+        self.icons.register("database", "Device/database-2-fill.svg")
+        self.icons.register("database-line", "Device/database-2-line.svg")
+        self.icons.register("database-off", "System/error-warning-fill.svg")
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Icarus ground control station")
+    parser.add_argument("--replay", metavar="PATH", help="replay a link recording instead of recording the live links")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="replay speed multiplier, 0 replays as fast as possible")
+    parser.add_argument("--profile-startup", action="store_true", help="print how long each startup step took")
+    parser.add_argument("--new-session", action="store_true", help="start with an empty session instead of restoring the last one")
+    arguments, qt_arguments = parser.parse_known_args()
+
+    profiler = StartupProfiler(startup_started, arguments.profile_startup)
+    profiler.mark("imports")
+
+    register_tile_scheme()
+
+    app = QApplication(sys.argv[:1] + qt_arguments)
 
     app.setApplicationName("Icarus GCS")
 
@@ -431,6 +1386,6 @@ if __name__ == '__main__':
     app.setPalette(palette)
     '''
 
-    widget = MainWindow()
+    widget = MainWindow(arguments.replay, arguments.replay_speed, profiler, arguments.new_session)
 
     sys.exit(app.exec_())
\ No newline at end of file
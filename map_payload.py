@@ -0,0 +1,133 @@
+from trail import Trail
+
+class MapPayload():
+    # Collects device and trail changes between map frames and turns them into
+    # the smallest set of page calls. No Qt in here, MapWrapper sends the calls
+    # to the page and the headless mode just serialises them.
+    def __init__(self, zoom, trail_capacity=36000):
+        self._zoom = zoom
+        self._trail_capacity = trail_capacity
+
+        # Device and trail state waiting for the next frame, and what the page already has
+        self._devices_pending = {}
+        self._devices_sent = {}
+        self._devices_removed = set()
+        self._trails = {}
+        self._trails_dirty = set()
+        self._trails_sent = {}
+        self._trails_replace = False
+        self._predictions_pending = {}
+        self._events_pending = []
+
+    @property
+    def zoom(self):
+        return self._zoom
+
+    def pending(self):
+        return bool(self._devices_pending or self._devices_removed or self._trails_dirty or self._trails_replace or self._predictions_pending or self._events_pending)
+
+    def zoom_changed(self, zoom):
+        # Trails are simplified per zoom level, so the page needs them all again
+        if zoom != self._zoom:
+            self._zoom = zoom
+            self._trails_replace = True
+
+    def device_update(self, devices):
+        for device in devices:
+            pending = self._devices_pending.get(device["id"])
+
+            if pending is None:
+                self._devices_pending[device["id"]] = dict(device)
+            else:
+                pending.update(device)
+
+    def device_remove(self, ids):
+        for id in ids:
+            self._devices_pending.pop(id, None)
+            self._devices_sent.pop(id, None)
+            self._trails.pop(id, None)
+            self._trails_sent.pop(id, None)
+            self._trails_dirty.discard(id)
+            self._predictions_pending.pop(id, None)
+            self._devices_removed.add(id)
+
+    def trail_append(self, id, points):
+        trail = self._trails.get(id)
+
+        if trail is None:
+            trail = self._trails[id] = Trail(id, self._trail_capacity)
+
+        trail.append(points)
+        self._trails_dirty.add(id)
+
+    def prediction_update(self, id, prediction):
+        # Only the newest prediction per device is worth sending
+        self._predictions_pending[id] = prediction
+
+    def event_marker_add(self, event):
+        # Events are never merged or dropped, each one is a marker
+        self._events_pending.append(event)
+
+    def flush(self):
+        # Returns a list of (page function, payload) calls, empty if nothing changed
+        calls = []
+
+        if self._devices_removed:
+            calls.append(("icarusDeviceRemove", list(self._devices_removed)))
+            self._devices_removed.clear()
+
+        devices = {}
+
+        for id, state in self._devices_pending.items():
+            sent = self._devices_sent.setdefault(id, {})
+            changed = {key: value for key, value in state.items() if sent.get(key) != value}
+
+            if changed:
+                sent.update(changed)
+                devices[id] = changed
+
+        self._devices_pending.clear()
+
+        if devices:
+            calls.append(("icarusDeviceUpdate", devices))
+
+        # After a zoom change every trail is replaced, otherwise only the
+        # points simplified since the last flush are appended
+        if self._trails_replace:
+            trails = {}
+
+            for id, trail in self._trails.items():
+                trails[id] = trail.simplified(self._zoom)
+                self._trails_sent[id] = len(trails[id])
+
+            self._trails_replace = False
+
+            if trails:
+                calls.append(("icarusTrailReplace", trails))
+        else:
+            trails = {}
+
+            for id in self._trails_dirty:
+                trail = self._trails[id]
+                count = trail.simplify(self._zoom)
+                sent = self._trails_sent.get(id, 0)
+
+                if count > sent:
+                    self._trails_sent[id] = count
+                    trails[id] = trail.simplified(self._zoom, sent)
+
+            if trails:
+                calls.append(("icarusTrailAppend", trails))
+
+        self._trails_dirty.clear()
+
+        if self._predictions_pending:
+            calls.append(("icarusPredictionUpdate", self._predictions_pending))
+            self._predictions_pending = {}
+
+        for event in self._events_pending:
+            calls.append(("icarusEventMarkerAdd", event))
+
+        self._events_pending = []
+
+        return calls
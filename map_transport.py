@@ -0,0 +1,76 @@
+import json
+import base64
+from array import array
+
+# Map calls go to the page as QWebChannel signals instead of JavaScript
+# source, so the page never has to parse and compile a script per frame.
+# Trails and device positions travel as packed arrays, base64 encoded because
+# QWebChannel hands a QByteArray to the page as a string. Arrays are in
+# native byte order, the page runs on the same machine.
+#
+# Trail coordinates go as float32 offsets from a float64 origin, the first
+# point of the call. Absolute float32 degrees are only good to about a metre,
+# offsets within a few degrees of the origin keep millimetre precision.
+TRANSPORT_TRAILS = "trails"
+TRANSPORT_DEVICES = "devices"
+TRANSPORT_CALL = "call"
+
+# Device fields that fit the packed position layout
+DEVICE_FIELDS = ("latitude", "longitude")
+
+NAN = float("nan")
+
+def pack(typecode, values):
+    return base64.b64encode(array(typecode, values).tobytes())
+
+def pack_trails(trails):
+    # {id: [[latitude, longitude], ...]} -> ids, point counts (uint32),
+    # coordinates (float64 origin pair followed by float32 offset pairs)
+    ids = list(trails)
+    points = [point for id in ids for point in trails[id]]
+    origin = points[0] if points else (0.0, 0.0)
+    offsets = array("f")
+
+    for latitude, longitude in points:
+        offsets.append(latitude - origin[0])
+        offsets.append(longitude - origin[1])
+
+    return (
+        ids,
+        pack("I", [len(trails[id]) for id in ids]),
+        base64.b64encode(array("d", origin).tobytes() + offsets.tobytes())
+    )
+
+def pack_devices(devices):
+    # {id: {changed fields}} -> ids, coordinates (float64 pairs, NaN for unchanged)
+    ids = list(devices)
+    coordinates = []
+
+    for id in ids:
+        device = devices[id]
+        coordinates.append(device.get("latitude", NAN))
+        coordinates.append(device.get("longitude", NAN))
+
+    return ids, pack("d", coordinates)
+
+def encode_call(function, payload):
+    # (transport, arguments) for one (page function, payload) call
+    if function in ("icarusTrailAppend", "icarusTrailReplace"):
+        return TRANSPORT_TRAILS, (function == "icarusTrailReplace",) + pack_trails(payload)
+
+    if function == "icarusDeviceUpdate" and all(field in DEVICE_FIELDS for device in payload.values() for field in device):
+        return TRANSPORT_DEVICES, pack_devices(payload)
+
+    return TRANSPORT_CALL, (function, json.dumps(payload))
+
+def call_size(arguments):
+    # Bytes handed to the channel for one call, for diagnostics and benchmarks
+    size = 0
+
+    for argument in arguments:
+        if isinstance(argument, (str, bytes)):
+            size += len(argument)
+        elif isinstance(argument, list):
+            size += sum(len(value) for value in argument)
+
+    return size
@@ -1,25 +1,140 @@
 from PyQt5 import Qt, QtCore
 import json
+import time
+
+from map_payload import MapPayload
+from map_transport import encode_call, call_size, TRANSPORT_TRAILS, TRANSPORT_DEVICES
+
+FRAMES_PENDING_LIMIT = 64
 
 class MapWrapper(Qt.QObject):
+    # Map calls reach the page through these signals, see map_transport.py.
+    # The page connects its handlers once when it starts. Everything goes
+    # through the channel so the page applies calls in the order they were sent.
+    trails_received = QtCore.pyqtSignal(bool, list, QtCore.QByteArray, QtCore.QByteArray)
+    devices_received = QtCore.pyqtSignal(list, QtCore.QByteArray)
+    call_received = QtCore.pyqtSignal(str, str)
+    # Sent after the last call of a frame when instrumented, the page answers with frame_applied
+    frame_sent = QtCore.pyqtSignal(int)
+
     @QtCore.pyqtSlot(result=str)
     def get_config(self):
         return json.dumps(self._config)
 
-    def __init__(self, webengine, config):
+    @QtCore.pyqtSlot()
+    def map_ready(self):
+        # The page calls this once the map exists, anything sent before is lost
+        self._ready = True
+        self._schedule_flush()
+
+    @QtCore.pyqtSlot(int)
+    def zoom_changed(self, zoom):
+        self._payload.zoom_changed(zoom)
+        self._schedule_flush()
+
+    @QtCore.pyqtSlot(int)
+    def frame_applied(self, frame):
+        received = self._frames_pending.pop(frame, None)
+
+        if received is not None:
+            self._instrumentation.record_since("apply", received)
+
+    @property
+    def zoom(self):
+        return self._payload.zoom
+
+    def __init__(self, webengine, config, max_update_rate=10, instrumentation=None):
         super(MapWrapper, self).__init__()
 
         self._webengine = webengine
+        self._instrumentation = instrumentation
         self._config = config
+        self._ready = False
+        self._payload = MapPayload(int(config["home_zoom"]), int(config["trail_capacity"]))
+
+        # Flushes are capped at max_update_rate per second
+        self._flush_interval = 1.0 / max_update_rate
+        self._flush_last = 0.0
+        self._flush_timer = QtCore.QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.timeout.connect(self.flush)
+
+        # Frame number -> receive stamp of the oldest record in it, until the page applied it
+        self._frames = 0
+        self._frames_pending = {}
 
     def map_center_update(self, center):
-        self._webengine.page().runJavaScript("mapCenterUpdate(" + json.dumps(center) + ")")
+        self._send("mapCenterUpdate", center)
 
     def device_update(self, devices):
-        self._webengine.page().runJavaScript("icarusDeviceUpdate(" + json.dumps(devices) + ")")
+        self._payload.device_update(devices)
+        self._schedule_flush()
+
+    def device_remove(self, ids):
+        self._payload.device_remove(ids)
+        self._schedule_flush()
 
-    def trail_update(self, trails):
-        self._webengine.page().runJavaScript("icarusTrailUpdate(" + json.dumps(trails) + ")")
+    def trail_append(self, id, points):
+        self._payload.trail_append(id, points)
+        self._schedule_flush()
+
+    def prediction_update(self, id, prediction):
+        self._payload.prediction_update(id, prediction)
+        self._schedule_flush()
 
     def event_marker_add(self, event):
-        self._webengine.page().runJavaScript("icarusEventMarkerAdd(" + json.dumps(event) + ")")
+        self._payload.event_marker_add(event)
+        self._schedule_flush()
+
+    def _send(self, function, payload):
+        transport, arguments = encode_call(function, payload)
+
+        if transport == TRANSPORT_TRAILS:
+            self.trails_received.emit(arguments[0], arguments[1], QtCore.QByteArray(arguments[2]), QtCore.QByteArray(arguments[3]))
+        elif transport == TRANSPORT_DEVICES:
+            self.devices_received.emit(arguments[0], QtCore.QByteArray(arguments[1]))
+        else:
+            self.call_received.emit(*arguments)
+
+        return call_size(arguments)
+
+    def _schedule_flush(self):
+        if not self._ready or self._flush_timer.isActive():
+            return
+
+        delay = self._flush_last + self._flush_interval - time.monotonic()
+        self._flush_timer.start(max(0, int(delay * 1000)))
+
+    def flush(self):
+        self._flush_last = time.monotonic()
+
+        if self._instrumentation is None:
+            for function, payload in self._payload.flush():
+                self._send(function, payload)
+
+            return
+
+        self._flush_instrumented()
+
+    def _flush_instrumented(self):
+        instrumentation = self._instrumentation
+        received = instrumentation.take_pending()
+        calls = self._payload.flush()
+        size = 0
+
+        for function, payload in calls:
+            size += self._send(function, payload)
+
+        if received is not None and calls:
+            instrumentation.record_since("dispatch", received)
+
+            # The page handles signals in order, so its answer to this one means the frame is applied
+            self._frames += 1
+            self._frames_pending[self._frames] = received
+
+            # A page that went away never answers
+            if len(self._frames_pending) > FRAMES_PENDING_LIMIT:
+                del self._frames_pending[next(iter(self._frames_pending))]
+            self.frame_sent.emit(self._frames)
+
+        instrumentation.gauge("map_frame_bytes", size)
@@ -0,0 +1,204 @@
+import json
+import math
+import time
+import threading
+import collections
+
+from protocol import decode_payload, TELEMETRY_FIELDS
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+def topic_matches(subscription, topic):
+    # MQTT wildcard matching, "+" matches one level and "#" the rest
+    subscription_levels = subscription.split("/")
+    topic_levels = topic.split("/")
+
+    for index, level in enumerate(subscription_levels):
+        if level == "#":
+            return True
+
+        if index >= len(topic_levels):
+            return False
+
+        if level != "+" and level != topic_levels[index]:
+            return False
+
+    return len(subscription_levels) == len(topic_levels)
+
+def topic_device_id(topic):
+    # Topics are laid out as icarus/<device id>/<message>
+    levels = topic.split("/")
+    return levels[1] if len(levels) > 2 else None
+
+def json_number(value):
+    # JSON values that are numbers or numeric strings, anything else is a
+    # ValueError so the record is counted as undecoded
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError("Not a number: " + repr(value))
+
+    value = float(value)
+
+    if not math.isfinite(value):
+        raise ValueError("Not a finite number: " + repr(value))
+
+    return value
+
+def decode_json_telemetry(topic, payload):
+    data = json.loads(payload)
+
+    if not isinstance(data, dict):
+        return None
+
+    if "id" not in data:
+        data["id"] = topic_device_id(topic)
+
+    if data["id"] is None:
+        return None
+
+    data["id"] = str(data["id"])
+
+    # Everything the model reads must be a number, a null or a string here
+    # would only blow up later on the GUI thread
+    for field in TELEMETRY_FIELDS:
+        if field in data:
+            data[field] = json_number(data[field])
+
+    if "fix" in data:
+        data["fix"] = int(data["fix"])
+
+    if "sequence" in data:
+        sequence = json_number(data["sequence"])
+
+        if sequence != int(sequence) or sequence < 0:
+            raise ValueError("Invalid sequence: " + repr(data["sequence"]))
+
+        data["sequence"] = int(sequence) & 0xFFFF
+
+    # A receive time stands in for a missing timestamp, marked as such so
+    # fusion does not take it for the device's own clock
+    if "timestamp" in data:
+        data["timestamp"] = json_number(data["timestamp"])
+    else:
+        data["timestamp"] = time.time()
+        data["timestamp_estimated"] = True
+
+    return data
+
+def decode_frame_telemetry(topic, payload):
+    # Radio frame payloads forwarded as-is over the cellular modem
+    return decode_payload(payload)
+
+def coalesce(records):
+    # The newest record of each device, by timestamp, later ones win ties
+    latest = {}
+
+    for record in records:
+        existing = latest.get(record["id"])
+
+        if existing is None or record["timestamp"] >= existing["timestamp"]:
+            latest[record["id"]] = record
+
+    return list(latest.values())
+
+class MqttIngest():
+    # Receives messages on the paho network thread, decodes them there and
+    # holds the records in a bounded queue. The GUI drains the queue on a timer
+    # and, with coalesce, only sees the newest record of each device per
+    # drain. Without it every record comes out, as TelemetryFusion needs to
+    # see every sequence number to tell loss from coalescing, and the caller
+    # coalesces what fusion releases instead.
+    def __init__(self, max_queue=10000, policy=DROP_OLDEST, max_batch=2000, instrumentation=None, coalesce=True):
+        if policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError("Unknown drop policy: " + str(policy))
+
+        self._routes = []
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._max_queue = max_queue
+        self._policy = policy
+        self._max_batch = max_batch
+        self._instrumentation = instrumentation
+        self._coalesce = coalesce
+
+        self.received = 0
+        self.dropped = 0
+        self.undecoded = 0
+
+    @property
+    def routes(self):
+        return list(self._routes)
+
+    @property
+    def subscriptions(self):
+        return [subscription for subscription, decoder in self._routes]
+
+    def add_route(self, subscription, decoder):
+        self._routes.append((subscription, decoder))
+
+    def depth(self):
+        return len(self._queue)
+
+    def wait_for_room(self, stop=None, interval=0.01):
+        # For producers that can wait, like a replay: blocks while a full
+        # drain is already queued, so nothing is dropped on their account.
+        # Returns False if stop was set meanwhile.
+        limit = min(self._max_batch, self._max_queue // 2)
+
+        while len(self._queue) >= limit:
+            if stop is None:
+                time.sleep(interval)
+            elif stop.wait(interval):
+                return False
+
+        return True
+
+    def submit(self, topic, payload):
+        received = time.perf_counter()
+
+        for subscription, decoder in self._routes:
+            if topic_matches(subscription, topic):
+                break
+        else:
+            self.undecoded += 1
+            return False
+
+        try:
+            record = decoder(topic, payload)
+        except ValueError:
+            record = None
+
+        if record is None:
+            self.undecoded += 1
+            return False
+
+        record["received"] = received
+
+        if self._instrumentation is not None:
+            self._instrumentation.record_since("decode", received)
+
+        with self._lock:
+            self.received += 1
+
+            if len(self._queue) >= self._max_queue:
+                self.dropped += 1
+
+                if self._policy == DROP_NEWEST:
+                    return False
+
+                self._queue.popleft()
+
+            self._queue.append(record)
+
+        return True
+
+    def drain(self):
+        # Take at most max_batch records so a broker backlog is spread over
+        # several ticks instead of stalling one
+        queue = self._queue
+
+        with self._lock:
+            count = min(len(queue), self._max_batch)
+            records = [queue.popleft() for i in range(count)]
+
+        return coalesce(records) if self._coalesce else records
@@ -0,0 +1,123 @@
+import time
+
+class TelemetryPipeline():
+    # Applies decoded telemetry records to the fleet and queues the resulting
+    # map changes. The map is anything with device_update, device_remove and
+    # trail_append, a MapWrapper in the GUI or a bare MapPayload headless.
+    # With an EventEngine every sample is also checked for flight events,
+    # which go to the map as markers, into the store and to event_raised.
+    def __init__(self, fleet, map, instrumentation=None, store=None, events=None, event_raised=None):
+        self._fleet = fleet
+        self._map = map
+        self._instrumentation = instrumentation
+        self._store = store
+        self._events = events
+        self._event_raised = event_raised
+
+    @property
+    def fleet(self):
+        return self._fleet
+
+    def update(self, records):
+        instrumentation = self._instrumentation
+
+        if instrumentation is not None:
+            started = time.perf_counter()
+
+        updated = {}
+        store = self._store
+        events = self._events
+        received = time.time()
+
+        for record in records:
+            device = self._fleet.update(record, received)
+            updated[device.id] = device
+
+            if store is not None:
+                store.record(device, record.get("sequence"), received)
+
+            if events is not None:
+                for event in events.update(device, device.history.latest_timestamp(), "fix" in record):
+                    self._raise(event)
+
+            if device.telemetry["latitude"] or device.telemetry["longitude"]:
+                self._map.trail_append(device.id, [[device.telemetry["latitude"], device.telemetry["longitude"]]])
+
+        # Only devices that changed, the map side batches and diffs them per frame
+        self._map.device_update([
+            {
+                "id": device.id,
+                "latitude": device.telemetry["latitude"],
+                "longitude": device.telemetry["longitude"],
+            }
+            for device in updated.values()
+        ])
+
+        if instrumentation is not None:
+            finished = time.perf_counter()
+
+            for record in records:
+                if "received" in record:
+                    instrumentation.record_since("queue", record["received"], started)
+                    instrumentation.record_since("model", record["received"], finished)
+                    instrumentation.pending(record["received"])
+
+        return updated
+
+    def _raise(self, event):
+        self._map.event_marker_add(event)
+
+        if self._store is not None:
+            self._store.record_event(event)
+
+        if self._event_raised is not None:
+            self._event_raised(event)
+
+    def restore(self, store, since, limit):
+        # Streams stored devices back into the fleet and the map, chunk by
+        # chunk, then puts their recorded events back on the map
+        restored = []
+
+        for id, received in store.devices(since):
+            device = None
+
+            for timestamps, columns in store.restore(id, limit):
+                device = self._fleet.restore(id, timestamps, columns, received)
+
+                self._map.trail_append(id, [
+                    [latitude, longitude]
+                    for latitude, longitude in zip(columns["latitude"], columns["longitude"])
+                    if latitude or longitude
+                ])
+
+            if device is not None:
+                restored.append(device)
+
+        self._map.device_update([
+            {
+                "id": device.id,
+                "latitude": device.telemetry["latitude"],
+                "longitude": device.telemetry["longitude"],
+            }
+            for device in restored
+        ])
+
+        for event in store.events(since):
+            self._map.event_marker_add(event)
+
+            if self._events is not None:
+                self._events.restore(event)
+
+        return restored
+
+    def expire(self, now=None):
+        expired = self._fleet.expire(now)
+
+        if expired:
+            self._map.device_remove(expired)
+
+            if self._events is not None:
+                for id in expired:
+                    self._events.remove(id)
+
+        return expired
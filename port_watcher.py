@@ -0,0 +1,149 @@
+import os
+import threading
+
+from PyQt5 import QtCore
+
+import serial.tools.list_ports
+
+# Device nodes that can be serial ports, on systems that have /dev
+DEV_DIRECTORY = "/dev"
+DEVICE_PREFIXES = ("tty", "cu.", "rfcomm")
+
+def port_info(port):
+    # The metadata of a pyserial ListPortInfo worth keeping, as a plain dict
+    return {
+        "device": port.device,
+        "description": str(port.description),
+        "hwid": port.hwid,
+        "vid": port.vid,
+        "pid": port.pid,
+        "serial_number": port.serial_number,
+        "location": port.location,
+        "label": str(port.description) + " (" + port.device + ")",
+    }
+
+def port_identity(port):
+    # What makes a port the same radio when it comes back, possibly under
+    # another device name. USB serial numbers survive a replug anywhere,
+    # without one the same USB socket is the best guess.
+    if port["serial_number"]:
+        return "{:04x}:{:04x}:{}".format(port["vid"] or 0, port["pid"] or 0, port["serial_number"])
+
+    if port["vid"] is not None:
+        return "{:04x}:{:04x}@{}".format(port["vid"], port["pid"] or 0, port["location"])
+
+    return port["device"]
+
+class SerialPortWatcher(QtCore.QThread):
+    # Keeps a cached list of serial ports up to date on its own thread and
+    # reports what was added and removed. Enumerating ports with their
+    # metadata can be slow, so where there is a /dev the watcher first
+    # checks whether any device node came or went and only enumerates then.
+    # While fast is set, e.g. while waiting for a radio to come back, it
+    # polls at fast_interval instead of interval. Without /dev every poll is
+    # a full enumeration, so there it stays at interval.
+    ports_added = QtCore.pyqtSignal(list)
+    ports_removed = QtCore.pyqtSignal(list)
+
+    def __init__(self, interval=2.0, fast_interval=0.2, parent=None):
+        super(SerialPortWatcher, self).__init__(parent)
+
+        self._interval = interval
+        self._fast_interval = fast_interval
+        self._fast = False
+
+        # Device name -> port info
+        self._ports = {}
+        self._lock = threading.Lock()
+        self._fingerprint = None
+
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def start(self):
+        self._stop.clear()
+        super(SerialPortWatcher, self).start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self.wait()
+
+    def set_fast(self, fast):
+        self._fast = fast
+        self._wake.set()
+
+    def ports(self):
+        with self._lock:
+            return dict(self._ports)
+
+    def identity(self, device):
+        with self._lock:
+            port = self._ports.get(device)
+
+        return device if port is None else port_identity(port)
+
+    def find(self, identity):
+        # The port currently present with the given identity, if any
+        with self._lock:
+            for port in self._ports.values():
+                if port_identity(port) == identity:
+                    return port
+
+        return None
+
+    def list_ports(self):
+        return [port_info(port) for port in serial.tools.list_ports.comports(False)]
+
+    def fingerprint(self):
+        # Cheap summary of the device nodes, None where there is no /dev to look
+        # at. A node is recreated when a radio is replugged, even under the same
+        # name, so its device number and change time are part of it.
+        try:
+            entries = list(os.scandir(DEV_DIRECTORY))
+        except OSError:
+            return None
+
+        nodes = []
+
+        for entry in entries:
+            if not entry.name.startswith(DEVICE_PREFIXES):
+                continue
+
+            # Gone between listing and stat, it is missing from the next listing too
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+
+            nodes.append((entry.name, stat.st_rdev, stat.st_ctime_ns))
+
+        return frozenset(nodes)
+
+    def scan(self):
+        fingerprint = self.fingerprint()
+
+        if fingerprint is not None and fingerprint == self._fingerprint:
+            return
+
+        self._fingerprint = fingerprint
+        ports = {port["device"]: port for port in self.list_ports()}
+
+        with self._lock:
+            added = [port for device, port in ports.items() if self._ports.get(device) != port]
+            removed = [device for device in self._ports if device not in ports]
+            self._ports = ports
+
+        if removed:
+            self.ports_removed.emit(removed)
+
+        if added:
+            self.ports_added.emit(added)
+
+    def run(self):
+        while not self._stop.is_set():
+            self.scan()
+
+            fast = self._fast and self._fingerprint is not None
+            self._wake.wait(self._fast_interval if fast else self._interval)
+            self._wake.clear()
@@ -0,0 +1,219 @@
+import math
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+# Density scale height of the lower atmosphere, descent speed goes as 1/sqrt(density)
+SCALE_HEIGHT = 7238.3
+
+METRES_PER_DEGREE = 111320.0
+
+# Scale of a 2D normal's covariance ellipse that holds 95% of landings
+ELLIPSE_SIGMA_95 = math.sqrt(5.991)
+
+def wind_profile(history, bin_size=250.0):
+    # Average wind per altitude bin from the ascent part of a device history.
+    # While ascending the balloon drifts with the wind, so its horizontal
+    # velocity and course are the wind at that altitude.
+    altitude = np.frombuffer(history.view("altitude"), dtype=np.float64)
+    vertical = np.frombuffer(history.view("velocity_vertical"), dtype=np.float64)
+    speed = np.frombuffer(history.view("velocity_horizontal"), dtype=np.float64)
+    course = np.radians(np.frombuffer(history.view("course"), dtype=np.float64))
+
+    ascending = vertical > 0.5
+
+    if not np.any(ascending):
+        return np.zeros(1), np.zeros(1), np.zeros(1)
+
+    altitude = altitude[ascending]
+    east = speed[ascending] * np.sin(course[ascending])
+    north = speed[ascending] * np.cos(course[ascending])
+
+    bins = np.floor(altitude / bin_size).astype(np.int64)
+    bins -= bins.min()
+    counts = np.bincount(bins)
+    filled = counts > 0
+
+    centres = (np.bincount(bins, altitude)[filled]) / counts[filled]
+    east = np.bincount(bins, east)[filled] / counts[filled]
+    north = np.bincount(bins, north)[filled] / counts[filled]
+
+    return centres, east, north
+
+def descent_rate_sea_level(history, default=5.0):
+    # Sea level equivalent descent rate from the descent so far, if any
+    altitude = np.frombuffer(history.view("altitude"), dtype=np.float64)
+    vertical = np.frombuffer(history.view("velocity_vertical"), dtype=np.float64)
+
+    descending = vertical < -0.5
+
+    if np.count_nonzero(descending) < 5:
+        return default
+
+    return float(np.median(-vertical[descending] * np.exp(-altitude[descending] / (2.0 * SCALE_HEIGHT))))
+
+def simulate(state, profile, burst_altitudes, drag_factors, dt=5.0, max_steps=20000):
+    # Integrates every trajectory of an ensemble at once. Each element of
+    # burst_altitudes and drag_factors is one trajectory. Returns landing
+    # latitudes and longitudes.
+    count = len(burst_altitudes)
+
+    latitude = np.full(count, state["latitude"])
+    longitude = np.full(count, state["longitude"])
+    altitude = np.full(count, state["altitude"])
+    ascending = np.full(count, state["ascending"]) & (altitude < burst_altitudes)
+    alive = altitude > state["ground_altitude"]
+
+    profile_altitude, profile_east, profile_north = profile
+    descent_rate = state["descent_rate"] * drag_factors
+
+    for step in range(max_steps):
+        if not alive.any():
+            break
+
+        east = np.interp(altitude, profile_altitude, profile_east)
+        north = np.interp(altitude, profile_altitude, profile_north)
+
+        vertical = np.where(
+            ascending,
+            state["ascent_rate"],
+            -descent_rate * np.exp(altitude / (2.0 * SCALE_HEIGHT))
+        )
+        vertical = np.where(alive, vertical, 0.0)
+        drift = np.where(alive, dt, 0.0)
+
+        altitude += vertical * dt
+        latitude += north * drift / METRES_PER_DEGREE
+        longitude += east * drift / (METRES_PER_DEGREE * np.cos(np.radians(latitude)))
+
+        ascending &= altitude < burst_altitudes
+        alive &= altitude > state["ground_altitude"]
+
+    return latitude, longitude
+
+def _simulate_chunk(arguments):
+    state, profile, count, burst_sigma, drag_sigma, seed = arguments
+    random = np.random.default_rng(seed)
+
+    burst_altitudes = random.normal(state["burst_altitude"], burst_sigma, count)
+    drag_factors = np.clip(random.normal(1.0, drag_sigma, count), 0.5, 1.5)
+
+    return simulate(state, profile, burst_altitudes, drag_factors)
+
+def landing_ellipse(latitudes, longitudes, points=36):
+    # 95% ellipse of the landing points, with a polygon outline for the map
+    latitude = float(np.mean(latitudes))
+    longitude = float(np.mean(longitudes))
+    scale = METRES_PER_DEGREE * math.cos(math.radians(latitude))
+
+    offsets = np.vstack(((longitudes - longitude) * scale, (latitudes - latitude) * METRES_PER_DEGREE))
+    covariance = np.cov(offsets) if offsets.shape[1] > 1 else np.zeros((2, 2))
+    variances, vectors = np.linalg.eigh(covariance)
+    variances = np.clip(variances, 0.0, None)
+
+    semi_minor, semi_major = ELLIPSE_SIGMA_95 * np.sqrt(variances)
+    rotation = math.atan2(vectors[1, 1], vectors[0, 1])
+
+    angles = np.linspace(0.0, 2.0 * math.pi, points, endpoint=False)
+    x = semi_major * np.cos(angles) * math.cos(rotation) - semi_minor * np.sin(angles) * math.sin(rotation)
+    y = semi_major * np.cos(angles) * math.sin(rotation) + semi_minor * np.sin(angles) * math.cos(rotation)
+
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "semi_major": float(semi_major),
+        "semi_minor": float(semi_minor),
+        "rotation": math.degrees(rotation),
+        "points": np.column_stack((latitude + y / METRES_PER_DEGREE, longitude + x / scale)).tolist(),
+    }
+
+class LandingPredictor():
+    # Runs Monte Carlo landing predictions on a process pool. predict() only
+    # gathers the inputs from the device history, the ensemble is split over
+    # the workers and the returned future resolves to the landing ellipse.
+    # Chunks are seeded from seed in order and combined in worker order, so
+    # predictors with the same seed make the same series of predictions.
+    def __init__(self, samples=2000, workers=2, burst_altitude=30000.0, burst_sigma=1500.0, drag_sigma=0.1, ground_altitude=0.0, seed=0):
+        self._samples = samples
+        self._workers = max(workers, 1)
+        self._burst_altitude = burst_altitude
+        self._burst_sigma = burst_sigma
+        self._drag_sigma = drag_sigma
+        self._ground_altitude = ground_altitude
+        self._executor = None
+        self._seed = seed
+
+    @property
+    def ground_altitude(self):
+        return self._ground_altitude
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _pool(self):
+        # Spawned rather than forked, the parent is running Qt
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self._workers, mp_context=multiprocessing.get_context("spawn"))
+
+        return self._executor
+
+    def state(self, device):
+        telemetry = device.telemetry
+        history = device.history
+        ascending = telemetry["velocity_vertical"] > 0.5
+
+        return {
+            "latitude": telemetry["latitude"],
+            "longitude": telemetry["longitude"],
+            "altitude": telemetry["altitude"],
+            "ascending": ascending,
+            "ascent_rate": telemetry["velocity_vertical"] if ascending else 0.0,
+            "descent_rate": descent_rate_sea_level(history),
+            "burst_altitude": max(self._burst_altitude, telemetry["altitude"]) if ascending else telemetry["altitude"],
+            "ground_altitude": self._ground_altitude,
+        }
+
+    def predict(self, device):
+        state = self.state(device)
+        profile = wind_profile(device.history)
+
+        # Burst uncertainty only matters while still going up
+        burst_sigma = self._burst_sigma if state["ascending"] else 0.0
+        chunk = -(-self._samples // self._workers)
+
+        result = Future()
+        # Per worker, in submission order whatever order they finish in
+        results = [None] * self._workers
+        remaining = [self._workers]
+        lock = threading.Lock()
+
+        def chunk_done(worker, future):
+            with lock:
+                if result.done():
+                    return
+
+                if future.cancelled() or future.exception() is not None:
+                    result.set_exception(future.exception() if not future.cancelled() else RuntimeError("Prediction cancelled"))
+                    return
+
+                results[worker] = future.result()
+                remaining[0] -= 1
+
+                if not remaining[0]:
+                    result.set_result(landing_ellipse(
+                        np.concatenate([latitudes for latitudes, longitudes in results]),
+                        np.concatenate([longitudes for latitudes, longitudes in results])
+                    ))
+
+        for worker in range(self._workers):
+            self._seed += 1
+            self._pool().submit(
+                _simulate_chunk,
+                (state, profile, chunk, burst_sigma, self._drag_sigma, self._seed)
+            ).add_done_callback(functools.partial(chunk_done, worker))
+
+        return result
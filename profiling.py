@@ -0,0 +1,38 @@
+import time
+import contextlib
+
+class StartupProfiler():
+    # Records how long each startup step takes and when milestones (first
+    # frame, map loaded, ...) are reached, relative to process start
+    def __init__(self, started=None, enabled=True):
+        self._started = time.perf_counter() if started is None else started
+        self._enabled = enabled
+        self._steps = []
+        self._milestones = []
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @contextlib.contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self._steps.append((name, time.perf_counter() - start))
+
+    def mark(self, name):
+        self._milestones.append((name, time.perf_counter() - self._started))
+
+    def report(self):
+        lines = ["Startup profile:"]
+
+        for name, duration in self._steps:
+            lines.append("  {:<32} {:>8.1f} ms".format(name, duration * 1000))
+
+        for name, elapsed in self._milestones:
+            lines.append("  {:<32} {:>8.1f} ms after start".format(name, elapsed * 1000))
+
+        return "\n".join(lines)
@@ -0,0 +1,197 @@
+import struct
+import binascii
+
+# Frame layout on the radio link:
+#   sync (2 bytes) | length (1 byte) | payload (length bytes) | crc16 (2 bytes)
+# The CRC is CRC-16/CCITT-FALSE over the length byte and the payload.
+FRAME_SYNC = b"\xa5\x5a"
+FRAME_HEADER_SIZE = 3
+FRAME_CRC_SIZE = 2
+FRAME_PAYLOAD_MAX = 255
+
+# Payload message types
+MESSAGE_TELEMETRY = 0x01
+MESSAGE_COMMAND = 0x02
+MESSAGE_ACK = 0x03
+
+# Telemetry payload: type, device id, sequence, timestamp, then Icarus fields
+TELEMETRY_STRUCT = struct.Struct("<BIHddd15fB")
+TELEMETRY_FIELDS = (
+    "latitude",
+    "longitude",
+    "altitude",
+    "altitude_elipsoid",
+    "altitude_relative",
+    "altitude_barometric",
+    "velocity_horizontal",
+    "velocity_vertical",
+    "roll",
+    "pitch",
+    "yaw",
+    "heading",
+    "course",
+    "temperature",
+    "pressure",
+    "humidity",
+    "hdop",
+    "fix",
+)
+
+# Command payload: type, device id, command count, then per command: command
+# id, command code, argument. Several commands for a device share one frame.
+COMMAND_HEADER_STRUCT = struct.Struct("<BIB")
+COMMAND_STRUCT = struct.Struct("<HBf")
+COMMANDS_PER_FRAME = (FRAME_PAYLOAD_MAX - COMMAND_HEADER_STRUCT.size) // COMMAND_STRUCT.size
+
+# Ack payload: type, device id, command id, status
+ACK_STRUCT = struct.Struct("<BIHB")
+
+def crc16(data):
+    return binascii.crc_hqx(data, 0xFFFF)
+
+def encode_frame(payload):
+    if len(payload) > FRAME_PAYLOAD_MAX:
+        raise ValueError("Frame payload too long: " + str(len(payload)) + " bytes")
+
+    body = bytes((len(payload),)) + payload
+    return FRAME_SYNC + body + crc16(body).to_bytes(2, "little")
+
+def encode_telemetry(record):
+    return TELEMETRY_STRUCT.pack(
+        MESSAGE_TELEMETRY,
+        int(record["id"]),
+        record.get("sequence", 0) & 0xFFFF,
+        record["timestamp"],
+        *(record.get(field, 0) for field in TELEMETRY_FIELDS)
+    )
+
+def decode_telemetry(payload):
+    if len(payload) != TELEMETRY_STRUCT.size:
+        return None
+
+    values = TELEMETRY_STRUCT.unpack(payload)
+
+    record = dict(zip(TELEMETRY_FIELDS, values[4:]))
+    record["id"] = str(values[1])
+    record["sequence"] = values[2]
+    record["timestamp"] = values[3]
+
+    return record
+
+def encode_commands(device, commands):
+    # commands is a list of (command id, code, argument)
+    if len(commands) > COMMANDS_PER_FRAME:
+        raise ValueError("Too many commands for one frame: " + str(len(commands)))
+
+    return COMMAND_HEADER_STRUCT.pack(MESSAGE_COMMAND, int(device), len(commands)) + b"".join(
+        COMMAND_STRUCT.pack(command_id & 0xFFFF, code, argument) for command_id, code, argument in commands
+    )
+
+def decode_commands(payload):
+    if len(payload) < COMMAND_HEADER_STRUCT.size:
+        return None
+
+    message, device, count = COMMAND_HEADER_STRUCT.unpack_from(payload)
+
+    if message != MESSAGE_COMMAND or len(payload) != COMMAND_HEADER_STRUCT.size + count * COMMAND_STRUCT.size:
+        return None
+
+    return str(device), [
+        COMMAND_STRUCT.unpack_from(payload, COMMAND_HEADER_STRUCT.size + index * COMMAND_STRUCT.size)
+        for index in range(count)
+    ]
+
+def encode_ack(device, command_id, status):
+    return ACK_STRUCT.pack(MESSAGE_ACK, int(device), command_id & 0xFFFF, status)
+
+def decode_ack(payload):
+    if len(payload) != ACK_STRUCT.size or payload[0] != MESSAGE_ACK:
+        return None
+
+    message, device, command_id, status = ACK_STRUCT.unpack(payload)
+
+    return {
+        "id": str(device),
+        "command": command_id,
+        "status": status,
+    }
+
+def decode_payload(payload):
+    if not payload:
+        return None
+
+    if payload[0] == MESSAGE_TELEMETRY:
+        return decode_telemetry(payload)
+
+    return None
+
+class FrameDecoder():
+    # Incremental decoder for a byte stream of frames. Bytes can be fed in
+    # arbitrary chunks, partial frames are kept until the rest arrives and
+    # corrupt frames are skipped by resynchronising on the next sync word.
+    __slots__ = ("_buffer", "_max_buffer", "frames", "crc_errors", "bytes_discarded")
+
+    def __init__(self, max_buffer=65536):
+        self._buffer = bytearray()
+        self._max_buffer = max_buffer
+
+        self.frames = 0
+        self.crc_errors = 0
+        self.bytes_discarded = 0
+
+    def reset(self):
+        self._buffer.clear()
+
+    def feed(self, data):
+        buffer = self._buffer
+        buffer += data
+
+        payloads = []
+        position = 0
+        end = len(buffer)
+
+        while True:
+            start = buffer.find(FRAME_SYNC, position)
+
+            if start < 0:
+                # Keep a trailing byte in case it is the first half of a sync word
+                keep = end - 1 if end > position and buffer[end - 1] == FRAME_SYNC[0] else end
+                self.bytes_discarded += keep - position
+                position = keep
+                break
+
+            self.bytes_discarded += start - position
+
+            if start + FRAME_HEADER_SIZE > end:
+                position = start
+                break
+
+            length = buffer[start + 2]
+            frame_end = start + FRAME_HEADER_SIZE + length + FRAME_CRC_SIZE
+
+            if frame_end > end:
+                position = start
+                break
+
+            body = buffer[start + 2:frame_end - FRAME_CRC_SIZE]
+            crc = buffer[frame_end - 2] | (buffer[frame_end - 1] << 8)
+
+            if crc16(body) != crc:
+                # Not a real frame, resync from the byte after this sync word
+                self.crc_errors += 1
+                self.bytes_discarded += 1
+                position = start + 1
+                continue
+
+            payloads.append(bytes(body[1:]))
+            self.frames += 1
+            position = frame_end
+
+        del buffer[:position]
+
+        # Never let garbage without a valid frame grow the buffer forever
+        if len(buffer) > self._max_buffer:
+            self.bytes_discarded += len(buffer)
+            buffer.clear()
+
+        return payloads
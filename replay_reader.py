@@ -0,0 +1,91 @@
+import time
+import threading
+
+from PyQt5 import QtCore
+
+from protocol import FrameDecoder, decode_payload
+from link_log import LinkLog, replay
+
+# Batches emitted but not yet taken up by the GUI thread
+BATCHES_PENDING_LIMIT = 4
+
+class ReplayReader(QtCore.QThread):
+    # Replays a link log on its own thread. Serial bytes go through a frame
+    # decoder and come out of telemetry_received in batches, exactly like the
+    # SerialReader, MQTT payloads are submitted to mqtt_ingest. At most
+    # BATCHES_PENDING_LIMIT batches wait in the GUI event queue and at most
+    # one drain's worth of MQTT records in mqtt_ingest, the replay holds off
+    # until the GUI catches up, which matters at speed 0.
+    telemetry_received = QtCore.pyqtSignal(list)
+
+    def __init__(self, path, mqtt_ingest, speed=1.0, batch_interval=0.05, instrumentation=None, parent=None):
+        super(ReplayReader, self).__init__(parent)
+
+        self._path = path
+        self._mqtt_ingest = mqtt_ingest
+        self._speed = speed
+        self._batch_interval = batch_interval
+        self._decoder = FrameDecoder()
+        self._instrumentation = instrumentation
+        self._stop = threading.Event()
+
+        self._batch = []
+        self._batch_started = 0.0
+
+        # Released on the GUI thread as each batch is delivered there, this
+        # object lives on the thread that created it
+        self._batches_free = threading.Semaphore(BATCHES_PENDING_LIMIT)
+        self.telemetry_received.connect(self._batch_delivered, QtCore.Qt.QueuedConnection)
+
+    def start(self):
+        self._stop.clear()
+        super(ReplayReader, self).start()
+
+    def stop(self):
+        self._stop.set()
+        self.wait()
+
+    def _batch_delivered(self, batch):
+        self._batches_free.release()
+
+    def _emit_batch(self):
+        if self._batch:
+            while not self._batches_free.acquire(timeout=0.1):
+                if self._stop.is_set():
+                    return
+
+            self.telemetry_received.emit(self._batch)
+            self._batch = []
+
+        self._batch_started = time.monotonic()
+
+    def _serial_sink(self, data):
+        received = time.perf_counter()
+
+        for payload in self._decoder.feed(data):
+            record = decode_payload(payload)
+
+            if record is not None:
+                record["received"] = received
+                self._batch.append(record)
+
+        if self._instrumentation is not None:
+            self._instrumentation.record_since("decode", received)
+
+        if time.monotonic() - self._batch_started >= self._batch_interval:
+            self._emit_batch()
+
+    def _mqtt_sink(self, topic, payload):
+        if self._mqtt_ingest.wait_for_room(self._stop):
+            self._mqtt_ingest.submit(topic, payload)
+
+    def run(self):
+        log = LinkLog(self._path)
+
+        self._batch_started = time.monotonic()
+        count = replay(log, self._serial_sink, self._mqtt_sink, self._speed, self._stop, self._emit_batch)
+        self._emit_batch()
+
+        log.close()
+
+        print("Replayed " + str(count) + " records from: " + self._path)
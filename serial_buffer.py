@@ -0,0 +1,55 @@
+import os
+
+# Bytes taken from the port per read, seconds of a busy 115200 baud link
+READ_BUFFER_SIZE = 65536
+
+class SerialReadBuffer():
+    # Reads a pyserial port into one preallocated bytearray instead of a new
+    # bytes object per read. Whatever the OS has buffered goes straight into
+    # it with readv on the port's file descriptor, with nothing buffered the
+    # port's own read waits for the first byte within its timeout. pyserial's
+    # readinto is a read plus a copy, it is only used for ports without a file
+    # descriptor. The returned memoryview is valid until the next read.
+    __slots__ = ("_buffer", "_view")
+
+    def __init__(self, size=READ_BUFFER_SIZE):
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+
+    def read(self, client):
+        count = 0
+        waiting = client.in_waiting
+
+        if not waiting:
+            data = client.read(1)
+
+            if not data:
+                return self._view[:0]
+
+            self._buffer[0] = data[0]
+            count = 1
+            waiting = client.in_waiting
+
+        waiting = min(waiting, len(self._buffer) - count)
+
+        if waiting:
+            count += self._read_into(client, self._view[count:count + waiting])
+
+        return self._view[:count]
+
+    def _read_into(self, client, view):
+        try:
+            fd = client.fileno()
+        except (AttributeError, OSError):
+            fd = None
+
+        if fd is None or not hasattr(os, "readv"):
+            return client.readinto(view)
+
+        count = os.readv(fd, [view])
+
+        # Same as pyserial, a port that was unplugged reads as ready but empty
+        if not count:
+            raise OSError("device reports readiness to read but returned no data")
+
+        return count
@@ -0,0 +1,118 @@
+import time
+import collections
+
+from PyQt5 import QtCore
+
+import serial
+
+from protocol import FrameDecoder, MESSAGE_ACK, decode_payload, decode_ack
+from serial_buffer import SerialReadBuffer
+
+class SerialReader(QtCore.QThread):
+    # Emitted with a list of decoded telemetry records, at most once per batch interval
+    telemetry_received = QtCore.pyqtSignal(list)
+    error_occurred = QtCore.pyqtSignal(str)
+    # Emitted with a list of decoded command acks
+    ack_received = QtCore.pyqtSignal(list)
+
+    def __init__(self, client, batch_interval=0.05, recorder=None, instrumentation=None, parent=None):
+        super(SerialReader, self).__init__(parent)
+
+        self._client = client
+        self._recorder = recorder
+        self._instrumentation = instrumentation
+        self._batch_interval = batch_interval
+        self._decoder = FrameDecoder()
+        self._read_buffer = SerialReadBuffer()
+        self._running = False
+
+        # Frames waiting to go out, written from the reader thread so the GUI never blocks on the port
+        self._outgoing = collections.deque()
+
+    @property
+    def decoder(self):
+        return self._decoder
+
+    def start(self):
+        self._running = True
+        self._decoder.reset()
+        super(SerialReader, self).start()
+
+    def stop(self):
+        self._running = False
+        self.wait()
+        self._outgoing.clear()
+
+    def write(self, data):
+        # Queues data to be written, returns False if the port is not open
+        if not self._running:
+            return False
+
+        self._outgoing.append(data)
+        return True
+
+    def run(self):
+        client = self._client
+        read_buffer = self._read_buffer
+        instrumentation = self._instrumentation
+
+        # Short timeout so a blocking read never holds off a stop request
+        client.timeout = self._batch_interval
+
+        batch = []
+        acks = []
+        batch_started = time.monotonic()
+
+        while self._running:
+            try:
+                while self._outgoing:
+                    client.write(self._outgoing.popleft())
+
+                # Block for the first byte, then take everything the OS has buffered
+                data = read_buffer.read(client)
+            except (serial.SerialException, OSError) as e:
+                self._running = False
+                self.error_occurred.emit(str(e))
+                break
+
+            if data:
+                received = time.perf_counter()
+
+                if self._recorder is not None:
+                    self._recorder.record_serial(data)
+
+                for payload in self._decoder.feed(data):
+                    if payload and payload[0] == MESSAGE_ACK:
+                        ack = decode_ack(payload)
+
+                        if ack is not None:
+                            acks.append(ack)
+
+                        continue
+
+                    record = decode_payload(payload)
+
+                    if record is not None:
+                        record["received"] = received
+                        batch.append(record)
+
+                # Acks are few and someone is waiting on them, no batching
+                if acks:
+                    self.ack_received.emit(acks)
+                    acks = []
+
+                if instrumentation is not None:
+                    instrumentation.record_since("decode", received)
+                    instrumentation.gauge("serial_backlog", client.in_waiting)
+
+            now = time.monotonic()
+
+            if now - batch_started >= self._batch_interval:
+                if batch:
+                    self.telemetry_received.emit(batch)
+                    batch = []
+
+                batch_started = now
+
+        if batch:
+            self.telemetry_received.emit(batch)
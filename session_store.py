@@ -0,0 +1,295 @@
+import struct
+import sqlite3
+import threading
+import collections
+from array import array
+
+from icarus import Icarus
+
+# The fields of a sample are packed into one blob, unpacking a run of blobs
+# in one go is far faster than fetching every field as its own column
+SAMPLE_STRUCT = struct.Struct("<" + "d" * len(Icarus.FIELDS))
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS telemetry ("
+    "device TEXT NOT NULL, timestamp REAL NOT NULL, received REAL NOT NULL, sequence INTEGER, sample BLOB NOT NULL"
+    ")",
+    "CREATE INDEX IF NOT EXISTS telemetry_device_timestamp ON telemetry (device, timestamp)",
+    "CREATE TABLE IF NOT EXISTS devices (id TEXT PRIMARY KEY, first_received REAL NOT NULL, last_received REAL NOT NULL, samples INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE IF NOT EXISTS events ("
+    "device TEXT NOT NULL, timestamp REAL NOT NULL, type TEXT NOT NULL, latitude REAL, longitude REAL, altitude REAL, detail TEXT"
+    ")",
+)
+
+INSERT_TELEMETRY = "INSERT INTO telemetry (device, timestamp, received, sequence, sample) VALUES (?, ?, ?, ?, ?)"
+
+UPSERT_DEVICE = (
+    "INSERT INTO devices (id, first_received, last_received, samples) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (id) DO UPDATE SET last_received = excluded.last_received, samples = samples + excluded.samples"
+)
+
+INSERT_EVENT = "INSERT INTO events (device, timestamp, type, latitude, longitude, altitude, detail) VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+EVENT_COLUMNS = ("id", "timestamp", "type", "latitude", "longitude", "altitude", "detail")
+
+SELECT_TELEMETRY = "SELECT timestamp, sample FROM telemetry WHERE device = ? AND timestamp >= ? ORDER BY timestamp"
+
+class SessionStore():
+    # Persists every device update to an SQLite database in WAL mode so a
+    # session survives a restart. record() only appends a row to a queue, a
+    # background thread writes the queue in batched transactions. Restoring
+    # reads on its own connection and streams each device back in chunks.
+    # The queues hold at most max_pending rows, if the writer falls behind
+    # or keeps failing the oldest rows are dropped and counted. A failed
+    # write is logged and leaves its message in error until a write succeeds.
+    def __init__(self, path, batch_size=500, flush_interval=1.0, max_pending=100000):
+        self._path = path
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+
+        self._pending = collections.deque(maxlen=max_pending)
+        self._events_pending = collections.deque(maxlen=max_pending)
+        self._state_pending = {}
+        self._state_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+        # The writer thread owns one connection, reads and restores use the other
+        self._connection = self._connect()
+        self._reader = self._connect()
+
+        for statement in SCHEMA:
+            self._connection.execute(statement)
+
+        self._connection.commit()
+
+        self.written = 0
+        self.dropped = 0
+        self.error = None
+
+        self._writer = threading.Thread(target=self._run, name="session-store", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self._path, check_same_thread=False, timeout=10.0)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def record(self, device, sequence, received):
+        # Called on the GUI thread after each model update, must stay cheap
+        telemetry = device.telemetry
+
+        if len(self._pending) == self._max_pending:
+            self.dropped += 1
+
+        self._pending.append((
+            device.id,
+            device.history.latest_timestamp(),
+            received,
+            sequence,
+            tuple(telemetry[field] for field in Icarus.FIELDS)
+        ))
+
+        if len(self._pending) >= self._batch_size:
+            self._wake.set()
+
+    def record_event(self, event):
+        # Events are rare and matter, they go out with the next write
+        if len(self._events_pending) == self._max_pending:
+            self.dropped += 1
+
+        self._events_pending.append(tuple(event[column] for column in EVENT_COLUMNS))
+        self._wake.set()
+
+    def set_state(self, key, value):
+        with self._state_lock:
+            self._state_pending[key] = str(value)
+
+        self._wake.set()
+
+    def get_state(self, key, default=None):
+        row = self._reader.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self._flush_interval)
+            self._wake.clear()
+            self._write_logged()
+
+        self._write_logged()
+
+    def _write_logged(self):
+        # An exception must not end the writer thread, later writes may well succeed
+        try:
+            self._write()
+        except Exception as e:
+            if self.error is None:
+                print("Failed to write session: " + self._path)
+                print(e)
+
+            self.error = type(e).__name__ + ": " + str(e)
+            return
+
+        self.error = None
+
+    def _write(self):
+        rows = []
+        pending = self._pending
+
+        while pending:
+            id, timestamp, received, sequence, sample = pending.popleft()
+            rows.append((id, timestamp, received, sequence, SAMPLE_STRUCT.pack(*sample)))
+
+        with self._state_lock:
+            state = self._state_pending
+            self._state_pending = {}
+
+        events = []
+
+        while self._events_pending:
+            events.append(self._events_pending.popleft())
+
+        if not rows and not state and not events:
+            return
+
+        devices = {}
+
+        for row in rows:
+            entry = devices.get(row[0])
+
+            if entry is None:
+                devices[row[0]] = [row[0], row[2], row[2], 1]
+            else:
+                entry[2] = row[2]
+                entry[3] += 1
+
+        try:
+            with self._connection:
+                self._connection.executemany(INSERT_TELEMETRY, rows)
+                self._connection.executemany(UPSERT_DEVICE, devices.values())
+                self._connection.executemany("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", state.items())
+                self._connection.executemany(INSERT_EVENT, events)
+        except BaseException:
+            self.dropped += len(rows) + len(events)
+            raise
+
+        self.written += len(rows)
+
+    def devices(self, since=0.0):
+        # (id, last received) of every device heard from since the given time
+        return self._reader.execute(
+            "SELECT id, last_received FROM devices WHERE last_received >= ? ORDER BY id", (since,)
+        ).fetchall()
+
+    def events(self, since=0.0):
+        # Recorded events since the given time, oldest first
+        rows = self._reader.execute(
+            "SELECT device, timestamp, type, latitude, longitude, altitude, detail FROM events WHERE timestamp >= ? ORDER BY timestamp",
+            (since,)
+        ).fetchall()
+
+        return [dict(zip(EVENT_COLUMNS, row)) for row in rows]
+
+    def restore(self, id, limit, chunk_size=4096):
+        # Yields (timestamps, {field: values}) chunks of the newest limit
+        # samples of a device, oldest first, without loading them all at once
+        start = self._reader.execute(
+            "SELECT timestamp FROM telemetry WHERE device = ? ORDER BY timestamp DESC LIMIT 1 OFFSET ?",
+            (id, limit - 1)
+        ).fetchone()
+
+        cursor = self._reader.execute(SELECT_TELEMETRY, (id, float("-inf") if start is None else start[0]))
+
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+
+            if not rows:
+                break
+
+            timestamps, samples = zip(*rows)
+
+            values = array("d")
+            values.frombytes(b"".join(samples))
+
+            stride = len(Icarus.FIELDS)
+            yield timestamps, {field: values[index::stride] for index, field in enumerate(Icarus.FIELDS)}
+
+    def samples(self, id, start_time=None, end_time=None, chunk_size=4096, end_row=None):
+        # Yields (timestamp, {field: value}) of every stored sample of a
+        # device in order. end_row, from last_row(), leaves out rows stored
+        # after it, so repeated reads agree while recording goes on. Uses
+        # its own connection so it can run on any thread.
+        connection = self._connect()
+
+        try:
+            cursor = connection.execute(
+                "SELECT timestamp, sample FROM telemetry WHERE device = ? AND timestamp >= ? AND timestamp <= ? AND rowid <= ? ORDER BY timestamp",
+                (
+                    id,
+                    float("-inf") if start_time is None else start_time,
+                    float("inf") if end_time is None else end_time,
+                    (1 << 63) - 1 if end_row is None else end_row
+                )
+            )
+
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+
+                if not rows:
+                    break
+
+                for timestamp, sample in rows:
+                    yield timestamp, dict(zip(Icarus.FIELDS, SAMPLE_STRUCT.unpack(sample)))
+        finally:
+            connection.close()
+
+    def last_row(self):
+        # Row of the newest stored sample, a bound for samples() and sample_counts()
+        connection = self._connect()
+
+        try:
+            return connection.execute("SELECT COALESCE(MAX(rowid), 0) FROM telemetry").fetchone()[0]
+        finally:
+            connection.close()
+
+    def sample_counts(self, ids=None, end_row=None):
+        # id -> number of stored samples, for every device in the store or
+        # the given ones, counting only rows up to end_row if given
+        connection = self._connect()
+
+        try:
+            counts = dict(connection.execute("SELECT id, samples FROM devices ORDER BY id"))
+
+            if end_row is None:
+                return counts if ids is None else {id: counts.get(id, 0) for id in ids}
+
+            return {
+                id: connection.execute(
+                    "SELECT COUNT(*) FROM telemetry WHERE device = ? AND rowid <= ?",
+                    (id, end_row)
+                ).fetchone()[0]
+                for id in (counts if ids is None else ids)
+            }
+        finally:
+            connection.close()
+
+    def clear(self):
+        self._pending.clear()
+        self._events_pending.clear()
+
+        with self._reader:
+            self._reader.execute("DELETE FROM telemetry")
+            self._reader.execute("DELETE FROM devices")
+            self._reader.execute("DELETE FROM state")
+            self._reader.execute("DELETE FROM events")
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self._writer.join()
+        self._connection.close()
+        self._reader.close()
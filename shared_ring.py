@@ -0,0 +1,155 @@
+import struct
+from multiprocessing import shared_memory
+
+from protocol import TELEMETRY_FIELDS
+
+# Header: records ever written, capacity. Only the writer updates it.
+HEADER_STRUCT = struct.Struct("<QQ")
+
+# Longest device id in bytes of UTF-8 a slot can hold
+ID_SIZE = 64
+
+# One record per slot: device id length and bytes, sequence, flags, link,
+# bitmask of the fields present, timestamp, receive time (time.perf_counter,
+# which is system wide), then the telemetry fields
+RECORD_STRUCT = struct.Struct("<B" + str(ID_SIZE) + "sHBBIdd" + "d" * len(TELEMETRY_FIELDS))
+RECORD_FIELDS_OFFSET = 8
+
+FLAG_SEQUENCE = 0x01
+FLAG_TIMESTAMP_ESTIMATED = 0x02
+
+class SharedRecordRing():
+    # Fixed layout ring buffer of telemetry records in shared memory, for one
+    # writer process and one reader process. The writer fills a slot and then
+    # bumps the written count in the header, the reader remembers how far it
+    # got and unpacks straight out of the shared buffer. A writer more than
+    # capacity records ahead overwrites the oldest unread records, those are
+    # skipped and counted as lost. Records whose id does not fit a slot are
+    # refused and counted as rejected rather than stored under a cut off id.
+    def __init__(self, name=None, capacity=65536):
+        if name is None:
+            self._memory = shared_memory.SharedMemory(create=True, size=HEADER_STRUCT.size + capacity * RECORD_STRUCT.size)
+            HEADER_STRUCT.pack_into(self._memory.buf, 0, 0, capacity)
+            self._owner = True
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+            self._owner = False
+
+        written, self._capacity = HEADER_STRUCT.unpack_from(self._memory.buf, 0)
+
+        self._written = written
+        self._read = written
+
+        self.lost = 0
+        self.rejected = 0
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def _slot(self, index):
+        return HEADER_STRUCT.size + (index % self._capacity) * RECORD_STRUCT.size
+
+    def _written_count(self):
+        return struct.unpack_from("<Q", self._memory.buf, 0)[0]
+
+    def write(self, link, record):
+        # Returns False if the record was rejected
+        id = str(record["id"]).encode()
+
+        if len(id) > ID_SIZE:
+            self.rejected += 1
+            return False
+
+        sequence = record.get("sequence")
+        present = 0
+
+        for bit, field in enumerate(TELEMETRY_FIELDS):
+            if field in record:
+                present |= 1 << bit
+
+        RECORD_STRUCT.pack_into(
+            self._memory.buf,
+            self._slot(self._written),
+            len(id),
+            id,
+            0 if sequence is None else sequence & 0xFFFF,
+            (0 if sequence is None else FLAG_SEQUENCE) | (FLAG_TIMESTAMP_ESTIMATED if record.get("timestamp_estimated") else 0),
+            link,
+            present,
+            record.get("timestamp", 0.0),
+            record.get("received", 0.0),
+            *(float(record.get(field, 0.0)) for field in TELEMETRY_FIELDS)
+        )
+
+        # Publish the slot only once it is complete
+        self._written += 1
+        struct.pack_into("<Q", self._memory.buf, 0, self._written)
+
+        return True
+
+    def read(self, max_count=None):
+        # Returns (link, record) for everything written since the last read
+        written = self._written_count()
+
+        if written - self._read > self._capacity:
+            self.lost += written - self._read - self._capacity
+            self._read = written - self._capacity
+
+        stop = written if max_count is None else min(written, self._read + max_count)
+        start = self._read
+        records = []
+
+        # At most two runs, before and after the end of the buffer
+        index = start
+
+        while index < stop:
+            run = min(stop - index, self._capacity - index % self._capacity)
+            offset = self._slot(index)
+
+            for values in RECORD_STRUCT.iter_unpack(self._memory.buf[offset:offset + run * RECORD_STRUCT.size]):
+                records.append(values)
+
+            index += run
+
+        # Anything the writer lapped while we were unpacking is not trustworthy
+        overwritten = self._written_count() - self._capacity - start
+
+        if overwritten > 0:
+            overwritten = min(overwritten, len(records))
+            self.lost += overwritten
+            records = records[overwritten:]
+
+        self._read = stop
+
+        return [self._record(values) for values in records]
+
+    def _record(self, values):
+        present = values[5]
+
+        record = {
+            field: value
+            for bit, (field, value) in enumerate(zip(TELEMETRY_FIELDS, values[RECORD_FIELDS_OFFSET:]))
+            if present >> bit & 1
+        }
+        record["id"] = values[1][:values[0]].decode(errors="replace")
+        record["timestamp"] = values[6]
+        record["received"] = values[7]
+
+        if values[3] & FLAG_SEQUENCE:
+            record["sequence"] = values[2]
+
+        if values[3] & FLAG_TIMESTAMP_ESTIMATED:
+            record["timestamp_estimated"] = True
+
+        return values[4], record
+
+    def close(self):
+        self._memory.close()
+
+        if self._owner:
+            self._memory.unlink()
@@ -0,0 +1,90 @@
+import math
+
+def tolerance_for_zoom(zoom, pixels=1.0):
+    # Degrees of longitude covered by a number of screen pixels at a web mercator zoom level
+    return pixels * 360.0 / (256.0 * (1 << int(zoom)))
+
+def _segment_distance_squared(px, py, ax, ay, bx, by):
+    dx = bx - ax
+    dy = by - ay
+
+    if dx == 0.0 and dy == 0.0:
+        dx = px - ax
+        dy = py - ay
+        return dx * dx + dy * dy
+
+    t = ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)
+
+    if t <= 0.0:
+        dx = px - ax
+        dy = py - ay
+    elif t >= 1.0:
+        dx = px - bx
+        dy = py - by
+    else:
+        dx = px - (ax + t * dx)
+        dy = py - (ay + t * dy)
+
+    return dx * dx + dy * dy
+
+def douglas_peucker(points, tolerance):
+    # Simplifies a list of [latitude, longitude] points. Longitude is scaled by
+    # cos(latitude) so the tolerance means roughly the same distance either way.
+    count = len(points)
+
+    if count < 3:
+        return [list(point) for point in points]
+
+    scale = math.cos(math.radians(points[0][0]))
+    xs = [point[1] * scale for point in points]
+    ys = [point[0] for point in points]
+
+    tolerance_squared = tolerance * tolerance
+    keep = bytearray(count)
+    keep[0] = 1
+    keep[count - 1] = 1
+
+    # Iterative so long trails can't hit the recursion limit
+    stack = [(0, count - 1)]
+
+    while stack:
+        first, last = stack.pop()
+
+        ax = xs[first]
+        ay = ys[first]
+        bx = xs[last]
+        by = ys[last]
+
+        index = -1
+        distance_max = tolerance_squared
+
+        for i in range(first + 1, last):
+            distance = _segment_distance_squared(xs[i], ys[i], ax, ay, bx, by)
+
+            if distance > distance_max:
+                index = i
+                distance_max = distance
+
+        if index >= 0:
+            keep[index] = 1
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [list(points[i]) for i in range(count) if keep[i]]
+
+def radial_distance_filter(points, tolerance, last_kept):
+    # Streaming counterpart to douglas_peucker, keeps points that moved more
+    # than the tolerance away from the last kept point
+    scale = math.cos(math.radians(last_kept[0]))
+    tolerance_squared = tolerance * tolerance
+    kept = []
+
+    for point in points:
+        dx = (point[1] - last_kept[1]) * scale
+        dy = point[0] - last_kept[0]
+
+        if dx * dx + dy * dy > tolerance_squared:
+            kept.append(list(point))
+            last_kept = point
+
+    return kept
@@ -1,6 +1,12 @@
 var icarus_map;
 var icarus_marker_layergroup;
 var icarus_trail_layergroup;
+var icarus_markers = {};
+var icarus_device_state = {};
+var icarus_trails = {};
+var icarus_prediction_layergroup;
+var icarus_predictions = {};
+var icarus_event_layergroup;
 
 const icon_balloon = L.icon({
     iconUrl: '../assets/8_bit_balloon_pin.png',
@@ -19,6 +25,29 @@ const popup_options = {
     autoPan: false,
 };
 
+//Trails are split into short polylines so appending only redraws the last one
+const trail_segment_points = 256;
+
+const prediction_options = {
+    color: 'orange',
+    weight: 1,
+    fillOpacity: 0.2,
+};
+
+//Event markers by event type, anything else gets the default
+const event_styles = {
+    launch: {label: 'Launch', color: 'green'},
+    burst: {label: 'Burst', color: 'red'},
+    apogee: {label: 'Apogee', color: 'purple'},
+    landing: {label: 'Landing', color: 'blue'},
+    fix_lost: {label: 'Fix lost', color: 'gray'},
+    fix_regained: {label: 'Fix regained', color: 'gray'},
+    geofence_enter: {label: 'Geofence entered', color: 'orange'},
+    geofence_exit: {label: 'Geofence exited', color: 'orange'},
+};
+
+const event_default_style = {label: 'Event', color: 'black'};
+
 const trail_options = {
     color: 'red', 
     weight: 1,
@@ -45,21 +74,114 @@ new QWebChannel(qt.webChannelTransport, function (input_channel) {
          - mapbox/satellite-streets-v11
          */
 
-        L.tileLayer('https://api.mapbox.com/styles/v1/{id}/tiles/{z}/{x}/{y}?access_token={accessToken}', {
+        //Tiles come from the local tile cache, see [Tiles] in config.ini for the upstream style
+        L.tileLayer(config.tile_url, {
             attribution: 'Map data &copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors, Imagery © <a href="https://www.mapbox.com/">Mapbox</a>',
             maxZoom: config.max_zoom,
             minZoom: config.min_zoom,
-            id: 'mapbox/outdoors-v11',
             tileSize: 512,
-            zoomOffset: -1,
-            accessToken: ''
+            zoomOffset: -1
         }).addTo(icarus_map);
 
         icarus_marker_layergroup = L.layerGroup().addTo(icarus_map);
         icarus_trail_layergroup = L.layerGroup().addTo(icarus_map);
+        icarus_prediction_layergroup = L.layerGroup().addTo(icarus_map);
+        icarus_event_layergroup = L.layerGroup().addTo(icarus_map);
+
+        icarus_map.on('zoomend', function() {
+            channel.zoom_changed(icarus_map.getZoom());
+        });
+
+        //Map calls arrive as channel signals, see map_transport.py
+        channel.trails_received.connect(icarusTrailsReceived);
+        channel.devices_received.connect(icarusDevicesReceived);
+        channel.call_received.connect(function(name, payload) {
+            window[name](JSON.parse(payload));
+        });
+        channel.frame_sent.connect(function(frame) {
+            channel.frame_applied(frame);
+        });
+
+        channel.map_ready();
     });
 });
 
+/*
+ * Decodes base64 data into an ArrayBuffer
+ */
+function icarusDecodeBuffer(data) {
+    var bytes = atob(data);
+    var buffer = new Uint8Array(bytes.length);
+
+    for (var i = 0; i < bytes.length; i++) {
+        buffer[i] = bytes.charCodeAt(i);
+    }
+
+    return buffer.buffer;
+}
+
+/*
+ * Decodes a base64 packed array into a typed array of the given type
+ */
+function icarusDecode(data, type) {
+    return new type(icarusDecodeBuffer(data));
+}
+
+/*
+ * Unpacks trails sent as point counts and a float64 latitude, longitude origin
+ * followed by interleaved float32 offsets from it
+ */
+function icarusTrailsReceived(replace, ids, counts, coordinates) {
+    counts = icarusDecode(counts, Uint32Array);
+
+    var buffer = icarusDecodeBuffer(coordinates);
+    var origin = new Float64Array(buffer, 0, 2);
+    var offsets = new Float32Array(buffer, 16);
+
+    var trails = {};
+    var offset = 0;
+
+    for (var i = 0; i < ids.length; i++) {
+        var points = new Array(counts[i]);
+
+        for (var j = 0; j < counts[i]; j++) {
+            points[j] = [origin[0] + offsets[offset], origin[1] + offsets[offset + 1]];
+            offset += 2;
+        }
+
+        trails[ids[i]] = points;
+    }
+
+    if (replace) {
+        icarusTrailReplace(trails);
+    } else {
+        icarusTrailAppend(trails);
+    }
+}
+
+/*
+ * Unpacks device positions sent as latitude, longitude pairs, NaN is unchanged
+ */
+function icarusDevicesReceived(ids, coordinates) {
+    coordinates = icarusDecode(coordinates, Float64Array);
+
+    var devices = {};
+
+    for (var i = 0; i < ids.length; i++) {
+        var device = devices[ids[i]] = {};
+
+        if (!isNaN(coordinates[2 * i])) {
+            device.latitude = coordinates[2 * i];
+        }
+
+        if (!isNaN(coordinates[2 * i + 1])) {
+            device.longitude = coordinates[2 * i + 1];
+        }
+    }
+
+    icarusDeviceUpdate(devices);
+}
+
 /*
  * Updates device markers and popups
  */
@@ -68,57 +190,134 @@ function mapCenterUpdate(location) {
 }
 
 /*
- * Updates device markers and popups
+ * Updates device markers and popups, devices are keyed by id and only carry
+ * the fields that changed since the last update
  */
 function icarusDeviceUpdate(devices) {
-    //Grab all existing markers so we can update them
-    existing_markers = icarus_marker_layergroup.getLayers();
-    updated_markers = [];
+    for (var id in devices) {
+        //Merge the changed fields into what we already know about the device
+        var state = icarus_device_state[id];
+
+        if (state === undefined) {
+            state = icarus_device_state[id] = {};
+        }
 
-    //For each device, update the marker, or create a new one
-    for (var device in devices) {
-        marker_found = false;
+        Object.assign(state, devices[id]);
+
+        var marker = icarus_markers[id];
+
+        //If there is no marker yet, we need to create a new one
+        if (marker === undefined) {
+            marker = L.marker([state.latitude, state.longitude], marker_options).addTo(icarus_marker_layergroup);
+            marker.bindPopup(id, popup_options);
+            icarus_markers[id] = marker;
+        } else if ('latitude' in devices[id] || 'longitude' in devices[id]) {
+            marker.setLatLng([state.latitude, state.longitude]);
+        }
+    }
+}
 
-        for (var j = 0; j < existing_markers.length; j++) {
-            if (existing_markers[j].getPopup().getContent() == devices[device].id) {
-                existing_markers[j].setLatLng([devices[device].latitude, devices[device].longitude]);
-                existing_markers[j].getPopup().setContent(devices[device].id);
+/*
+ * Removes the markers and trails of devices that are no longer tracked
+ */
+function icarusDeviceRemove(ids) {
+    for (var i = 0; i < ids.length; i++) {
+        var id = ids[i];
 
-                //Add this to the updated markers list
-                updated_markers.push(existing_markers[i]);
+        if (icarus_markers[id] !== undefined) {
+            icarus_marker_layergroup.removeLayer(icarus_markers[id]);
+            delete icarus_markers[id];
+        }
 
-                //Marker was found!
-                marker_found = true;
+        if (icarus_trails[id] !== undefined) {
+            for (var j = 0; j < icarus_trails[id].length; j++) {
+                icarus_trail_layergroup.removeLayer(icarus_trails[id][j]);
             }
+
+            delete icarus_trails[id];
         }
 
-        //If the marker was not found, we need to create a new one
-        if (!marker_found) {
-            new_icarus_marker = L.marker([devices[device].latitude, devices[device].longitude], marker_options).addTo(icarus_marker_layergroup);
-            new_icarus_marker.bindPopUp(devices[device].id, popup_options);
+        if (icarus_predictions[id] !== undefined) {
+            icarus_prediction_layergroup.removeLayer(icarus_predictions[id]);
+            delete icarus_predictions[id];
         }
+
+        delete icarus_device_state[id];
     }
+}
 
-    //All non-updated markers need to be removed
-    for (var i = 0; i < existing_markers.length; i++) {
-        //If it's existing and not updated, it means it shouldn't exist any more
-        if (!updated_markers.includes(existing_markers[i])) {
-            //Remove from the layergroup
-            icarus_marker_layergroup.removeLayer(existing_markers[i]);
+/*
+ * Updates the predicted landing ellipse of devices, keyed by device id
+ */
+function icarusPredictionUpdate(predictions) {
+    for (var id in predictions) {
+        var prediction = icarus_predictions[id];
+
+        if (prediction === undefined) {
+            prediction = L.polygon(predictions[id].points, prediction_options).addTo(icarus_prediction_layergroup);
+            prediction.bindTooltip('');
+            icarus_predictions[id] = prediction;
+        } else {
+            prediction.setLatLngs(predictions[id].points);
         }
+
+        prediction.setTooltipContent(id + ' landing: ' + predictions[id].latitude.toFixed(5) + ', ' + predictions[id].longitude.toFixed(5));
     }
 }
 
 /*
- * Updates device trail polylines
+ * Appends points to a trail, starting a new segment when the last one is full
  */
-function icarusTrailUpdate(trails) {
-    //It's not possible to identify polylines so we just have to clear them all first
-    icarus_trail_layergroup.clearLayers();
+function icarusTrailAppendPoints(id, points) {
+    var segments = icarus_trails[id];
 
-    //Now we add all trails again
-    for (var trail in trails) {
-        L.polyline(trails[trail].points, trail_options).addTo(icarus_trail_layergroup);
+    if (segments === undefined) {
+        segments = icarus_trails[id] = [];
+    }
+
+    var i = 0;
+
+    while (i < points.length) {
+        var segment = segments[segments.length - 1];
+
+        if (segment === undefined || segment.getLatLngs().length >= trail_segment_points) {
+            //Segments share their first point with the end of the previous one
+            var start = (segment === undefined) ? [] : [segment.getLatLngs()[segment.getLatLngs().length - 1]];
+            segment = L.polyline(start, trail_options).addTo(icarus_trail_layergroup);
+            segments.push(segment);
+        }
+
+        var count = Math.min(points.length - i, trail_segment_points - segment.getLatLngs().length);
+        var latlngs = segment.getLatLngs().concat(points.slice(i, i + count));
+        segment.setLatLngs(latlngs);
+        i += count;
+    }
+}
+
+/*
+ * Appends newly simplified points to device trails, trails are keyed by device id
+ */
+function icarusTrailAppend(trails) {
+    for (var id in trails) {
+        icarusTrailAppendPoints(id, trails[id]);
+    }
+}
+
+/*
+ * Replaces whole device trails, used when the zoom level changes
+ */
+function icarusTrailReplace(trails) {
+    for (var id in trails) {
+        var segments = icarus_trails[id];
+
+        if (segments !== undefined) {
+            for (var i = 0; i < segments.length; i++) {
+                icarus_trail_layergroup.removeLayer(segments[i]);
+            }
+        }
+
+        icarus_trails[id] = [];
+        icarusTrailAppendPoints(id, trails[id]);
     }
 }
 
@@ -126,5 +325,19 @@ function icarusTrailUpdate(trails) {
  * Places a marker where an event has occurred
  */
 function icarusEventMarkerAdd(event) {
+    var style = event_styles[event.type] || event_default_style;
+    var time = new Date(event.timestamp * 1000).toISOString().substr(11, 8);
+    var text = event.id + ' ' + style.label + ' at ' + time + ', ' + Math.round(event.altitude) + ' m';
+
+    if (event.detail) {
+        text += ' (' + event.detail + ')';
+    }
 
+    //Event markers stay when their device is removed, a landing marker is where to go looking
+    L.circleMarker([event.latitude, event.longitude], {
+        radius: 6,
+        color: style.color,
+        weight: 2,
+        fillOpacity: 0.5,
+    }).bindTooltip(text).addTo(icarus_event_layergroup);
 }
\ No newline at end of file
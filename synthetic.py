@@ -0,0 +1,107 @@
+import json
+import math
+import random
+
+from protocol import encode_frame, encode_telemetry
+
+class SyntheticBalloon():
+    # Simple flight profile: constant ascent to a random burst altitude,
+    # drag limited descent, drifting on a wind that veers with altitude
+    def __init__(self, id, latitude, longitude, random_state):
+        self.id = id
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = 1400.0
+        self.ascent_rate = random_state.uniform(4.5, 5.5)
+        self.descent_rate = random_state.uniform(4.5, 6.0)
+        self.burst_altitude = random_state.uniform(25000.0, 32000.0)
+        self.burst = False
+        self.landed = False
+        self.sequence = 0
+        self.wind_speed = random_state.uniform(5.0, 25.0)
+        self.wind_direction = random_state.uniform(0.0, 2.0 * math.pi)
+
+    def step(self, dt):
+        if self.landed:
+            vertical = 0.0
+        elif not self.burst:
+            vertical = self.ascent_rate
+        else:
+            # Descent speed falls with air density on the way down
+            vertical = -self.descent_rate * math.exp(self.altitude / 14000.0)
+
+        self.altitude += vertical * dt
+
+        if not self.burst and self.altitude >= self.burst_altitude:
+            self.burst = True
+
+        if self.altitude <= 1400.0 and self.burst:
+            self.altitude = 1400.0
+            self.landed = True
+
+        direction = self.wind_direction + self.altitude / 20000.0
+        speed = 0.0 if self.landed else self.wind_speed * (0.5 + self.altitude / 20000.0)
+        north = speed * math.cos(direction)
+        east = speed * math.sin(direction)
+
+        self.latitude += north * dt / 111320.0
+        self.longitude += east * dt / (111320.0 * math.cos(math.radians(self.latitude)))
+        self.sequence = (self.sequence + 1) & 0xFFFF
+
+        return vertical, speed, math.degrees(math.atan2(east, north)) % 360.0
+
+class SyntheticFleet():
+    # Generates time ordered telemetry records for a fleet of balloons
+    def __init__(self, count, rate, latitude=39.521959, longitude=-119.808380, seed=0):
+        random_state = random.Random(seed)
+
+        self._rate = rate
+        self._balloons = [
+            SyntheticBalloon(
+                index + 1,
+                latitude + random_state.uniform(-0.01, 0.01),
+                longitude + random_state.uniform(-0.01, 0.01),
+                random_state
+            )
+            for index in range(count)
+        ]
+
+    def records(self, duration, start=0.0):
+        # Yields one record per balloon per sample period
+        dt = 1.0 / self._rate
+
+        for step in range(int(duration * self._rate)):
+            timestamp = start + step * dt
+
+            for balloon in self._balloons:
+                vertical, horizontal, course = balloon.step(dt)
+
+                yield {
+                    "id": str(balloon.id),
+                    "sequence": balloon.sequence,
+                    "timestamp": timestamp,
+                    "latitude": balloon.latitude,
+                    "longitude": balloon.longitude,
+                    "altitude": balloon.altitude,
+                    "altitude_elipsoid": balloon.altitude + 20.0,
+                    "altitude_relative": balloon.altitude - 1400.0,
+                    "altitude_barometric": balloon.altitude,
+                    "velocity_horizontal": horizontal,
+                    "velocity_vertical": vertical,
+                    "roll": 0.0,
+                    "pitch": 0.0,
+                    "yaw": course,
+                    "heading": course,
+                    "course": course,
+                    "temperature": 15.0 - 0.0065 * min(balloon.altitude, 11000.0),
+                    "pressure": 1013.25 * math.exp(-balloon.altitude / 8434.0),
+                    "humidity": 40.0,
+                    "hdop": 0.9,
+                    "fix": 3,
+                }
+
+def serial_frame(record):
+    return encode_frame(encode_telemetry(record))
+
+def mqtt_message(record):
+    return "icarus/" + record["id"] + "/telemetry", json.dumps(record).encode()
@@ -0,0 +1,140 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+class TelemetryHistory():
+    # Fixed capacity columnar ring buffer of telemetry samples.
+    #
+    # Every column (and the timestamps) is stored twice back to back, each
+    # sample is written to slot i and slot i + capacity. That way the most
+    # recent N samples are always one contiguous run of the backing array and
+    # can be handed out as a memoryview without copying. Views alias the live
+    # storage, so they are only valid until the samples they cover are
+    # overwritten. Samples must be appended in timestamp order.
+    __slots__ = ("_fields", "_field_index", "_capacity", "_timestamps", "_columns", "_head", "_size", "_appended")
+
+    @property
+    def fields(self):
+        return self._fields
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def appended(self):
+        # Total samples ever appended, readers use it to find what is new
+        return self._appended
+
+    def __init__(self, fields, capacity=36000):
+        if capacity < 1:
+            raise ValueError("History capacity must be at least 1, got: " + str(capacity))
+
+        self._fields = tuple(fields)
+        self._field_index = {field: index for index, field in enumerate(self._fields)}
+        self._capacity = capacity
+
+        self._timestamps = array("d", bytes(16 * capacity))
+        self._columns = tuple(array("d", bytes(16 * capacity)) for field in self._fields)
+
+        # Next write slot in [0, capacity) and number of valid samples
+        self._head = 0
+        self._size = 0
+        self._appended = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, timestamp, sample):
+        head = self._head
+        mirror = head + self._capacity
+
+        self._timestamps[head] = timestamp
+        self._timestamps[mirror] = timestamp
+
+        for field, column in zip(self._fields, self._columns):
+            value = sample[field]
+            column[head] = value
+            column[mirror] = value
+
+        self._head = head + 1 if head + 1 < self._capacity else 0
+
+        if self._size < self._capacity:
+            self._size += 1
+
+        self._appended += 1
+
+    def extend(self, timestamps, columns):
+        # Bulk append, columns maps every field to a sequence as long as
+        # timestamps. Written with slice assignment, much faster than
+        # appending one sample at a time when restoring a session.
+        count = len(timestamps)
+        capacity = self._capacity
+        skip = max(count - capacity, 0)
+
+        sources = [timestamps] + [columns[field] for field in self._fields]
+        targets = (self._timestamps,) + self._columns
+        start = skip
+
+        while start < count:
+            head = self._head
+            run = min(count - start, capacity - head)
+
+            for source, target in zip(sources, targets):
+                values = array("d", source[start:start + run])
+                target[head:head + run] = values
+                target[head + capacity:head + capacity + run] = values
+
+            self._head = head + run if head + run < capacity else 0
+            start += run
+
+        self._size = min(self._size + count - skip, capacity)
+        self._appended += count
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
+
+    def latest(self, field):
+        if not self._size:
+            raise IndexError("History is empty")
+
+        return self._columns[self._field_index[field]][self._head + self._capacity - 1]
+
+    def latest_timestamp(self):
+        if not self._size:
+            raise IndexError("History is empty")
+
+        return self._timestamps[self._head + self._capacity - 1]
+
+    def span(self, start_time=None, end_time=None):
+        # Returns the [start, stop) slice of the backing arrays holding the
+        # samples with start_time <= timestamp <= end_time
+        stop = self._head + self._capacity
+        start = stop - self._size
+
+        if start_time is not None:
+            start = bisect_left(self._timestamps, start_time, start, stop)
+
+        if end_time is not None:
+            stop = bisect_right(self._timestamps, end_time, start, stop)
+
+        return start, stop
+
+    def timestamps(self, start_time=None, end_time=None):
+        start, stop = self.span(start_time, end_time)
+        return memoryview(self._timestamps)[start:stop]
+
+    def view(self, field, start_time=None, end_time=None):
+        start, stop = self.span(start_time, end_time)
+        return memoryview(self._columns[self._field_index[field]])[start:stop]
+
+    def last(self, field, count):
+        # View over the newest count samples of a field
+        stop = self._head + self._capacity
+        start = stop - min(count, self._size)
+        return memoryview(self._columns[self._field_index[field]])[start:stop]
+
+    def last_timestamps(self, count):
+        stop = self._head + self._capacity
+        start = stop - min(count, self._size)
+        return memoryview(self._timestamps)[start:stop]
@@ -0,0 +1,74 @@
+from commands import CommandUplink, addressable, STATUS_TIMEOUT
+from link_log import LINK_SERIAL
+
+def test_addressable():
+    assert addressable("42")
+    assert not addressable("balloon-a")
+    assert not addressable(str(1 << 32))
+
+def test_non_numeric_device_fails_without_queueing():
+    sent = []
+
+    uplink = CommandUplink()
+    uplink.add_link(LINK_SERIAL, lambda device, payload: sent.append(payload) or True, 100, 200)
+
+    future = uplink.send("balloon-a", "ping", now=0.0)
+
+    assert future.done()
+    assert isinstance(future.exception(), ValueError)
+    assert uplink.pending() == 0
+    assert uplink.queue(LINK_SERIAL).depth() == 0
+
+    # Nothing left that could raise on later ticks
+    uplink.tick(0.1)
+    assert sent == []
+
+def test_numeric_device_is_sent():
+    sent = []
+
+    uplink = CommandUplink()
+    uplink.add_link(LINK_SERIAL, lambda device, payload: sent.append(payload) or True, 100, 200)
+
+    future = uplink.send("42", "ping", now=0.0)
+    uplink.tick(0.0)
+
+    assert not future.done()
+    assert len(sent) == 1
+
+def test_resend_expires_while_the_link_is_down():
+    sent = []
+    link = {"up": True}
+
+    def send(device, payload):
+        if link["up"]:
+            sent.append(payload)
+
+        return link["up"]
+
+    uplink = CommandUplink(timeout=5.0, retries=3, expiry=60.0)
+    uplink.add_link(LINK_SERIAL, send, 100, 200)
+
+    future = uplink.send("42", "cutdown", now=0.0)
+    uplink.tick(0.0)
+    assert len(sent) == 1
+
+    # No ack and the link goes down, the resend stays queued
+    link["up"] = False
+
+    for now in range(1, 60):
+        uplink.tick(float(now))
+
+    assert not future.done()
+
+    uplink.tick(60.0)
+
+    assert future.result(0) == STATUS_TIMEOUT
+    assert uplink.pending() == 0
+    assert uplink.queue(LINK_SERIAL).depth() == 0
+    assert uplink.queue(LINK_SERIAL).in_flight() == 0
+
+    # The link coming back must not send the stale cutdown
+    link["up"] = True
+    uplink.tick(600.0)
+
+    assert len(sent) == 1
@@ -0,0 +1,83 @@
+import math
+import random
+
+from decimation import MinMaxDecimator
+
+def buckets(xs, ys, origin, width):
+    # Brute force extrema per bucket: index -> (minimum, maximum) as (x, y)
+    result = {}
+
+    for x, y in zip(xs, ys):
+        index = int((x - origin) / width)
+        low, high = result.get(index, ((x, y), (x, y)))
+
+        if y < low[1]:
+            low = (x, y)
+
+        if y > high[1]:
+            high = (x, y)
+
+        result[index] = (low, high)
+
+    return result
+
+def test_keeps_extrema_per_bucket():
+    random.seed(12)
+    xs = [i * 0.1 for i in range(20000)]
+    ys = [math.sin(x / 30.0) * 100 + random.gauss(0, 5) for x in xs]
+
+    decimator = MinMaxDecimator(target=100, width=0.1)
+    decimator.extend(xs, ys)
+    points = set(zip(*decimator.points()))
+
+    for low, high in buckets(xs, ys, xs[0], decimator._width).values():
+        assert low in points
+        assert high in points
+
+    assert len(points) <= 4 * 100
+
+def test_output_is_ordered_and_bounded():
+    decimator = MinMaxDecimator(target=50)
+
+    for i in range(100000):
+        decimator.append(float(i), float((i * 7919) % 1000))
+
+    xs, ys = decimator.points()
+
+    assert xs == sorted(xs)
+    assert len(xs) <= 4 * 50
+    assert min(ys) == 0.0
+    assert max(ys) == 999.0
+
+def test_single_spike_survives():
+    decimator = MinMaxDecimator(target=10)
+    xs = list(range(10000))
+    ys = [0.0] * 10000
+    ys[6543] = 1000.0
+
+    decimator.extend(xs, ys)
+
+    assert (6543, 1000.0) in zip(*decimator.points())
+
+def test_same_x_keeps_both_extrema():
+    decimator = MinMaxDecimator(target=10)
+    decimator.append(1.0, 5.0)
+    decimator.append(1.0, -5.0)
+
+    assert decimator.points() == ([1.0, 1.0], [-5.0, 5.0])
+
+def test_gaps_are_skipped():
+    decimator = MinMaxDecimator(target=10)
+    decimator.append(0.0, 1.0)
+    decimator.append(5.0, 2.0)
+
+    assert len(decimator) == 6
+    assert decimator.points() == ([0.0, 5.0], [1.0, 2.0])
+
+def test_late_samples_go_into_last_bucket():
+    decimator = MinMaxDecimator(target=10)
+    decimator.append(3.0, 1.0)
+    decimator.append(1.0, 9.0)
+
+    assert len(decimator) == 1
+    assert decimator.points() == ([1.0, 3.0], [9.0, 1.0])
@@ -0,0 +1,164 @@
+import json
+
+from icarus import Icarus
+from events import (
+    EventEngine, GeofenceIndex, load_geofences, point_in_ring,
+    EVENT_LAUNCH, EVENT_BURST, EVENT_APOGEE, EVENT_LANDING, EVENT_FIX_LOST, EVENT_FIX_REGAINED,
+    EVENT_GEOFENCE_ENTER, EVENT_GEOFENCE_EXIT,
+)
+
+SQUARE = [[10.0, 50.0], [10.1, 50.0], [10.1, 50.1], [10.0, 50.1], [10.0, 50.0]]
+
+class Flight():
+    # Feeds samples of one device through an engine and collects the event types
+    def __init__(self, engine, id="1"):
+        self.engine = engine
+        self.device = Icarus(id, history_capacity=16)
+        self.timestamp = 0.0
+        self.events = []
+
+    def sample(self, altitude, vertical, fix=3, hdop=1.0, latitude=40.0, longitude=-110.0, dt=1.0, **telemetry):
+        self.timestamp += dt
+        telemetry.update(altitude=altitude, velocity_vertical=vertical, latitude=latitude, longitude=longitude)
+
+        if fix is not None:
+            telemetry.update(fix=fix, hdop=hdop)
+
+        self.device.update(telemetry, self.timestamp, self.timestamp)
+        events = self.engine.update(self.device, self.timestamp, fix is not None)
+        self.events.extend(events)
+
+        return [event["type"] for event in events]
+
+    def types(self):
+        return [event["type"] for event in self.events]
+
+def test_launch_from_the_ground():
+    flight = Flight(EventEngine(launch_altitude=50.0))
+
+    assert flight.sample(1000.0, 0.0) == []
+    assert flight.sample(1040.0, 5.0) == []
+    assert flight.sample(1060.0, 5.0) == [EVENT_LAUNCH]
+    assert flight.sample(1100.0, 5.0) == []
+
+def test_device_first_heard_climbing_raises_launch():
+    flight = Flight(EventEngine())
+
+    assert flight.sample(5000.0, 5.0) == [EVENT_LAUNCH]
+    assert flight.events[0]["detail"]
+
+def test_device_first_heard_descending_raises_nothing():
+    flight = Flight(EventEngine())
+
+    assert flight.sample(5000.0, -8.0) == []
+
+def test_burst_raises_apogee_and_burst():
+    flight = Flight(EventEngine(burst_rate=5.0, burst_window=30.0))
+    flight.sample(30000.0, 5.0)
+    flight.sample(30100.0, 5.0)
+
+    assert flight.sample(30050.0, -20.0) == [EVENT_APOGEE, EVENT_BURST]
+
+    apogee = flight.events[-2]
+    assert apogee["altitude"] == 30100.0
+    assert apogee["timestamp"] == 2.0
+
+def test_slow_float_raises_only_apogee():
+    flight = Flight(EventEngine(apogee_drop=100.0, burst_window=30.0))
+    flight.sample(20000.0, 3.0)
+
+    for step in range(100):
+        flight.sample(20000.0 - step * 2.0, -2.0)
+
+    assert flight.types() == [EVENT_LAUNCH, EVENT_APOGEE]
+
+def test_landing_after_holding_still():
+    flight = Flight(EventEngine(landing_rate=1.0, landing_time=30.0))
+    flight.sample(3000.0, -6.0)
+
+    for step in range(29):
+        flight.sample(1500.0, 0.0)
+
+    assert EVENT_LANDING not in flight.types()
+    assert flight.sample(1500.0, 0.0) == []
+    assert flight.sample(1500.0, 0.0) == [EVENT_LANDING]
+    assert flight.sample(1500.0, 0.0) == []
+
+def test_fix_lost_and_regained():
+    flight = Flight(EventEngine(max_hdop=5.0))
+
+    assert flight.sample(1000.0, 0.0) == []
+    assert flight.sample(1000.0, 0.0, hdop=9.0) == [EVENT_FIX_LOST]
+    assert flight.sample(1000.0, 0.0, fix=0) == []
+    assert flight.sample(1000.0, 0.0) == [EVENT_FIX_REGAINED]
+
+def test_flight_rules_wait_for_a_reported_fix():
+    flight = Flight(EventEngine())
+    flight.sample(1000.0, 0.0, fix=0)
+
+    assert flight.sample(1100.0, 5.0, fix=0) == []
+    assert flight.sample(1200.0, 5.0) == [EVENT_FIX_REGAINED, EVENT_LAUNCH]
+
+def test_device_without_fix_reports_still_gets_events():
+    flight = Flight(EventEngine())
+
+    assert flight.sample(1000.0, 0.0, fix=None) == []
+    assert flight.sample(1100.0, 5.0, fix=None) == [EVENT_LAUNCH]
+
+def test_out_of_order_samples_are_ignored():
+    flight = Flight(EventEngine())
+    flight.sample(1000.0, 0.0)
+
+    assert flight.sample(1100.0, 5.0, dt=-0.5) == []
+    assert flight.engine.update(flight.device, 0.5) == []
+
+def test_restored_launch_is_not_raised_again():
+    engine = EventEngine()
+    engine.restore({"id": "1", "type": EVENT_LAUNCH})
+    flight = Flight(engine)
+
+    assert flight.sample(5000.0, 5.0) == []
+
+def test_geofence_enter_and_exit():
+    geofences = GeofenceIndex()
+    geofences.add("pad", [SQUARE])
+    flight = Flight(EventEngine(geofences))
+
+    assert flight.sample(1000.0, 0.0, latitude=49.9, longitude=10.05) == []
+    assert flight.sample(1000.0, 0.0, latitude=50.05, longitude=10.05) == [EVENT_GEOFENCE_ENTER]
+    assert flight.events[-1]["detail"] == "pad"
+    assert flight.sample(1000.0, 0.0, latitude=50.06, longitude=10.05) == []
+    assert flight.sample(1000.0, 0.0, latitude=50.2, longitude=10.05) == [EVENT_GEOFENCE_EXIT]
+
+def test_point_in_ring():
+    assert point_in_ring(50.05, 10.05, SQUARE)
+    assert not point_in_ring(50.15, 10.05, SQUARE)
+
+def test_geofence_index_holes_and_cells():
+    hole = [[10.04, 50.04], [10.06, 50.04], [10.06, 50.06], [10.04, 50.06], [10.04, 50.04]]
+    geofences = GeofenceIndex(cell_size=0.01)
+    geofences.add("ring", [SQUARE, hole])
+    geofences.add("far", [[[20.0, 60.0], [20.1, 60.0], [20.1, 60.1], [20.0, 60.0]]])
+
+    assert len(geofences) == 2
+    assert geofences.containing(50.01, 10.01) == {"ring"}
+    assert geofences.containing(50.05, 10.05) == set()
+    assert geofences.containing(60.01, 20.05) == {"far"}
+    assert geofences.containing(0.0, 0.0) == set()
+
+def test_load_geofences(tmp_path):
+    path = tmp_path / "geofences.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"name": "pad"}, "geometry": {"type": "Polygon", "coordinates": [SQUARE]}},
+        {"type": "Feature", "properties": {}, "geometry": {"type": "MultiPolygon", "coordinates": [
+            [[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 0.0]]],
+            [[[2.0, 2.0], [3.0, 2.0], [3.0, 3.0], [2.0, 2.0]]],
+        ]}},
+    ]}))
+
+    geofences = load_geofences(str(path))
+
+    assert len(geofences) == 3
+    assert geofences.containing(50.05, 10.05) == {"pad"}
+    assert geofences.containing(2.2, 2.8) == {"Geofence 2"}
+    assert len(load_geofences(str(tmp_path / "missing.geojson"))) == 0
@@ -0,0 +1,122 @@
+import csv
+import json
+import sqlite3
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+import export
+from icarus import Icarus
+from session_store import SessionStore, SAMPLE_STRUCT, INSERT_TELEMETRY
+
+def sample(index):
+    values = dict.fromkeys(Icarus.FIELDS, 0.0)
+    values.update(latitude=50.0 + index * 1e-4, longitude=10.0 + index * 1e-4, altitude=100.0 + index, fix=3.0)
+    return values
+
+def insert(path, id, start, count):
+    # Stands in for the session writer thread
+    connection = sqlite3.connect(path)
+
+    with connection:
+        connection.executemany(INSERT_TELEMETRY, [
+            (id, 1000.0 + index, 1000.0 + index, index, SAMPLE_STRUCT.pack(*(sample(index)[field] for field in Icarus.FIELDS)))
+            for index in range(start, start + count)
+        ])
+        connection.execute(
+            "INSERT INTO devices (id, first_received, last_received, samples) VALUES (?, 0, 0, ?) "
+            "ON CONFLICT (id) DO UPDATE SET samples = samples + excluded.samples",
+            (id, count)
+        )
+
+    connection.close()
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / "session.sqlite")
+    store = SessionStore(path)
+    insert(path, "1", 0, 300)
+    insert(path, "2", 0, 200)
+
+    yield store
+
+    store.close()
+
+def parse(format, path):
+    # Per device: (timestamps, positions) as read back from the file
+    if format == "csv":
+        with open(path, newline="") as file:
+            rows = list(csv.DictReader(file))
+
+        return {id: ([row["timestamp"] for row in rows if row["id"] == id], [row["latitude"] for row in rows if row["id"] == id]) for id in ("1", "2")}
+
+    if format == "geojson":
+        with open(path) as file:
+            features = json.load(file)["features"]
+
+        return {feature["properties"]["id"]: (feature["properties"]["times"], feature["geometry"]["coordinates"]) for feature in features}
+
+    root = ElementTree.parse(path).getroot()
+
+    if format == "gpx":
+        namespace = {"gpx": "http://www.topografix.com/GPX/1/1"}
+
+        return {
+            track.find("gpx:name", namespace).text: (
+                [point.find("gpx:time", namespace).text for point in track.iter("{http://www.topografix.com/GPX/1/1}trkpt")],
+                [point.get("lat") for point in track.iter("{http://www.topografix.com/GPX/1/1}trkpt")]
+            )
+            for track in root.iter("{http://www.topografix.com/GPX/1/1}trk")
+        }
+
+    namespace = {"kml": "http://www.opengis.net/kml/2.2", "gx": "http://www.google.com/kml/ext/2.2"}
+
+    return {
+        placemark.find("kml:name", namespace).text: (
+            [when.text for when in placemark.iter("{http://www.opengis.net/kml/2.2}when")],
+            [coord.text for coord in placemark.iter("{http://www.google.com/kml/ext/2.2}coord")]
+        )
+        for placemark in root.iter("{http://www.opengis.net/kml/2.2}Placemark")
+    }
+
+@pytest.mark.parametrize("format", sorted(export.FORMATS))
+def test_round_trip(store, tmp_path, format):
+    path = str(tmp_path / ("out" + export.FORMATS[format][0]))
+
+    assert export.export(store, ["1", "2"], path, format) == 500
+
+    devices = parse(format, path)
+
+    assert [len(devices[id][0]) for id in ("1", "2")] == [300, 200]
+    assert [len(devices[id][1]) for id in ("1", "2")] == [300, 200]
+
+@pytest.mark.parametrize("format", sorted(export.FORMATS))
+def test_samples_stored_during_the_export_are_left_out(store, tmp_path, monkeypatch, format):
+    monkeypatch.setattr(export, "PROGRESS_INTERVAL", 50)
+    path = str(tmp_path / ("out" + export.FORMATS[format][0]))
+    written = [300]
+    reports = []
+
+    def progress(done, total):
+        reports.append((done, total))
+        insert(store._path, "1", written[0], 100)
+        written[0] += 100
+
+    assert export.export(store, ["1", "2"], path, format, progress) == 500
+
+    devices = parse(format, path)
+
+    assert written[0] > 300
+    assert [len(devices[id][0]) for id in ("1", "2")] == [300, 200]
+    assert [len(devices[id][1]) for id in ("1", "2")] == [300, 200]
+    assert reports[-1][0] == reports[-1][1] == 500 * export.FORMATS[format][2]
+
+def test_cancel_removes_the_partial_file(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "PROGRESS_INTERVAL", 50)
+    path = tmp_path / "out.csv"
+
+    with pytest.raises(export.ExportCancelled):
+        export.export(store, ["1", "2"], str(path), "csv", cancelled=lambda: True)
+
+    assert not path.exists()
+    assert not (tmp_path / "out.csv.part").exists()
@@ -0,0 +1,78 @@
+import json
+
+from fusion import TelemetryFusion
+from mqtt_ingest import decode_json_telemetry
+from shared_ring import SharedRecordRing
+from link_log import LINK_SERIAL, LINK_MQTT
+
+def packet(sequence, timestamp, id="1"):
+    return {"id": id, "sequence": sequence, "timestamp": timestamp, "received": timestamp}
+
+def test_duplicates_are_released_once():
+    fusion = TelemetryFusion(reorder_delay=0.5)
+
+    released = fusion.submit(LINK_SERIAL, [packet(1, 1.0), packet(2, 2.0)], 2.0)
+    released += fusion.submit(LINK_MQTT, [packet(1, 1.0), packet(2, 2.0)], 2.0)
+
+    assert [record["sequence"] for record in released] == [1, 2]
+    assert fusion.duplicates == 2
+
+def test_restart_below_window_is_detected():
+    fusion = TelemetryFusion(window=1024, reorder_delay=0.5)
+
+    fusion.submit(LINK_SERIAL, [packet(sequence, float(sequence)) for sequence in range(500)], 500.0)
+
+    # Rebooted, counting from 0 again with newer timestamps
+    released = fusion.submit(LINK_SERIAL, [packet(sequence, 1000.0 + sequence) for sequence in range(10)], 1010.0)
+
+    assert [record["sequence"] for record in released] == list(range(10))
+    assert fusion.link(LINK_SERIAL).lost == 0
+
+def test_late_packet_is_not_a_restart():
+    fusion = TelemetryFusion(reorder_delay=0.5)
+
+    fusion.submit(LINK_SERIAL, [packet(1, 1.0), packet(3, 3.0)], 3.0)
+    released = fusion.submit(LINK_MQTT, [packet(2, 2.0)], 3.1)
+
+    assert [record["sequence"] for record in released] == [2, 3]
+
+def test_removed_device_has_no_stale_loss():
+    fusion = TelemetryFusion(reorder_delay=0.5)
+
+    fusion.submit(LINK_SERIAL, [packet(100, 1.0)], 1.0)
+    fusion.remove("1")
+    fusion.submit(LINK_SERIAL, [packet(5, 2.0)], 2.0)
+
+    assert fusion.link(LINK_SERIAL).lost == 0
+
+def test_arrivals_stay_bounded():
+    fusion = TelemetryFusion(window=64, reorder_delay=0.5)
+
+    for sequence in range(1000):
+        fusion.submit(LINK_SERIAL, [packet(sequence, float(sequence))], float(sequence))
+
+    device = fusion._devices["1"]
+
+    assert len(device.arrivals) <= 65
+    assert len(device.arrival_order) == len(device.arrivals)
+
+def test_copy_without_device_timestamp_is_a_duplicate():
+    fusion = TelemetryFusion(reorder_delay=0.5)
+
+    released = fusion.submit(LINK_SERIAL, [packet(9, 9.0), packet(10, 10.0)], 10.0)
+
+    # The cellular copies carry no timestamp, the decoder fills in the receive time
+    copies = [decode_json_telemetry("icarus/1/telemetry", json.dumps({"sequence": sequence}).encode()) for sequence in (9, 10)]
+    released += fusion.submit(LINK_MQTT, copies, 10.1)
+
+    assert [record["sequence"] for record in released] == [9, 10]
+    assert fusion.duplicates == 2
+
+def test_estimated_timestamp_survives_the_shared_ring():
+    ring = SharedRecordRing(capacity=4)
+
+    try:
+        ring.write(LINK_MQTT, decode_json_telemetry("icarus/1/telemetry", json.dumps({"sequence": 9}).encode()))
+        assert ring.read()[0][1]["timestamp_estimated"]
+    finally:
+        ring.close()
@@ -0,0 +1,59 @@
+import os
+import time
+import threading
+import multiprocessing
+
+import pytest
+
+pytest.importorskip("serial")
+pytest.importorskip("paho.mqtt.client")
+
+from ingest_process import ingest_main
+from link_log import LinkLog, LINK_SERIAL
+from shared_ring import SharedRecordRing
+
+def test_orphaned_process_spools_to_a_link_log(tmp_path):
+    master, slave = os.openpty()
+    ring = SharedRecordRing(capacity=64)
+    connection, child_connection = multiprocessing.Pipe()
+    orphan_path = str(tmp_path / "orphan.icarus")
+
+    settings = {
+        "recorder_path": None,
+        "orphan_path": orphan_path,
+        "batch_interval": 0.01,
+        "routes": [],
+        "ack_topic": "icarus/+/ack",
+        "orphan_timeout": 1.0,
+    }
+
+    thread = threading.Thread(target=ingest_main, args=(ring.name, child_connection, settings), daemon=True)
+    thread.start()
+
+    try:
+        connection.send(("serial_open", os.ttyname(slave), 115200))
+        assert connection.poll(5.0)
+        assert connection.recv()[0] == "serial_opened"
+
+        # Attached, nothing is spooled
+        os.write(master, b"attached")
+        time.sleep(0.2)
+        assert not os.path.exists(orphan_path)
+
+        # The GUI goes away, from now on the links go to the orphan log
+        connection.close()
+        time.sleep(0.2)
+        os.write(master, b"orphaned")
+
+        thread.join(5.0)
+        assert not thread.is_alive()
+
+        log = LinkLog(orphan_path)
+        data = b"".join(bytes(payload) for timestamp, link, topic, payload in log if link == LINK_SERIAL)
+        log.close()
+
+        assert data == b"orphaned"
+    finally:
+        os.close(master)
+        os.close(slave)
+        ring.close()
@@ -0,0 +1,65 @@
+import random
+
+from instrumentation import LatencyHistogram, bucket_index, bucket_highest, HIGHEST_VALUE
+
+def exact_percentile(values, percent):
+    values = sorted(values)
+    return values[int(max(1, -(-len(values) * percent // 100))) - 1]
+
+def test_buckets_are_contiguous_and_within_one_percent():
+    # Every value lands in the bucket whose range holds it, and a bucket is
+    # never wider than 1% of the values in it
+    previous = -1
+
+    for index in range(bucket_index(HIGHEST_VALUE) + 1):
+        highest = bucket_highest(index)
+        lowest = previous + 1
+
+        assert bucket_index(lowest) == index
+        assert bucket_index(highest) == index
+        assert highest - lowest <= lowest * 0.01
+
+        previous = highest
+
+def test_percentiles_within_one_percent():
+    random.seed(14)
+    histogram = LatencyHistogram()
+
+    # Log-uniform from 10 us to 100 s
+    values = [10 ** random.uniform(-5, 2) for sample in range(50000)]
+
+    for value in values:
+        histogram.record(value)
+
+    for percent in (1, 10, 50, 90, 99, 99.9, 100):
+        exact = int(exact_percentile(values, percent) * 1000000) / 1000000
+        measured = histogram.percentile(percent)
+
+        assert exact <= measured <= exact * 1.01
+
+def test_summary_values():
+    histogram = LatencyHistogram()
+
+    assert histogram.percentile(50) is None
+    assert histogram.min is None
+
+    for value in (0.001, 0.002, 0.003):
+        histogram.record(value)
+
+    assert histogram.count == 3
+    assert histogram.min == 0.001
+    assert histogram.max == 0.003
+    assert abs(histogram.mean - 0.002) < 1e-9
+    assert histogram.percentile(100) == 0.003
+
+    histogram.reset()
+
+    assert len(histogram) == 0
+
+def test_values_are_clamped():
+    histogram = LatencyHistogram()
+    histogram.record(-1.0)
+    histogram.record(7200.0)
+
+    assert histogram.min == 0.0
+    assert histogram.max == HIGHEST_VALUE / 1000000
@@ -0,0 +1,124 @@
+import json
+import math
+import base64
+from array import array
+
+import map_transport
+
+def unpack(typecode, data):
+    values = array(typecode)
+    values.frombytes(base64.b64decode(data))
+
+    return values
+
+def unpack_trails(ids, counts, coordinates):
+    counts = unpack("I", counts)
+    data = base64.b64decode(coordinates)
+    origin = array("d")
+    origin.frombytes(data[:16])
+    offsets = array("f")
+    offsets.frombytes(data[16:])
+
+    trails = {}
+    offset = 0
+
+    for id, count in zip(ids, counts):
+        trails[id] = [[origin[0] + offsets[offset + 2 * i], origin[1] + offsets[offset + 2 * i + 1]] for i in range(count)]
+        offset += 2 * count
+
+    return trails
+
+def test_pack_trails_round_trip():
+    trails = {
+        "ICARUS-1": [[34.052235 + i * 1e-5, -118.243683 - i * 2e-5] for i in range(500)],
+        "ICARUS-2": [[35.1, -117.9]],
+        "ICARUS-3": []
+    }
+
+    decoded = unpack_trails(*map_transport.pack_trails(trails))
+
+    assert list(decoded) == list(trails)
+
+    for id in trails:
+        assert len(decoded[id]) == len(trails[id])
+
+        for (latitude, longitude), (expected_latitude, expected_longitude) in zip(decoded[id], trails[id]):
+            # Float32 offsets within a degree of the origin, well under a centimetre
+            assert abs(latitude - expected_latitude) < 1e-7
+            assert abs(longitude - expected_longitude) < 1e-7
+
+def test_pack_trails_empty():
+    ids, counts, coordinates = map_transport.pack_trails({})
+
+    assert ids == []
+    assert unpack("I", counts) == array("I")
+    assert len(base64.b64decode(coordinates)) == 16
+
+def test_pack_trails_smaller_than_json():
+    trails = {"ICARUS-%d" % d: [[34.05 + i * 1e-5, -118.24 - i * 1e-5] for i in range(10000)] for d in range(4)}
+
+    packed = sum(map(len, map_transport.pack_trails(trails)[1:]))
+
+    assert packed < len(json.dumps(trails)) / 2
+
+def test_pack_devices_unchanged_is_nan():
+    ids, coordinates = map_transport.pack_devices({
+        "ICARUS-1": {"latitude": 34.052235, "longitude": -118.243683},
+        "ICARUS-2": {"latitude": 35.5},
+        "ICARUS-3": {}
+    })
+
+    coordinates = unpack("d", coordinates)
+
+    assert ids == ["ICARUS-1", "ICARUS-2", "ICARUS-3"]
+    assert coordinates[0] == 34.052235
+    assert coordinates[1] == -118.243683
+    assert coordinates[2] == 35.5
+    assert math.isnan(coordinates[3])
+    assert math.isnan(coordinates[4])
+    assert math.isnan(coordinates[5])
+
+def test_encode_call_trails():
+    trails = {"ICARUS-1": [[34.0, -118.0], [34.1, -118.1]]}
+
+    transport, arguments = map_transport.encode_call("icarusTrailReplace", trails)
+
+    assert transport == map_transport.TRANSPORT_TRAILS
+    assert arguments[0] is True
+
+    latitude, longitude = unpack_trails(*arguments[1:])["ICARUS-1"][1]
+
+    assert abs(latitude - 34.1) < 1e-7
+    assert abs(longitude + 118.1) < 1e-7
+
+    transport, arguments = map_transport.encode_call("icarusTrailAppend", trails)
+
+    assert transport == map_transport.TRANSPORT_TRAILS
+    assert arguments[0] is False
+    assert arguments[1] == ["ICARUS-1"]
+
+def test_encode_call_devices():
+    transport, arguments = map_transport.encode_call("icarusDeviceUpdate", {"ICARUS-1": {"longitude": -118.0}})
+
+    assert transport == map_transport.TRANSPORT_DEVICES
+    assert arguments[0] == ["ICARUS-1"]
+
+    coordinates = unpack("d", arguments[1])
+
+    assert math.isnan(coordinates[0])
+    assert coordinates[1] == -118.0
+
+def test_encode_call_falls_back_to_json():
+    # Fields outside the packed layout go as JSON, as do other functions
+    payload = {"ICARUS-1": {"latitude": 34.0, "altitude": 1200.0}}
+
+    transport, arguments = map_transport.encode_call("icarusDeviceUpdate", payload)
+
+    assert transport == map_transport.TRANSPORT_CALL
+    assert arguments[0] == "icarusDeviceUpdate"
+    assert json.loads(arguments[1]) == payload
+
+    transport, arguments = map_transport.encode_call("icarusSetView", [34.0, -118.0, 12])
+
+    assert transport == map_transport.TRANSPORT_CALL
+    assert json.loads(arguments[1]) == [34.0, -118.0, 12]
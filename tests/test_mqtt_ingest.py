@@ -0,0 +1,83 @@
+import json
+
+from fusion import TelemetryFusion
+from link_log import LINK_MQTT
+from mqtt_ingest import MqttIngest, decode_json_telemetry, coalesce
+
+TOPIC = "icarus/balloon-a/telemetry"
+
+def ingest():
+    mqtt_ingest = MqttIngest()
+    mqtt_ingest.add_route("icarus/+/telemetry", decode_json_telemetry)
+    return mqtt_ingest
+
+def test_null_field_is_undecoded():
+    mqtt_ingest = ingest()
+
+    assert not mqtt_ingest.submit(TOPIC, json.dumps({"latitude": None}))
+    assert mqtt_ingest.undecoded == 1
+    assert mqtt_ingest.depth() == 0
+
+def test_non_numeric_string_field_is_undecoded():
+    mqtt_ingest = ingest()
+
+    assert not mqtt_ingest.submit(TOPIC, json.dumps({"altitude": "high"}))
+    assert mqtt_ingest.undecoded == 1
+
+def test_numeric_string_field_is_converted():
+    record = decode_json_telemetry(TOPIC, json.dumps({"altitude": "123", "fix": 3.0, "sequence": 7, "timestamp": "10.5"}))
+
+    assert record["altitude"] == 123.0
+    assert record["fix"] == 3 and isinstance(record["fix"], int)
+    assert record["sequence"] == 7
+    assert record["timestamp"] == 10.5
+
+def test_invalid_timestamp_and_sequence_are_undecoded():
+    mqtt_ingest = ingest()
+
+    assert not mqtt_ingest.submit(TOPIC, json.dumps({"timestamp": None}))
+    assert not mqtt_ingest.submit(TOPIC, json.dumps({"sequence": 1.5}))
+    assert not mqtt_ingest.submit(TOPIC, json.dumps({"latitude": True}))
+    assert mqtt_ingest.undecoded == 3
+
+def test_missing_fields_are_left_out():
+    mqtt_ingest = ingest()
+
+    assert mqtt_ingest.submit(TOPIC, json.dumps({"latitude": 51.5}))
+
+    record, = mqtt_ingest.drain()
+
+    assert record["id"] == "balloon-a"
+    assert record["latitude"] == 51.5
+    assert "altitude" not in record
+    assert isinstance(record["timestamp"], float)
+
+def test_drain_coalesces_per_device():
+    mqtt_ingest = ingest()
+
+    for sequence in range(3):
+        mqtt_ingest.submit(TOPIC, json.dumps({"sequence": sequence, "timestamp": sequence}))
+
+    assert [record["sequence"] for record in mqtt_ingest.drain()] == [2]
+
+def test_drain_without_coalescing_keeps_every_record():
+    mqtt_ingest = MqttIngest(coalesce=False)
+    mqtt_ingest.add_route("icarus/+/telemetry", decode_json_telemetry)
+
+    for sequence in range(3):
+        mqtt_ingest.submit(TOPIC, json.dumps({"sequence": sequence, "timestamp": sequence}))
+
+    assert [record["sequence"] for record in mqtt_ingest.drain()] == [0, 1, 2]
+
+def test_coalescing_after_fusion_keeps_loss_exact():
+    mqtt_ingest = MqttIngest(coalesce=False)
+    mqtt_ingest.add_route("icarus/+/telemetry", decode_json_telemetry)
+    fusion = TelemetryFusion(reorder_delay=0.0)
+
+    for sequence in range(5):
+        mqtt_ingest.submit(TOPIC, json.dumps({"sequence": sequence, "timestamp": sequence}))
+
+    released = coalesce(fusion.submit(LINK_MQTT, mqtt_ingest.drain(), 10.0))
+
+    assert [record["sequence"] for record in released] == [4]
+    assert fusion.link(LINK_MQTT).lost == 0
@@ -0,0 +1,129 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("PyQt5")
+serial = pytest.importorskip("serial")
+
+import port_watcher
+from port_watcher import SerialPortWatcher, port_identity
+
+class Radios():
+    # Stand-in /dev with ttyUSB0 pointing at a pty, and what pyserial would list for it
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, "ttyUSB0")
+        self.listed = []
+        self.ptys = []
+        self.enumerations = 0
+
+    def plug(self, serial_number):
+        master, slave = os.openpty()
+        self.ptys.append((master, slave))
+        os.symlink(os.ttyname(slave), self.path)
+
+        self.listed = [{
+            "device": self.path,
+            "description": "CP2102 USB to UART",
+            "hwid": "USB VID:PID=10C4:EA60 SER=" + serial_number,
+            "vid": 0x10C4,
+            "pid": 0xEA60,
+            "serial_number": serial_number,
+            "location": "1-1",
+            "label": "CP2102 USB to UART (" + self.path + ")",
+        }]
+
+        return master
+
+    def unplug(self):
+        os.unlink(self.path)
+        self.listed = []
+
+    def list_ports(self):
+        self.enumerations += 1
+
+        return [dict(port) for port in self.listed]
+
+    def close(self):
+        for master, slave in self.ptys:
+            os.close(master)
+            os.close(slave)
+
+@pytest.fixture
+def radios(tmp_path, monkeypatch):
+    monkeypatch.setattr(port_watcher, "DEV_DIRECTORY", str(tmp_path))
+
+    radios = Radios(str(tmp_path))
+    yield radios
+    radios.close()
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_replug_under_same_name_refreshes_metadata(radios):
+    watcher = SerialPortWatcher()
+    watcher.list_ports = radios.list_ports
+
+    added = []
+    watcher.ports_added.connect(added.extend)
+
+    radios.plug("RADIO-A")
+    watcher.scan()
+
+    assert [port["serial_number"] for port in added] == ["RADIO-A"]
+
+    # Nothing changed in /dev, no enumeration
+    watcher.scan()
+    assert radios.enumerations == 1
+
+    # Another radio under the same name between two polls
+    radios.unplug()
+    radios.plug("RADIO-B")
+    watcher.scan()
+
+    assert radios.enumerations == 2
+    assert [port["serial_number"] for port in added] == ["RADIO-A", "RADIO-B"]
+    assert watcher.find(port_identity(added[0])) is None
+    assert watcher.find(port_identity(added[1]))["device"] == radios.path
+
+def test_reconnect_after_replug(radios):
+    watcher = SerialPortWatcher(interval=10.0, fast_interval=0.02)
+    watcher.list_ports = radios.list_ports
+
+    added = []
+    removed = []
+    watcher.ports_added.connect(added.extend)
+    watcher.ports_removed.connect(removed.extend)
+
+    radios.plug("RADIO-A")
+    watcher.start()
+
+    try:
+        wait_for(lambda: added)
+        identity = watcher.identity(radios.path)
+
+        # Unplugged while waiting for it to come back
+        watcher.set_fast(True)
+        radios.unplug()
+        wait_for(lambda: removed)
+
+        assert watcher.find(identity) is None
+
+        # The same radio comes back, found by identity and opened again
+        master = radios.plug("RADIO-A")
+        wait_for(lambda: watcher.find(identity) is not None)
+
+        client = serial.Serial(watcher.find(identity)["device"], 115200, timeout=1.0)
+
+        try:
+            os.write(master, b"telemetry")
+            assert client.read(9) == b"telemetry"
+        finally:
+            client.close()
+    finally:
+        watcher.stop()
@@ -0,0 +1,72 @@
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from prediction import LandingPredictor, _simulate_chunk, landing_ellipse, wind_profile, METRES_PER_DEGREE
+from telemetry_history import TelemetryHistory
+
+FIELDS = ("altitude", "velocity_vertical", "velocity_horizontal", "course")
+
+class Device():
+    # What the predictor reads of a fleet device: latest telemetry and history
+    def __init__(self):
+        self.history = TelemetryHistory(FIELDS, capacity=1000)
+
+        # Ascending at 5 m/s through a wind veering with altitude
+        for second in range(0, 4000, 10):
+            self.history.append(float(second), {
+                "altitude": 1400.0 + 5.0 * second,
+                "velocity_vertical": 5.0,
+                "velocity_horizontal": 10.0 + second / 200.0,
+                "course": (90.0 + second / 40.0) % 360.0,
+            })
+
+        self.telemetry = {
+            "latitude": 34.0,
+            "longitude": -118.0,
+            "altitude": self.history.latest("altitude"),
+            "velocity_vertical": 5.0,
+        }
+
+def predict(seed, workers=2):
+    predictor = LandingPredictor(samples=400, workers=workers, burst_altitude=25000.0, ground_altitude=1400.0, seed=seed)
+
+    try:
+        return [predictor.predict(Device()).result(60) for prediction in range(2)]
+    finally:
+        predictor.shutdown()
+
+def test_chunk_is_deterministic_for_a_seed():
+    device = Device()
+    predictor = LandingPredictor(burst_altitude=25000.0, ground_altitude=1400.0)
+    arguments = (predictor.state(device), wind_profile(device.history), 200, 1500.0, 0.1, 3)
+
+    first = _simulate_chunk(arguments)
+    second = _simulate_chunk(arguments)
+
+    assert np.array_equal(first[0], second[0])
+    assert np.array_equal(first[1], second[1])
+
+def test_ellipse_is_deterministic_for_a_seed():
+    first = predict(5)
+
+    assert predict(5) == first
+    assert first[0] != first[1]
+    assert predict(6) != first
+
+def test_ellipse_holds_95_percent():
+    random = np.random.default_rng(1)
+    east = random.normal(0.0, 3000.0, 20000)
+    north = random.normal(0.0, 1000.0, 20000)
+    scale = METRES_PER_DEGREE * math.cos(math.radians(34.0))
+
+    ellipse = landing_ellipse(34.0 + north / METRES_PER_DEGREE, -118.0 + east / scale)
+
+    assert ellipse["semi_major"] == pytest.approx(math.sqrt(5.991) * 3000.0, rel=0.05)
+    assert ellipse["semi_minor"] == pytest.approx(math.sqrt(5.991) * 1000.0, rel=0.05)
+
+    inside = (east / ellipse["semi_major"]) ** 2 + (north / ellipse["semi_minor"]) ** 2 <= 1.0
+
+    assert np.mean(inside) == pytest.approx(0.95, abs=0.01)
@@ -0,0 +1,78 @@
+from protocol import FrameDecoder, FRAME_SYNC, FRAME_PAYLOAD_MAX, encode_frame, encode_telemetry, decode_payload
+
+def telemetry_frame(id, sequence):
+    return encode_frame(encode_telemetry({"id": id, "sequence": sequence, "timestamp": 1700000000.0 + sequence, "latitude": 34.05, "longitude": -118.24, "fix": 3}))
+
+def test_frames_split_at_every_byte():
+    frames = [telemetry_frame(1, sequence) for sequence in range(5)]
+    stream = b"".join(frames)
+    decoder = FrameDecoder()
+    payloads = []
+
+    for index in range(len(stream)):
+        payloads += decoder.feed(stream[index:index + 1])
+
+    assert [decode_payload(payload)["sequence"] for payload in payloads] == list(range(5))
+    assert decoder.frames == 5
+    assert decoder.crc_errors == 0
+    assert decoder.bytes_discarded == 0
+
+def test_crc_error_skips_frame():
+    corrupt = bytearray(telemetry_frame(1, 1))
+    corrupt[10] ^= 0xFF
+
+    decoder = FrameDecoder()
+    payloads = decoder.feed(telemetry_frame(1, 0) + bytes(corrupt) + telemetry_frame(1, 2))
+
+    assert [decode_payload(payload)["sequence"] for payload in payloads] == [0, 2]
+    assert decoder.crc_errors == 1
+
+def test_resync_after_garbage():
+    # Garbage including a stray first half of a sync word right before a frame
+    garbage = b"\x00\x13noise" + FRAME_SYNC[:1] + b"\xff" + FRAME_SYNC[:1]
+    decoder = FrameDecoder()
+
+    payloads = decoder.feed(garbage[:-1])
+    payloads += decoder.feed(garbage[-1:])
+    payloads += decoder.feed(telemetry_frame(7, 3))
+
+    assert [decode_payload(payload)["id"] for payload in payloads] == ["7"]
+    assert decoder.bytes_discarded == len(garbage)
+
+def test_false_sync_with_long_length_does_not_swallow_frames():
+    # A sync word in the noise announcing a maximum length frame, the real
+    # frames inside that length are found once its CRC fails
+    decoder = FrameDecoder()
+    frames = b"".join(telemetry_frame(1, sequence) for sequence in range(4))
+    stream = FRAME_SYNC + bytes((FRAME_PAYLOAD_MAX,)) + frames + b"\x00" * FRAME_PAYLOAD_MAX
+
+    payloads = decoder.feed(stream[:FRAME_PAYLOAD_MAX])
+
+    # Still waiting for the rest of the announced frame
+    assert payloads == []
+
+    payloads += decoder.feed(stream[FRAME_PAYLOAD_MAX:])
+
+    assert [decode_payload(payload)["sequence"] for payload in payloads] == [0, 1, 2, 3]
+    assert decoder.crc_errors == 1
+
+def test_pending_frame_over_max_buffer_is_dropped():
+    # A partial frame longer than the buffer limit is given up on
+    decoder = FrameDecoder(max_buffer=64)
+    pending = FRAME_SYNC + bytes((200,)) + b"\x00" * 100
+
+    assert decoder.feed(pending) == []
+    assert decoder.bytes_discarded == len(pending)
+
+    payloads = decoder.feed(telemetry_frame(1, 9))
+
+    assert [decode_payload(payload)["sequence"] for payload in payloads] == [9]
+
+def test_feed_accepts_memoryview():
+    buffer = bytearray(telemetry_frame(2, 4))
+    decoder = FrameDecoder()
+
+    payloads = decoder.feed(memoryview(buffer))
+    buffer[:] = b"\x00" * len(buffer)
+
+    assert decode_payload(payloads[0])["sequence"] == 4
@@ -0,0 +1,34 @@
+import os
+import configparser
+
+import headless
+from link_log import LinkRecorder, LINK_SERIAL, LINK_MQTT
+from synthetic import SyntheticFleet, serial_frame, mqtt_message
+
+def test_replay_at_full_speed_drops_nothing(tmp_path):
+    path = str(tmp_path / "flight.icarus")
+    recorder = LinkRecorder(path)
+    counts = {LINK_SERIAL: 0, LINK_MQTT: 0}
+
+    # More MQTT records than the ingest queue holds
+    for record in SyntheticFleet(20, 1.0).records(300.0):
+        if int(record["id"]) % 2:
+            recorder.record_serial(serial_frame(record), record["timestamp"])
+            counts[LINK_SERIAL] += 1
+        else:
+            recorder.record_mqtt(*mqtt_message(record), record["timestamp"])
+            counts[LINK_MQTT] += 1
+
+    recorder.close()
+
+    config = configparser.ConfigParser()
+    config.read(os.path.join(os.path.dirname(__file__), "..", "config.ini"))
+    config["MQTT"]["Queue Size"] = "1000"
+    ingest = headless.HeadlessIngest(config)
+
+    headless.run_replay(ingest, path, 0.0, tick_interval=0.2)
+
+    assert counts[LINK_MQTT] > int(config["MQTT"]["Queue Size"])
+    assert ingest.mqtt_ingest.dropped == 0
+    assert ingest.fusion.link(LINK_MQTT).received == counts[LINK_MQTT]
+    assert ingest.fusion.link(LINK_SERIAL).received == counts[LINK_SERIAL]
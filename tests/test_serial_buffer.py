@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+serial = pytest.importorskip("serial")
+
+from serial_buffer import SerialReadBuffer
+
+@pytest.fixture
+def port():
+    master, slave = os.openpty()
+    client = serial.Serial(os.ttyname(slave), 115200, timeout=0.05)
+
+    yield master, client
+
+    client.close()
+    os.close(master)
+    os.close(slave)
+
+def test_reads_everything_buffered_into_one_buffer(port):
+    master, client = port
+    buffer = SerialReadBuffer(size=64)
+
+    assert len(buffer.read(client)) == 0
+
+    os.write(master, b"first")
+    first = buffer.read(client)
+
+    assert bytes(first) == b"first"
+
+    os.write(master, b"second")
+    second = buffer.read(client)
+
+    assert bytes(second) == b"second"
+
+    # The same memory every time
+    assert first.obj is second.obj
+
+def test_read_is_capped_at_buffer_size(port):
+    master, client = port
+    buffer = SerialReadBuffer(size=16)
+    data = bytes(range(40))
+
+    os.write(master, data)
+    received = b""
+
+    while len(received) < len(data):
+        chunk = buffer.read(client)
+
+        assert len(chunk) <= 16
+
+        received += bytes(chunk)
+
+    assert received == data
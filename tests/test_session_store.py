@@ -0,0 +1,38 @@
+import time
+
+from icarus import Icarus
+from session_store import SessionStore
+
+def device(id="1", timestamp=1.0):
+    icarus = Icarus(id, history_capacity=16)
+    icarus.update({"latitude": 50.0, "longitude": 10.0}, timestamp, timestamp)
+    return icarus
+
+def test_pending_rows_are_bounded(tmp_path):
+    store = SessionStore(str(tmp_path / "session.sqlite"), batch_size=1000, flush_interval=60.0, max_pending=10)
+
+    for index in range(15):
+        store.record(device(timestamp=float(index)), index, float(index))
+
+    store.close()
+
+    assert store.dropped == 5
+    assert store.written == 10
+
+def test_writer_survives_a_failed_write(tmp_path):
+    store = SessionStore(str(tmp_path / "session.sqlite"), flush_interval=0.01)
+    store.record_event({"id": "1", "timestamp": 1.0, "type": "launch", "latitude": 0.0, "longitude": 0.0, "altitude": 0.0, "detail": object()})
+
+    deadline = time.time() + 5.0
+
+    while store.error is None and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert store.error is not None
+    assert store.dropped == 1
+
+    store.record(device(), 1, 1.0)
+    store.close()
+
+    assert store.error is None
+    assert store.written == 1
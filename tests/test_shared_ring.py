@@ -0,0 +1,45 @@
+from shared_ring import SharedRecordRing, ID_SIZE
+
+def test_ids_round_trip_without_truncation():
+    ring = SharedRecordRing(capacity=4)
+
+    try:
+        id = "balloon-" + "é" * 20
+        assert ring.write(0, {"id": id, "sequence": 7, "timestamp": 1.0, "received": 2.0})
+        assert ring.read() == [(0, {"id": id, "sequence": 7, "timestamp": 1.0, "received": 2.0})]
+    finally:
+        ring.close()
+
+def test_ids_too_long_are_rejected():
+    ring = SharedRecordRing(capacity=4)
+
+    try:
+        assert not ring.write(0, {"id": "x" * (ID_SIZE + 1)})
+        assert ring.rejected == 1
+        assert ring.read() == []
+    finally:
+        ring.close()
+
+def test_writer_lapping_the_reader_counts_lost_records():
+    ring = SharedRecordRing(capacity=8)
+    reader = SharedRecordRing(ring.name)
+
+    try:
+        for sequence in range(20):
+            ring.write(0, {"id": "1", "sequence": sequence})
+
+        records = reader.read()
+
+        assert [record["sequence"] for link, record in records] == list(range(12, 20))
+        assert reader.lost == 12
+
+        # Caught up, a partial read leaves the rest for the next one
+        for sequence in range(20, 25):
+            ring.write(0, {"id": "1", "sequence": sequence})
+
+        assert [record["sequence"] for link, record in reader.read(3)] == [20, 21, 22]
+        assert [record["sequence"] for link, record in reader.read()] == [23, 24]
+        assert reader.lost == 12
+    finally:
+        reader.close()
+        ring.close()
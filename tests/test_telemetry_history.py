@@ -0,0 +1,96 @@
+import pytest
+
+from telemetry_history import TelemetryHistory
+
+FIELDS = ("altitude", "temperature")
+
+def sample(index):
+    return {"altitude": 100.0 * index, "temperature": -float(index)}
+
+def filled(capacity, count):
+    history = TelemetryHistory(FIELDS, capacity)
+
+    for index in range(count):
+        history.append(float(index), sample(index))
+
+    return history
+
+def test_views_are_contiguous_after_wrapping():
+    history = filled(8, 21)
+
+    assert len(history) == 8
+    assert history.appended == 21
+    assert list(history.timestamps()) == [float(index) for index in range(13, 21)]
+    assert list(history.view("altitude")) == [100.0 * index for index in range(13, 21)]
+    assert list(history.view("temperature")) == [-float(index) for index in range(13, 21)]
+    assert history.latest("altitude") == 2000.0
+    assert history.latest_timestamp() == 20.0
+
+def test_views_alias_storage():
+    # No copies, a view shows whatever was written over the samples it covers
+    history = filled(4, 4)
+    view = history.view("altitude")
+
+    assert list(view) == [0.0, 100.0, 200.0, 300.0]
+
+    for index in range(4, 8):
+        history.append(float(index), sample(index))
+
+    assert list(view) == [400.0, 500.0, 600.0, 700.0]
+
+def test_time_range():
+    history = filled(8, 20)
+
+    assert list(history.timestamps(14.5, 17.0)) == [15.0, 16.0, 17.0]
+    assert list(history.view("altitude", 14.5, 17.0)) == [1500.0, 1600.0, 1700.0]
+    assert list(history.timestamps(end_time=13.0)) == [12.0, 13.0]
+    assert list(history.timestamps(start_time=30.0)) == []
+
+def test_last():
+    history = filled(8, 11)
+
+    assert list(history.last("altitude", 3)) == [800.0, 900.0, 1000.0]
+    assert list(history.last_timestamps(3)) == [8.0, 9.0, 10.0]
+    assert len(history.last("altitude", 100)) == 8
+
+@pytest.mark.parametrize("existing, count", [(0, 5), (3, 5), (6, 20), (7, 8), (2, 0)])
+def test_extend_matches_append(existing, count):
+    expected = filled(8, existing + count)
+    history = filled(8, existing)
+
+    timestamps = [float(index) for index in range(existing, existing + count)]
+    history.extend(timestamps, {field: [sample(index)[field] for index in range(existing, existing + count)] for field in FIELDS})
+
+    assert len(history) == len(expected)
+    assert history.appended == expected.appended
+    assert list(history.timestamps()) == list(expected.timestamps())
+
+    for field in FIELDS:
+        assert list(history.view(field)) == list(expected.view(field))
+
+    # Appending carries on from the same slot
+    history.append(100.0, sample(100))
+    expected.append(100.0, sample(100))
+
+    assert list(history.view("altitude")) == list(expected.view("altitude"))
+
+def test_empty():
+    history = TelemetryHistory(FIELDS, 4)
+
+    with pytest.raises(IndexError):
+        history.latest("altitude")
+
+    with pytest.raises(IndexError):
+        history.latest_timestamp()
+
+    assert list(history.view("altitude")) == []
+
+    history = filled(4, 6)
+    history.clear()
+
+    assert len(history) == 0
+    assert list(history.timestamps()) == []
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        TelemetryHistory(FIELDS, 0)
@@ -0,0 +1,129 @@
+import threading
+import http.server
+
+import pytest
+
+import tile_cache
+from tile_cache import TileCache, tiles_around
+
+TILE_SIZE = 1000
+
+class TileHandler(http.server.BaseHTTPRequestHandler):
+    # Stand-in tile server, a tile's body names it. Paths in failing are answered 500.
+    requests = []
+    failing = set()
+
+    def do_GET(self):
+        self.requests.append(self.path)
+
+        if self.path in self.failing:
+            self.send_error(500)
+            return
+
+        body = self.path.encode().ljust(TILE_SIZE, b"\0")
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *arguments):
+        pass
+
+@pytest.fixture
+def server():
+    TileHandler.requests = []
+    TileHandler.failing = set()
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), TileHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield "http://127.0.0.1:" + str(server.server_address[1]) + "/{z}/{x}/{y}.png"
+
+    server.shutdown()
+    server.server_close()
+
+def tile(zoom, x, y):
+    return ("/" + str(zoom) + "/" + str(x) + "/" + str(y) + ".png").encode().ljust(TILE_SIZE, b"\0")
+
+def test_miss_downloads_and_hit_is_served_from_the_cache(tmp_path, server):
+    cache = TileCache(str(tmp_path / "tiles.mbtiles"), server)
+
+    try:
+        assert cache.get(5, 1, 2) is None
+        assert cache.tile(5, 1, 2) == tile(5, 1, 2)
+        assert cache.tile(5, 1, 2) == tile(5, 1, 2)
+        assert TileHandler.requests == ["/5/1/2.png"]
+        assert (cache.hits, cache.misses) == (1, 2)
+        assert cache.contains(5, 1, 2)
+        assert cache.size == TILE_SIZE
+    finally:
+        cache.close()
+
+def test_cache_survives_reopening(tmp_path, server):
+    path = str(tmp_path / "tiles.mbtiles")
+    cache = TileCache(path, server)
+    cache.tile(3, 1, 1)
+    cache.close()
+
+    cache = TileCache(path, server)
+
+    try:
+        assert cache.get(3, 1, 1) == tile(3, 1, 1)
+        assert cache.size == TILE_SIZE
+    finally:
+        cache.close()
+
+def test_least_recently_used_tiles_are_evicted(tmp_path, server, monkeypatch):
+    times = iter(range(1, 1000))
+    monkeypatch.setattr(tile_cache.time, "time", lambda: float(next(times)))
+
+    cache = TileCache(str(tmp_path / "tiles.mbtiles"), server, byte_budget=100 * TILE_SIZE)
+
+    try:
+        for x in range(100):
+            cache.put(10, x, 0, tile(10, x, 0))
+
+        # Read recently, so kept although stored first
+        assert cache.get(10, 0, 0) is not None
+
+        cache.put(10, 100, 0, tile(10, 100, 0))
+
+        assert cache.size <= 100 * TILE_SIZE
+        assert cache.contains(10, 0, 0)
+        assert not cache.contains(10, 1, 0)
+        assert cache.contains(10, 100, 0)
+
+        with cache._lock:
+            stored = cache._database.execute("SELECT SUM(size) FROM tiles").fetchone()[0]
+
+        assert stored == cache.size
+    finally:
+        cache.close()
+
+def test_prefetch_downloads_missing_tiles_and_skips_failures(tmp_path, server, monkeypatch):
+    monkeypatch.setattr(tile_cache, "PREFETCH_BACKOFF", 0.001)
+    cache = TileCache(str(tmp_path / "tiles.mbtiles"), server)
+
+    try:
+        wanted = [(zoom, x, y) for zoom in (10, 11) for x, y in tiles_around(39.5, -119.8, 2000.0, zoom)]
+        cache.put(*wanted[0], tile(*wanted[0]))
+        TileHandler.failing = {"/{}/{}/{}.png".format(*wanted[1])}
+
+        assert cache.prefetch(39.5, -119.8, 2000.0, 10, 11) == len(wanted) - 2
+        assert not cache.contains(*wanted[1])
+        assert all(cache.contains(*entry) for entry in wanted[2:])
+        assert "/{}/{}/{}.png".format(*wanted[0]) not in TileHandler.requests
+    finally:
+        cache.close()
+
+def test_prefetch_stops_when_asked(tmp_path, server):
+    cache = TileCache(str(tmp_path / "tiles.mbtiles"), server)
+    stop = threading.Event()
+    stop.set()
+
+    try:
+        assert cache.prefetch(39.5, -119.8, 2000.0, 10, 11, stop) == 0
+        assert TileHandler.requests == []
+    finally:
+        cache.close()
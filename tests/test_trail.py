@@ -0,0 +1,57 @@
+from trail import Trail, ZOOM_LEVELS
+from map_payload import MapPayload
+
+def line(start, count):
+    return [[50.0 + 0.01 * i, 10.0 + 0.01 * (i % 7)] for i in range(start, start + count)]
+
+def test_raw_points_are_bounded():
+    trail = Trail("1", capacity=100)
+
+    for start in range(0, 1000, 10):
+        trail.append(line(start, 10))
+
+    assert len(trail) == 1000
+    assert len(trail.points()) <= 125
+    assert trail.points(990) == line(990, 10)
+
+def test_incremental_simplification_keeps_the_whole_trail():
+    trail = Trail("1", capacity=100)
+    count = 0
+
+    for start in range(0, 1000, 10):
+        trail.append(line(start, 10))
+        count = trail.simplify(18)
+
+    assert count > 125
+    assert trail.simplified(18)[-1] == line(999, 1)[0]
+
+def test_zoom_change_returns_the_cached_level():
+    payload = MapPayload(18, trail_capacity=1000)
+    payload.trail_append("1", line(0, 100))
+
+    appended = dict(payload.flush())["icarusTrailAppend"]["1"]
+
+    payload.zoom_changed(5)
+    replaced = dict(payload.flush())["icarusTrailReplace"]["1"]
+
+    assert len(replaced) < len(appended)
+
+    payload.zoom_changed(18)
+    assert dict(payload.flush())["icarusTrailReplace"]["1"] == appended
+
+def test_zoom_change_after_trimming_keeps_the_whole_trail():
+    trail = Trail("1", capacity=100)
+
+    for start in range(0, 1000, 10):
+        trail.append(line(start, 10))
+        trail.simplify(18)
+
+    # Neither a new level nor one evicted and rebuilt may lose the start
+    for zoom in [10] + list(range(11, 11 + ZOOM_LEVELS)) + [18, 10]:
+        points = trail.simplified(zoom)
+
+        assert points[0] == line(0, 1)[0]
+        assert points[-1] == line(999, 1)[0]
+
+    # The full resolution level still has every point the filter kept
+    assert len(trail.simplified(18)) > 125
@@ -0,0 +1,248 @@
+import math
+import time
+import sqlite3
+import threading
+import urllib.request
+
+def tile_xy(latitude, longitude, zoom):
+    # Slippy map tile containing a point
+    scale = 1 << zoom
+    x = int((longitude + 180.0) / 360.0 * scale)
+    y = int((1.0 - math.asinh(math.tan(math.radians(latitude))) / math.pi) / 2.0 * scale)
+    return min(max(x, 0), scale - 1), min(max(y, 0), scale - 1)
+
+def tiles_around(latitude, longitude, radius, zoom):
+    # Tiles covering a square of radius metres around a point
+    latitude_delta = radius / 111320.0
+    longitude_delta = radius / (111320.0 * max(math.cos(math.radians(latitude)), 0.01))
+
+    x_min, y_min = tile_xy(latitude + latitude_delta, longitude - longitude_delta, zoom)
+    x_max, y_max = tile_xy(latitude - latitude_delta, longitude + longitude_delta, zoom)
+
+    for x in range(x_min, x_max + 1):
+        for y in range(y_min, y_max + 1):
+            yield x, y
+
+# Tile accesses are written back in batches of this many, or after this many seconds
+ACCESSED_BATCH = 256
+ACCESSED_INTERVAL = 30.0
+
+# Prefetch waits after a failed download, doubling up to the maximum, and
+# gives up after this many failures in a row
+PREFETCH_BACKOFF = 1.0
+PREFETCH_BACKOFF_MAX = 30.0
+PREFETCH_FAILURES_MAX = 8
+
+class TileCache():
+    # MBTiles file used as an LRU cache of map tiles. The tiles table follows
+    # the MBTiles layout (TMS row numbering) with two extra columns for the
+    # last access time and size, so the oldest tiles can be evicted once the
+    # cache grows past its byte budget. Reads go through their own
+    # connection and never write, WAL lets them run while a download is being
+    # stored. Access times are collected in memory and written back in
+    # batches by flush() or the next put(), both meant for a worker thread.
+    def __init__(self, path, upstream_url, byte_budget=512 * 1024 * 1024, timeout=10.0):
+        self._upstream_url = upstream_url
+        self._byte_budget = byte_budget
+        self._timeout = timeout
+        self._lock = threading.Lock()
+
+        self._database = sqlite3.connect(path, check_same_thread=False)
+        self._database.execute("PRAGMA journal_mode=WAL")
+        self._database.execute("PRAGMA synchronous=NORMAL")
+        self._database.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)")
+        self._database.execute(
+            "CREATE TABLE IF NOT EXISTS tiles ("
+            "zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB, "
+            "accessed REAL, size INTEGER, "
+            "PRIMARY KEY (zoom_level, tile_column, tile_row))"
+        )
+        self._database.execute("CREATE INDEX IF NOT EXISTS tiles_accessed ON tiles (accessed)")
+        self._database.execute("INSERT OR IGNORE INTO metadata VALUES ('name', 'icarus_gcs tile cache'), ('format', 'png')")
+        self._database.commit()
+
+        self._size = self._database.execute("SELECT COALESCE(SUM(size), 0) FROM tiles").fetchone()[0]
+
+        self._read_lock = threading.Lock()
+        self._read_database = sqlite3.connect(path, check_same_thread=False)
+
+        # (zoom, column, row) -> last access time not yet written
+        self._accessed = {}
+        self._accessed_lock = threading.Lock()
+        self._accessed_flushed = time.monotonic()
+        self._flush_scheduled = False
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self):
+        return self._size
+
+    def close(self):
+        self.flush()
+
+        with self._read_lock:
+            self._read_database.close()
+
+        with self._lock:
+            self._database.close()
+
+    def contains(self, zoom, x, y):
+        with self._lock:
+            return self._database.execute(
+                "SELECT 1 FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (zoom, x, (1 << zoom) - 1 - y)
+            ).fetchone() is not None
+
+    def get(self, zoom, x, y):
+        row = (1 << zoom) - 1 - y
+
+        with self._read_lock:
+            result = self._read_database.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (zoom, x, row)
+            ).fetchone()
+
+        if result is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        with self._accessed_lock:
+            self._accessed[(zoom, x, row)] = time.time()
+
+        return result[0]
+
+    def flush_due(self):
+        # True when enough accesses piled up to be worth a flush(), and only
+        # once until that flush has run
+        with self._accessed_lock:
+            if self._flush_scheduled or not self._accessed:
+                return False
+
+            if len(self._accessed) < ACCESSED_BATCH and time.monotonic() - self._accessed_flushed < ACCESSED_INTERVAL:
+                return False
+
+            self._flush_scheduled = True
+            return True
+
+    def flush(self):
+        # Writes the collected access times
+        with self._lock:
+            self._write_accessed()
+            self._database.commit()
+
+    def _write_accessed(self):
+        with self._accessed_lock:
+            accessed = self._accessed
+            self._accessed = {}
+            self._accessed_flushed = time.monotonic()
+            self._flush_scheduled = False
+
+        if accessed:
+            self._database.executemany(
+                "UPDATE tiles SET accessed = ? WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                [(timestamp,) + key for key, timestamp in accessed.items()]
+            )
+
+    def put(self, zoom, x, y, data):
+        row = (1 << zoom) - 1 - y
+
+        with self._lock:
+            previous = self._database.execute(
+                "SELECT size FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (zoom, x, row)
+            ).fetchone()
+
+            self._database.execute(
+                "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?, ?)",
+                (zoom, x, row, data, time.time(), len(data))
+            )
+            self._size += len(data) - (previous[0] if previous else 0)
+
+            if self._size > self._byte_budget:
+                # Eviction goes by access time, so it has to be current
+                self._write_accessed()
+                self._evict()
+
+            self._database.commit()
+
+    def _evict(self):
+        # Drop least recently used tiles until we are 10% under budget, so
+        # eviction doesn't run again on the very next insert
+        target = self._byte_budget * 0.9
+
+        while self._size > target:
+            rows = self._database.execute(
+                "SELECT zoom_level, tile_column, tile_row, size FROM tiles ORDER BY accessed LIMIT 64"
+            ).fetchall()
+
+            if not rows:
+                # Nothing left to evict, the running total must have drifted
+                self._size = self._database.execute("SELECT COALESCE(SUM(size), 0) FROM tiles").fetchone()[0]
+                break
+
+            self._database.executemany(
+                "DELETE FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                [row[:3] for row in rows]
+            )
+            self._size -= sum(row[3] for row in rows)
+
+    def fetch(self, zoom, x, y):
+        # Downloads a tile from the upstream server and caches it
+        url = self._upstream_url.replace("{z}", str(zoom)).replace("{x}", str(x)).replace("{y}", str(y))
+
+        with urllib.request.urlopen(url, timeout=self._timeout) as response:
+            data = response.read()
+
+        self.put(zoom, x, y, data)
+
+        return data
+
+    def tile(self, zoom, x, y):
+        data = self.get(zoom, x, y)
+
+        if data is None:
+            data = self.fetch(zoom, x, y)
+
+        return data
+
+    def prefetch(self, latitude, longitude, radius, zoom_min, zoom_max, stop=None):
+        # Downloads every missing tile around a point, returns how many were
+        # fetched. A failed tile is skipped after a growing pause, only a run
+        # of failures, e.g. no connection at all, ends the prefetch.
+        stop = threading.Event() if stop is None else stop
+        fetched = 0
+        failed = 0
+        failures = 0
+
+        for zoom in range(zoom_min, zoom_max + 1):
+            for x, y in tiles_around(latitude, longitude, radius, zoom):
+                if stop.is_set():
+                    return fetched
+
+                if self.contains(zoom, x, y):
+                    continue
+
+                try:
+                    self.fetch(zoom, x, y)
+                    fetched += 1
+                    failures = 0
+                except OSError as e:
+                    failed += 1
+                    failures += 1
+                    print("Failed to prefetch tile " + str(zoom) + "/" + str(x) + "/" + str(y))
+                    print(e)
+
+                    if failures >= PREFETCH_FAILURES_MAX:
+                        print("Stopped prefetching tiles after " + str(failed) + " failures")
+                        return fetched
+
+                    stop.wait(min(PREFETCH_BACKOFF * (1 << (failures - 1)), PREFETCH_BACKOFF_MAX))
+
+        if failed:
+            print("Prefetched " + str(fetched) + " tiles, " + str(failed) + " failed")
+
+        return fetched
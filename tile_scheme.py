@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5 import QtCore
+from PyQt5.QtWebEngineCore import QWebEngineUrlScheme, QWebEngineUrlSchemeHandler, QWebEngineUrlRequestJob
+
+TILE_SCHEME = b"icarustiles"
+
+# Leaflet URL template for tiles served by TileSchemeHandler
+TILE_URL = TILE_SCHEME.decode() + ":{z}/{x}/{y}"
+
+def register_tile_scheme():
+    # Must run before the QApplication is created
+    scheme = QWebEngineUrlScheme(TILE_SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Path)
+    scheme.setFlags(
+        QWebEngineUrlScheme.SecureScheme |
+        QWebEngineUrlScheme.LocalScheme |
+        QWebEngineUrlScheme.LocalAccessAllowed
+    )
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+def tile_mime_type(data):
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return b"image/png"
+
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return b"image/webp"
+
+    return b"image/jpeg"
+
+class TileSchemeHandler(QWebEngineUrlSchemeHandler):
+    # Serves map tiles to the page from the TileCache. Cache hits are answered
+    # straight away, misses are downloaded on a small thread pool and answered
+    # back on the GUI thread. Access times of cached tiles are written back
+    # on the pool as well.
+    _fetched = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, tile_cache, workers=4, parent=None):
+        super(TileSchemeHandler, self).__init__(parent)
+
+        self._tile_cache = tile_cache
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._fetched.connect(self._reply, QtCore.Qt.QueuedConnection)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def requestStarted(self, job):
+        try:
+            zoom, x, y = (int(part) for part in job.requestUrl().path().split("/"))
+        except ValueError:
+            job.fail(QWebEngineUrlRequestJob.UrlInvalid)
+            return
+
+        data = self._tile_cache.get(zoom, x, y)
+
+        if self._tile_cache.flush_due():
+            self._executor.submit(self._tile_cache.flush)
+
+        if data is not None:
+            self._reply(job, data)
+            return
+
+        future = self._executor.submit(self._tile_cache.fetch, zoom, x, y)
+        future.add_done_callback(lambda future: self._fetched.emit(job, future))
+
+    def _reply(self, job, result):
+        if not isinstance(result, (bytes, bytearray)):
+            try:
+                result = result.result()
+            except OSError:
+                result = None
+
+        # The page may have dropped the request while we were downloading
+        try:
+            if result is None:
+                job.fail(QWebEngineUrlRequestJob.RequestFailed)
+                return
+
+            buffer = QtCore.QBuffer(job)
+            buffer.setData(result)
+            buffer.open(QtCore.QIODevice.ReadOnly)
+            job.reply(tile_mime_type(result), buffer)
+        except RuntimeError:
+            pass
@@ -0,0 +1,113 @@
+from array import array
+
+from simplify import tolerance_for_zoom, douglas_peucker, radial_distance_filter
+
+# Zoom levels with a simplified copy kept per trail, least recently used go first
+ZOOM_LEVELS = 4
+
+class Trail():
+    # Recent full resolution points of one device plus a simplified copy per
+    # zoom level. A zoom level is simplified in full once, after that new
+    # points are filtered incrementally so extending it costs the same however
+    # long the trail is. At most capacity raw points are kept, older ones only
+    # survive in the simplified copies, which always cover the whole trail:
+    # every copy is brought up to date before raw points are dropped, and a
+    # new zoom level is simplified from the finest copy plus the raw points
+    # that copy has not consumed yet. Only the ZOOM_LEVELS most recently used
+    # levels are kept.
+    __slots__ = ("_id", "_capacity", "_latitudes", "_longitudes", "_start", "_simplified")
+
+    @property
+    def id(self):
+        return self._id
+
+    def __init__(self, id, capacity=36000):
+        self._id = id
+        self._capacity = capacity
+        self._latitudes = array("d")
+        self._longitudes = array("d")
+
+        # Number of raw points dropped from the front
+        self._start = 0
+
+        # zoom -> [simplified latitudes, simplified longitudes, number of raw points consumed],
+        # least recently used first
+        self._simplified = {}
+
+    def __len__(self):
+        return self._start + len(self._latitudes)
+
+    def append(self, points):
+        for latitude, longitude in points:
+            self._latitudes.append(latitude)
+            self._longitudes.append(longitude)
+
+        # Trimmed in chunks so the arrays are not shifted on every append
+        excess = len(self._latitudes) - self._capacity
+
+        if excess > self._capacity // 4:
+            for zoom in list(self._simplified):
+                self._extend(zoom)
+
+            del self._latitudes[:excess]
+            del self._longitudes[:excess]
+            self._start += excess
+
+    def points(self, start=0):
+        start = max(start - self._start, 0)
+
+        return [[latitude, longitude] for latitude, longitude in zip(self._latitudes[start:], self._longitudes[start:])]
+
+    def _extend(self, zoom):
+        # Filters the raw points a cached zoom level has not consumed yet into it
+        cached = self._simplified[zoom]
+
+        if cached[2] >= len(self):
+            return
+
+        new_points = self.points(cached[2])
+
+        if cached[0]:
+            new_points = radial_distance_filter(new_points, tolerance_for_zoom(zoom), (cached[0][-1], cached[1][-1]))
+        else:
+            new_points = douglas_peucker(new_points, tolerance_for_zoom(zoom))
+
+        for latitude, longitude in new_points:
+            cached[0].append(latitude)
+            cached[1].append(longitude)
+
+        cached[2] = len(self)
+
+    def simplify(self, zoom):
+        # Brings the simplified copy for zoom up to date, returns its length
+        cached = self._simplified.pop(zoom, None)
+
+        if cached is None:
+            points = self.points()
+
+            # Raw points were dropped, the finest copy still has them
+            if self._start and self._simplified:
+                source = self._simplified[max(self._simplified)]
+                points = [[latitude, longitude] for latitude, longitude in zip(source[0], source[1])] + self.points(source[2])
+
+            cached = [array("d"), array("d"), len(self)]
+
+            for latitude, longitude in douglas_peucker(points, tolerance_for_zoom(zoom)):
+                cached[0].append(latitude)
+                cached[1].append(longitude)
+
+            while len(self._simplified) >= ZOOM_LEVELS:
+                del self._simplified[next(iter(self._simplified))]
+
+        # Reinserted so the dict stays in order of use
+        self._simplified[zoom] = cached
+        self._extend(zoom)
+
+        return len(cached[0])
+
+    def simplified(self, zoom, start=0):
+        # Simplified points for zoom from index start on
+        self.simplify(zoom)
+        cached = self._simplified[zoom]
+
+        return [[latitude, longitude] for latitude, longitude in zip(cached[0][start:], cached[1][start:])]